@@ -1,12 +1,32 @@
 import logging
-import io
-import csv
+from datetime import datetime, date
+from typing import Optional, List
 
-from fastapi import FastAPI, Request, HTTPException
-from starlette.responses import StreamingResponse
+import asyncio
+
+import anyio
+from fastapi import FastAPI, Request, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse, PlainTextResponse
 
 from tasks import enqueue_project
-from filevine_loader import engine
+from webhook_events import sections_for_event
+from exports import (
+    iter_full_export_csv, iter_copy_export_csv, aiter_export,
+    negotiate_encoding, iter_compressed,
+    changes_query, DELETIONS_EXPORT_QUERY,
+    latest_change, change_params, encode_change_cursor, decode_change_cursor,
+)
+from export_arrow import arrow_available, iter_arrow_export
+from export_snapshot import current_snapshot, request_refresh, snapshot_response, start_refresher
+from export_view import ensure_export_view, start_view_refresher, metrics_text
+from webhook_journal import start_journal_writer, journal_event
+import webhook_journal
+from projects_api import parse_fields, query_projects, query_aggregates
+from config import (
+    EXPORT_ENGINE, EXPORT_SNAPSHOTS, EXPORT_SOURCE,
+    PROJECTS_PAGE_SIZE, PROJECTS_MAX_PAGE_SIZE, WEBHOOK_ENQUEUE_THREADS, WEBHOOK_JOURNAL,
+)
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -16,12 +36,42 @@ logger = logging.getLogger("filevine-webhook")
 
 app = FastAPI()
 
+_enqueue_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def get_enqueue_limiter() -> anyio.CapacityLimiter:
+    # created lazily: a CapacityLimiter has to be built inside the event loop
+    global _enqueue_limiter
+    if _enqueue_limiter is None:
+        _enqueue_limiter = anyio.CapacityLimiter(WEBHOOK_ENQUEUE_THREADS)
+    return _enqueue_limiter
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    if EXPORT_SOURCE == "view":
+        ensure_export_view()
+        start_view_refresher()
+    if EXPORT_SNAPSHOTS:
+        start_refresher()
+    if WEBHOOK_JOURNAL:
+        start_journal_writer()
+
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus text: export view refresh duration, staleness and counts."""
+    body = metrics_text()
+    if WEBHOOK_JOURNAL:
+        body += webhook_journal.metrics_text()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
 @app.post("/webhook")
 async def webhook(req: Request):
     try:
@@ -39,100 +89,193 @@ async def webhook(req: Request):
         or data.get("data", {}).get("objectId", {}).get("native")
     )
     evt = data.get("eventType") or data.get("Event") or "unknown_event"
+    # Filevine's id for this delivery; retries of the same event reuse it
+    event_id = data.get("eventId") or data.get("EventId") or data.get("id")
 
     if not pid:
         logger.warning("No projectId found in payload, ignoring.")
         return {"status": "ignored"}
 
-    logger.info("🔔 Enqueueing project %s for event %s", pid, evt)
-    job_id = enqueue_project(pid)
-    logger.info("🏷 Job %s queued for project %s", job_id, pid)
-    return {"status": "queued", "projectId": pid, "jobId": job_id}
+    sections = sections_for_event(data)
+    event_id = str(event_id) if event_id else None
+    logger.info("🔔 Enqueueing project %s for event %s (%s), sections %s",
+                pid, evt, event_id, sorted(sections) if sections else "all")
+    # Redis I/O runs on its own small thread budget, never on the event loop,
+    # so a burst of webhooks is acked concurrently instead of one at a time.
+    enqueue = anyio.to_thread.run_sync(
+        lambda: enqueue_project(pid, event_id=event_id, sections=sections),
+        limiter=get_enqueue_limiter(),
+    )
+    if WEBHOOK_JOURNAL:
+        # journal and enqueue concurrently; only ack once the event is durable,
+        # so a failed journal write makes Filevine redeliver it
+        journaled = asyncio.wrap_future(journal_event(pid, event_id, evt, sections))
+        results = await asyncio.gather(journaled, enqueue, return_exceptions=True)
+        if isinstance(results[0], Exception):
+            raise HTTPException(503, "Webhook journal unavailable")
+        if isinstance(results[1], Exception):
+            raise results[1]
+        status, job_id = results[1]
+    else:
+        status, job_id = await enqueue
+    logger.info("🏷 Job %s %s for project %s", job_id, status, pid)
+    return {"status": status, "projectId": pid, "jobId": job_id}
+
 
+def csv_stream_response(req: Request, chunks, filename: str, headers: Optional[dict] = None):
+    """Stream an export generator as a (possibly compressed) CSV download."""
+    encoding = negotiate_encoding(req.headers.get("accept-encoding"))
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Vary": "Accept-Encoding",
+        **(headers or {}),
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
 
-def iter_full_export_csv():
+    return StreamingResponse(
+        aiter_export(iter_compressed(chunks, encoding)),
+        media_type="text/csv",
+        headers=headers,
+    )
+
+
+@app.get("/export/full.csv")
+async def export_full(req: Request):
     """
-    Streams exactly the joined columns & friendly headers you specified,
-    straight out of Postgres as CSV.
+    Download the fully joined dataset with all your friendly column names,
+    read from dashboard_rows (EXPORT_SOURCE=view uses dashboard_export_mv,
+    EXPORT_SOURCE=join the live seven-table join).
+    EXPORT_ENGINE picks how the CSV is produced: "copy" (Postgres COPY,
+    default) or "cursor" (rows formatted in Python). The body is zstd- or
+    gzip-compressed when the client's Accept-Encoding allows it.
+
+    With EXPORT_SNAPSHOTS on, the newest on-disk snapshot is served instead
+    (ETag/Last-Modified, 304s, Range); it's rebuilt in the background after
+    loads and we only stream live until the first one exists.
     """
-    # 1) Pull the full SELECT as a plain string:
-    query = """
-    SELECT
-      p.project_type_code   AS "Filevine Template Name",
-      c.case_manager        AS "Team Case Manager Full Name",
-      c.supervisor          AS "Team Supervisor Full Name",
-      c.attorney            AS "Team Attorney Full Name",
-      c.paralegal           AS "Team Paralegal Full Name",
-      n.negotiator          AS "Nego Assigned: Full Name",
-      p.project_name        AS "Name",
-      p.phase_name          AS "Phase",
-      p.date_of_incident    AS "Date of Intake",
-      p.incident_date       AS "Incident Date",
-      p.sol_due_date        AS "SOL Due",
-      p.total_meds          AS "Medical Recs/Bills: Total Amount Billed",
-      n.settled             AS "NEGOTIATION: Settled",
-      n.settlement_date     AS "NEGOTIATION: Settlement Date",
-      p.policy_limits       AS "Policy Limits",
-      p.client_contact_count      AS "Count of Client Contact Items",
-      p.latest_client_contact     AS "Client Contact: Latest Created",
-      i.defendant_insurance_name  AS "Defendant Insurance",
-      i.client_insurance_name     AS "Client Insurance",
-      n.date_assigned_to_nego     AS "NEGOTIATION: Date Assigned to Nego",
-      n.last_offer                AS "NEGOTIATION: Last Offer",
-      n.last_offer_date           AS "NEGOTIATION: Last Offer Date",
-      b.lien_negotiator_name      AS "BREAKDOWN: Lien Negotiator Assigned To",
-      b.date_assigned             AS "BREAKDOWN: Date Assigned To Breakdown",
-      n.settlement_date           AS "SETTLEMENT: Latest Date of Settlement",
-      l.trial_date                AS "Lit Case Summary: Trial Date",
-      l.date_complaint_filed      AS "Lit Case Summary: Date Complaint was Filed",
-      l.date_attorney_assigned    AS "Lit Case Summary: Date Attorney was Assigned",
-      l.settlement_amount         AS "Lit Case Summary: Settlement Amount",
-      l.settlement_date           AS "Lit Case Summary: Settlement Date",
-      l.dismissal_filed_on        AS "Lit Case Summary: Dismissal Filed On",
-      d.demand_approved           AS "Demand: Demand Approved",
-      d.approved_by               AS "Demand: Approved By"
-    FROM projects p
-      LEFT JOIN contacts        c USING (project_id)
-      LEFT JOIN negotiation     n USING (project_id)
-      LEFT JOIN insurance_info  i USING (project_id)
-      LEFT JOIN breakdown_info  b USING (project_id)
-      LEFT JOIN lit_case_review l USING (project_id)
-      LEFT JOIN demand_info     d USING (project_id)
-    ORDER BY p.project_id;
+    if EXPORT_SNAPSHOTS:
+        snap = current_snapshot()
+        if snap is not None:
+            return snapshot_response(req.headers, snap)
+        request_refresh()
+
+    chunks = iter_copy_export_csv() if EXPORT_ENGINE == "copy" else iter_full_export_csv()
+    return csv_stream_response(req, chunks, "filevine_full_export.csv")
+
+
+def arrow_response(fmt: str, media_type: str, filename: str):
+    if not arrow_available():
+        raise HTTPException(501, "pyarrow is not installed on this server")
+    return StreamingResponse(
+        aiter_export(iter_arrow_export(fmt)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/export/full.parquet")
+async def export_full_parquet():
     """
+    The full export as Parquet (zstd), with real date/decimal/integer column
+    types so Power BI doesn't have to re-infer them from text on every refresh.
+    """
+    return arrow_response("parquet", "application/vnd.apache.parquet", "filevine_full_export.parquet")
 
-    # 2) Open a raw DB connection and cursor
-    conn = engine.raw_connection()
-    cursor = conn.cursor()
 
-    # 3) Execute the plain SQL string
-    cursor.execute(query)
+@app.get("/export/full.arrows")
+async def export_full_arrow_stream():
+    """The full export as an Arrow IPC stream (zstd-compressed record batches)."""
+    return arrow_response("arrows", "application/vnd.apache.arrow.stream", "filevine_full_export.arrows")
 
-    # 4) Stream out the header
-    header = [col[0] for col in cursor.description]
-    buf = io.StringIO()
-    writer = csv.writer(buf)
-    writer.writerow(header)
-    yield buf.getvalue()
-    buf.seek(0); buf.truncate(0)
 
-    # 5) Stream each row
-    for row in cursor:
-        writer.writerow(row)
-        yield buf.getvalue()
-        buf.seek(0); buf.truncate(0)
+def parse_since(since: Optional[str], cursor: Optional[str]) -> datetime:
+    """Turn ?since=<ISO timestamp> or ?cursor=<X-Next-Cursor value> into a datetime."""
+    try:
+        if cursor:
+            return decode_change_cursor(cursor)
+        if since:
+            return datetime.fromisoformat(since)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    raise HTTPException(400, "Pass ?since=<ISO timestamp> or ?cursor=<X-Next-Cursor>")
 
-    cursor.close()
-    conn.close()
 
+async def delta_response(req: Request, query: str, since: datetime, filename: str):
+    # take the next cursor *before* reading, so nothing committed meanwhile is skipped
+    latest = await run_in_threadpool(latest_change)
+    next_cursor = encode_change_cursor(latest or since)
+    params = change_params(since)
+    chunks = iter_copy_export_csv(query, params) if EXPORT_ENGINE == "copy" else iter_full_export_csv(query, params)
+    return csv_stream_response(req, chunks, filename, {"X-Next-Cursor": next_cursor})
 
-@app.get("/export/full.csv")
-def export_full():
+
+@app.get("/export/changes.csv")
+async def export_changes(req: Request, since: Optional[str] = None, cursor: Optional[str] = None):
     """
-    Download the fully joined dataset with all your friendly column names.
+    Only the projects with a row in any of the seven tables changed after
+    `since` (ISO timestamp) or `cursor`. Same friendly columns as
+    /export/full.csv, led by "Project ID". Pass the X-Next-Cursor response
+    header back as ?cursor= on the next call. Deletions: /export/deletions.csv.
+    Never reads the materialized view, so a delta is never behind the
+    cursor it hands out.
     """
-    return StreamingResponse(
-        iter_full_export_csv(),
-        media_type="text/csv",
-        headers={"Content-Disposition": 'attachment; filename="filevine_full_export.csv"'}
+    return await delta_response(req, changes_query(), parse_since(since, cursor),
+                                "filevine_changes.csv")
+
+
+@app.get("/export/deletions.csv")
+async def export_deletions(req: Request, since: Optional[str] = None, cursor: Optional[str] = None):
+    """Project IDs deleted after `since`/`cursor`, with the same X-Next-Cursor contract."""
+    return await delta_response(req, DELETIONS_EXPORT_QUERY, parse_since(since, cursor),
+                                "filevine_deletions.csv")
+
+
+@app.get("/projects")
+def list_projects(
+    after: Optional[int] = None,
+    limit: int = Query(PROJECTS_PAGE_SIZE, ge=1, le=PROJECTS_MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    phase_name: Optional[List[str]] = Query(None),
+    project_type_code: Optional[List[str]] = Query(None),
+    case_manager: Optional[str] = None,
+    sol_due_from: Optional[date] = None,
+    sol_due_to: Optional[date] = None,
+    settled: Optional[str] = None,
+):
+    """
+    Page through the dashboard dataset as JSON, in project_id order.
+
+    Filters: phase_name and project_type_code (repeatable), case_manager,
+    sol_due_from/sol_due_to (inclusive ISO dates), settled (e.g. "Yes").
+    ?fields=project_name,phase_name limits the columns (project_id is always
+    returned). Pass next_after back as ?after= for the next page; it's null
+    on the last one.
+    """
+    try:
+        columns = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return query_projects(
+        columns, limit, after,
+        phase_name=phase_name,
+        project_type_code=project_type_code,
+        case_manager=case_manager,
+        sol_due_from=sol_due_from,
+        sol_due_to=sol_due_to,
+        settled=settled,
     )
+
+
+@app.get("/aggregates")
+def aggregates(metric: Optional[str] = None):
+    """
+    Dashboard headline numbers, maintained incrementally as projects load:
+    caseload per case manager / attorney, projects per phase, settled
+    counts and amounts, total meds per project type, and SOL due per month.
+    ?metric= returns just one of them.
+    """
+    try:
+        return query_aggregates(metric)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+Benchmark the CSV export engines used by /export/full.csv.
+
+Seeds a scratch schema with synthetic projects (plus one row in every detail
+table), then drains each engine's generator the way StreamingResponse would
+and reports rows/s, CPU seconds and peak memory. Every run happens in a fresh
+process, and memory is that process's peak RSS growth while draining, so it
+includes libpq/psycopg2 buffers that a Python heap tracer can't see (needs
+the `resource` module: Linux/macOS/WSL; "n/a" elsewhere).
+
+    python bench_export.py --rows 150000
+    python bench_export.py --rows 150000 --engines copy --keep
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from sqlalchemy import create_engine, text
+
+from filevine_loader import DB_URL, DDL
+from exports import iter_full_export_csv, iter_copy_export_csv, FULL_EXPORT_QUERY
+
+BENCH_SCHEMA = "export_bench"
+
+ENGINES = {
+    "cursor": iter_full_export_csv,
+    "copy":   iter_copy_export_csv,
+}
+
+SEED_SQL = [
+    """
+    INSERT INTO projects (
+      project_id, project_name, phase_name, incident_date, sol_due_date,
+      total_meds, policy_limits, personal_injury_type, liability_decision,
+      last_offer, date_of_incident, client_contact_count,
+      latest_client_contact, project_type_code
+    )
+    SELECT g,
+           'Bench Client ' || g || ', Auto / Major PD',
+           (ARRAY['Intake','Treating','Demand','Nego','Litigation','Breakdown'])[1 + g % 6],
+           DATE '2019-01-01' + (g % 1800),
+           DATE '2021-01-01' + (g % 1800),
+           round((g % 90000)::numeric + 0.37, 2),
+           '15/30', 'Auto', 'Accepted', 'N/A',
+           DATE '2019-01-05' + (g % 1800),
+           g % 40,
+           TIMESTAMP '2024-01-01' + (g % 500) * INTERVAL '1 hour',
+           (ARRAY['LOJE 2.0','LOJE 2.2','PIMaster','WC'])[1 + g % 4]
+    FROM generate_series(1, :n) AS g
+    """,
+    """
+    INSERT INTO contacts (project_id, case_manager, supervisor, attorney, paralegal)
+    SELECT g, 'Case Manager ' || g % 25, 'Supervisor ' || g % 5,
+           'Attorney ' || g % 12, 'Paralegal ' || g % 30
+    FROM generate_series(1, :n) AS g
+    """,
+    """
+    INSERT INTO negotiation (
+      project_id, negotiator, settlement_date, settled, settled_amount,
+      last_offer, last_offer_date, date_assigned_to_nego
+    )
+    SELECT g, 'Negotiator ' || g % 8, DATE '2023-01-01' + (g % 600),
+           CASE WHEN g % 3 = 0 THEN 'Yes' ELSE 'No' END,
+           round((g % 50000)::numeric, 2), '25000', DATE '2023-01-01' + (g % 600),
+           DATE '2022-06-01' + (g % 600)
+    FROM generate_series(1, :n) AS g
+    """,
+    """
+    INSERT INTO insurance_info (project_id, defendant_insurance_name, client_insurance_name)
+    SELECT g, 'Defendant Mutual ' || g % 40, 'Client Casualty ' || g % 40
+    FROM generate_series(1, :n) AS g
+    """,
+    """
+    INSERT INTO breakdown_info (
+      project_id, lien_negotiator_name, lien_negotiator_company,
+      lien_negotiator_title, lien_negotiator_dept, date_assigned, date_completed
+    )
+    SELECT g, 'Lien Negotiator ' || g % 6, 'N/A', 'N/A', 'N/A',
+           DATE '2023-03-01' + (g % 400), NULL
+    FROM generate_series(1, :n) AS g
+    """,
+    """
+    INSERT INTO lit_case_review (
+      project_id, trial_date, date_complaint_filed, date_attorney_assigned,
+      settlement_amount, settlement_date, dismissal_filed_on
+    )
+    SELECT g, DATE '2025-01-01' + (g % 365), DATE '2023-01-01' + (g % 365),
+           DATE '2022-01-01' + (g % 365), 'N/A', NULL, NULL
+    FROM generate_series(1, :n) AS g
+    """,
+    """
+    INSERT INTO demand_info (project_id, demand_approved, approved_by)
+    SELECT g, DATE '2023-02-01' + (g % 500), 'Attorney ' || g % 12
+    FROM generate_series(1, :n) AS g
+    """,
+]
+
+
+def seed(rows: int):
+    """(Re)create the scratch schema and fill it with `rows` projects."""
+    admin = create_engine(DB_URL, echo=False)
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+    admin.dispose()
+
+    bench = bench_engine()
+    with bench.begin() as conn:
+        for stmt in DDL.split(";"):
+            stmt = stmt.strip()
+            if stmt:
+                conn.execute(text(stmt))
+        for stmt in SEED_SQL:
+            conn.execute(text(stmt), {"n": rows})
+        for table in ("projects", "contacts", "negotiation", "insurance_info",
+                      "breakdown_info", "lit_case_review", "demand_info"):
+            conn.execute(text(f"ANALYZE {table}"))
+    return bench
+
+
+def bench_engine():
+    return create_engine(
+        DB_URL,
+        echo=False,
+        connect_args={"options": f"-csearch_path={BENCH_SCHEMA}"},
+    )
+
+
+def drop_schema():
+    admin = create_engine(DB_URL, echo=False)
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+    admin.dispose()
+
+
+def peak_rss_mib() -> float:
+    """This process's peak resident set size so far (ru_maxrss: KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_engine(name: str, rows: int) -> dict:
+    """
+    Drain one engine end to end and measure it. Meant to run in a process
+    of its own (see measure), so the RSS peak belongs to this run alone.
+    """
+    bind = bench_engine()
+    gen = ENGINES[name](FULL_EXPORT_QUERY, bind=bind)
+
+    rss0 = peak_rss_mib() if resource is not None else None
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    first_byte = None
+    n_bytes = n_chunks = 0
+    for chunk in gen:
+        if first_byte is None:
+            first_byte = time.perf_counter() - wall0
+        n_bytes += len(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        n_chunks += 1
+    wall = time.perf_counter() - wall0
+    cpu = time.process_time() - cpu0
+    peak = peak_rss_mib() - rss0 if resource is not None else None
+    bind.dispose()
+
+    return {
+        "engine":     name,
+        "rows_per_s": rows / wall if wall else 0.0,
+        "wall_s":     wall,
+        "cpu_s":      cpu,
+        "ttfb_ms":    (first_byte or 0.0) * 1000,
+        "peak_mib":   peak,
+        "mib":        n_bytes / (1024 * 1024),
+        "chunks":     n_chunks,
+    }
+
+
+def measure(name: str, rows: int) -> dict:
+    """run_engine in a freshly spawned process (nothing left over from earlier runs)."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_engine, name, rows).result()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=100_000, help="synthetic projects to seed (default 100000)")
+    ap.add_argument("--engines", default="cursor,copy", help="comma-separated engines to run")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per engine; best run is reported")
+    ap.add_argument("--keep", action="store_true", help=f"keep the {BENCH_SCHEMA} schema afterwards")
+    args = ap.parse_args()
+
+    names = [n.strip() for n in args.engines.split(",") if n.strip()]
+    for n in names:
+        if n not in ENGINES:
+            ap.error(f"unknown engine {n!r}; choose from {', '.join(ENGINES)}")
+
+    print(f"🌱 Seeding {args.rows:,} projects into schema '{BENCH_SCHEMA}'...")
+    bind = seed(args.rows)
+
+    try:
+        results = []
+        for name in names:
+            runs = [measure(name, args.rows) for _ in range(args.repeat)]
+            results.append(min(runs, key=lambda r: r["wall_s"]))
+
+        print("\n" + "=" * 86)
+        print(f"{'engine':<8} {'rows/s':>12} {'wall s':>8} {'cpu s':>8} {'ttfb ms':>9} "
+              f"{'peak MiB':>9} {'out MiB':>8} {'chunks':>9}")
+        for r in results:
+            peak = f"{r['peak_mib']:>9.1f}" if r["peak_mib"] is not None else f"{'n/a':>9}"
+            print(f"{r['engine']:<8} {r['rows_per_s']:>12,.0f} {r['wall_s']:>8.2f} {r['cpu_s']:>8.2f} "
+                  f"{r['ttfb_ms']:>9.1f} {peak} {r['mib']:>8.1f} {r['chunks']:>9,}")
+    finally:
+        bind.dispose()
+        if not args.keep:
+            drop_schema()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+"""
+Sharded bulk loads. Every shard takes the projects with
+project_id % N == i, checkpoints them in load_runs (so --resume works per
+shard), and draws on the same Redis-backed API budget (rate_budget.py), so
+adding shards adds throughput only up to the org's request limit, never past it.
+
+Loaders:
+  full  filevine_loader.load_project                          (backfill lane)
+  nego  filevine_loader_nego_update.update_negotiation        (incremental lane)
+  meds  filevine_loader_incident_Meds_update.update_project_core_fields (incremental lane)
+
+    # four processes / machines, one shard each
+    python bulk_load.py full --type "LOJE 2.0" --tag loje-0601 --shard 0/4
+    ...
+    python bulk_load.py full --type "LOJE 2.0" --tag loje-0601 --shard 3/4
+
+    # or queue 8 shard jobs and let any rq worker pick them up
+    python bulk_load.py full --type "LOJE 2.0" --type PIMaster --phase Nego --fanout 8
+
+    # merged summary of every shard of a tag
+    python bulk_load.py report --tag loje-0601
+"""
+import argparse
+import importlib
+import itertools
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set
+
+import database
+import rate_budget
+from filevine_loader import engine, iter_project_listing, listing_batches
+from config import BULK_TARGET_RPM
+from load_runs import create_run, latest_open_run, listing_complete, run_load, runs_report, failed_projects
+
+# loader -> (module, per-project function, API budget lane, returns (ok, updated, changes),
+#            takes the listing item as its project core)
+LOADERS = {
+    "full": ("filevine_loader",                      "load_project",               "backfill",    False, True),
+    "nego": ("filevine_loader_nego_update",          "update_negotiation",         "incremental", True,  False),
+    "meds": ("filevine_loader_incident_Meds_update", "update_project_core_fields", "incremental", True,  True),
+}
+
+
+def parse_shard(value: str):
+    i, _, n = value.partition("/")
+    i, n = int(i), int(n)
+    if not 0 <= i < n:
+        raise argparse.ArgumentTypeError("--shard must be i/N with 0 <= i < N")
+    return i, n
+
+
+def load_fn(loader: str, modified: Dict[int, Optional[str]], listed_items: Dict[int, dict]):
+    """
+    The loader's per-project function, raising on failure so load_runs
+    retries it. Loaders that can take it get the project's listing item
+    (used once; retries fetch fresh). Full loads also record the project in
+    the freshness index.
+    """
+    module, name, _, returns_status, takes_item = LOADERS[loader]
+    fn = getattr(importlib.import_module(module), name)
+
+    def call(pid):
+        item = listed_items.pop(pid, None)
+        return fn(pid, item) if takes_item else fn(pid)
+
+    if not returns_status:
+        def load(pid):
+            if not call(pid):
+                raise RuntimeError(f"{loader} load failed for project {pid}")
+            database.record_loaded(pid, modified.get(pid))
+        return load
+
+    def load(pid):
+        ok, _, _ = call(pid)
+        if not ok:
+            raise RuntimeError(f"{loader} update failed for project {pid}")
+    return load
+
+
+def target_batches(loader: str, types: List[str], phases: List[str], shard: int, shards: int,
+                   modified: Dict[int, Optional[str]], listed_items: Dict[int, dict],
+                   skip_unchanged: bool = True) -> Iterator[List[int]]:
+    """
+    This shard's project ids, in batches as the listing streams in, minus
+    (with skip_unchanged) projects unchanged since their last full load. The
+    index holds the listing time of each project's last full load, which
+    covers every field the partial updaters write too.
+    """
+    def in_shard(pj):
+        return pj["projectId"]["native"] % shards == shard and (not phases or pj.get("phaseName") in phases)
+
+    if loader == "nego" and not (types or phases):
+        # negotiation targets come from our own phases, not the listing
+        module = importlib.import_module(LOADERS[loader][0])
+        ids = [pid for pid in module.get_projects_to_update() if pid % shards == shard]
+        for i in range(0, len(ids), 100):
+            yield ids[i:i + 100]
+        return
+
+    listing = itertools.chain.from_iterable(iter_project_listing(code) for code in types or [None])
+    yield from listing_batches(listing, modified, skip_unchanged=skip_unchanged, keep=in_shard,
+                               listed_items=listed_items)
+
+
+def run_label(tag: str, shard: int, shards: int) -> str:
+    return f"bulk:{tag}:{shard}/{shards}"
+
+
+def run_shard(loader: str, types: List[str], phases: List[str], tag: str,
+              shard: int = 0, shards: int = 1, resume: bool = False,
+              max_attempts: int = 3, backoff_s: float = 30, all_projects: bool = False) -> dict:
+    """Load one shard of a bulk run; also the RQ job body for --fanout."""
+    rate_budget.set_lane(LOADERS[loader][2])
+    label = run_label(tag, shard, shards)
+
+    database.init_db()
+    run_id = latest_open_run(engine, label) if resume else None
+    modified = {}
+    listed_items = {}  # project_id -> listing item, handed to the loader as the project core
+    stream = None
+    if run_id is None:
+        run_id = create_run(engine, label, streamed=True)
+        print(f"🆕 Run {run_id} ({label})")
+    else:
+        print(f"⏯ Resuming run {run_id} ({label})")
+    if not listing_complete(engine, run_id):
+        # a resumed run whose listing was cut short lists again and adds what it missed
+        stream = target_batches(loader, types, phases, shard, shards, modified, listed_items,
+                                skip_unchanged=not all_projects)
+
+    # shards split the lane's budget between them, so each paces to its part
+    target_rpm = (BULK_TARGET_RPM or rate_budget.lane_rpm()) / shards
+    try:
+        counts = run_load(engine, run_id, load_fn(loader, modified, listed_items), stream=stream, max_attempts=max_attempts,
+                          backoff_s=backoff_s, loader=loader, target_rpm=target_rpm)
+    finally:
+        database.flush()
+    print(f"✅ Shard {shard}/{shards} done: {counts['done']} loaded, {counts['failed']} failed")
+    return counts
+
+
+def active_shard_jobs(queue, tag: str, shards: int) -> Set[int]:
+    """Shards of `tag` that already have a job waiting in `queue` or running."""
+    active = set(queue.get_job_ids()) | set(queue.started_job_registry.get_job_ids())
+    return {shard for shard in range(shards)
+            if any(job_id.startswith(f"bulk-{tag}-{shard}-of-{shards}-") for job_id in active)}
+
+
+def fan_out(loader: str, types: List[str], phases: List[str], tag: str, shards: int,
+            resume: bool, max_attempts: int, backoff_s: float, all_projects: bool) -> List[str]:
+    """
+    Queue one run_shard job per shard on the loader's lane, skipping shards
+    whose job from an earlier --fanout is still queued or running (two jobs
+    on one shard would load its projects twice). Each job gets a fresh id,
+    so re-queueing never overwrites an earlier job's hash.
+    """
+    from tasks import queues
+
+    queue = queues[LOADERS[loader][2]]
+    busy = active_shard_jobs(queue, tag, shards)
+    if busy:
+        print(f"⏭ Shard(s) {', '.join(map(str, sorted(busy)))} of {tag} still queued or running; not queued again")
+    job_ids = []
+    for shard in range(shards):
+        if shard in busy:
+            continue
+        job = queue.enqueue(
+            run_shard, loader, types, phases, tag, shard, shards, resume, max_attempts, backoff_s, all_projects,
+            job_id=f"bulk-{tag}-{shard}-of-{shards}-{uuid.uuid4().hex[:8]}",
+            job_timeout=-1,  # a shard runs for as long as it takes
+        )
+        job_ids.append(job.id)
+    return job_ids
+
+
+def print_report(tag: str):
+    runs = runs_report(engine, f"bulk:{tag}:")
+    if not runs:
+        print(f"⚠️ No runs found for tag {tag}")
+        return
+
+    print("\n" + "="*60)
+    print(f"📊 Bulk load {tag}: {len(runs)} shard run(s)")
+    for r in runs:
+        end = r["finished_at"] or datetime.now(r["started_at"].tzinfo)
+        elapsed = (end - r["started_at"]).total_seconds()
+        state = "finished" if r["finished_at"] else "running"
+        print(f"  {r['label']:<32} run {r['run_id']:<6} {state:<8} "
+              f"done {r['done']:>6}  failed {r['failed']:>4}  pending {r['pending']:>6}  "
+              f"{elapsed/60:6.1f} min")
+
+    done = sum(r["done"] for r in runs)
+    failed = sum(r["failed"] for r in runs)
+    pending = sum(r["pending"] for r in runs)
+    started = min(r["started_at"] for r in runs)
+    ended = max(r["finished_at"] or datetime.now(started.tzinfo) for r in runs)
+    wall = max((ended - started).total_seconds(), 1)
+    print(f"\nTotal: {done + failed + pending} projects — ✅ {done} loaded, ❌ {failed} failed, "
+          f"⏳ {pending} pending — {done / wall * 60:.1f} projects/min over {wall/60:.1f} min")
+    for r in runs:
+        if r["failed"]:
+            print(f"  {r['label']} failed:", failed_projects(engine, r["run_id"]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("loader", choices=[*LOADERS, "report"])
+    ap.add_argument("--type", dest="types", action="append", default=[], help="projectTypeCode (repeatable)")
+    ap.add_argument("--phase", dest="phases", action="append", default=[], help="phaseName filter (repeatable)")
+    ap.add_argument("--tag", default=None, help="names the bulk load; shards and --resume/report share it")
+    ap.add_argument("--shard", type=parse_shard, default=(0, 1), metavar="i/N", help="run shard i of N (0-based)")
+    ap.add_argument("--fanout", type=int, default=None, metavar="N", help="queue N shard jobs on RQ instead of running")
+    ap.add_argument("--resume", action="store_true", help="continue this shard's unfinished run for --tag")
+    ap.add_argument("--max-attempts", type=int, default=3, help="tries per project before giving up")
+    ap.add_argument("--backoff", type=float, default=30, help="seconds before the first retry; doubles each time")
+    ap.add_argument("--all", action="store_true", help="load every target, even ones unchanged since their last full load")
+    args = ap.parse_args()
+
+    if args.loader == "report":
+        if not args.tag:
+            ap.error("report needs --tag")
+        print_report(args.tag)
+        return
+
+    if args.loader == "full" and not (args.types or args.phases):
+        ap.error("full loads need at least one --type or --phase")
+    if args.resume and not args.tag:
+        ap.error("--resume needs the --tag of the run to continue")
+    tag = args.tag or f"{args.loader}-{datetime.now():%Y%m%d-%H%M%S}"
+
+    if args.fanout:
+        job_ids = fan_out(args.loader, args.types, args.phases, tag, args.fanout,
+                          args.resume, args.max_attempts, args.backoff, args.all)
+        print(f"📤 Queued {len(job_ids)} shard job(s) for {tag}; "
+              f"follow with: python bulk_load.py report --tag {tag}")
+        return
+
+    shard, shards = args.shard
+    started = time.monotonic()
+    run_shard(args.loader, args.types, args.phases, tag, shard, shards,
+              resume=args.resume, max_attempts=args.max_attempts, backoff_s=args.backoff,
+              all_projects=args.all)
+    print(f"⏱ Shard finished in {(time.monotonic() - started)/60:.1f} min")
+    print_report(tag)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# bulk_scheduler.py
+#
+# Paces bulk runs by API cost instead of fixed sleeps between fixed-size
+# batches. A full load of a project with 40 pages of notes and 5 teams makes
+# far more requests than one with a single page and one team, so each
+# project's start is spaced by the calls it made last time (project_api_costs)
+# against a requests-per-minute target, and the run reports an ETA.
+#
+# rate_budget.acquire() still meters every single request; this only keeps a
+# run's average near its target so it neither idles nor hammers the limiter.
+
+import time
+import threading
+from typing import Dict, List, Optional
+
+import rate_budget
+from config import BULK_TARGET_RPM
+
+# calls per project when a loader has no history yet
+DEFAULT_COSTS = {
+    "full": 15,  # core, vitals, 3 forms, notes, 5 sections, teams + members
+    "nego": 1,
+    "meds": 4,
+}
+
+PROGRESS_EVERY_S = 30
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h {m:02d}m" if h else f"{m}m {s:02d}s"
+
+
+class Schedule:
+    """
+    Cost estimates, pacing and ETA for one pass over a run's projects.
+    Projects can be added while the pass is running (a streamed listing);
+    until listing_done() the ETA only covers what has been listed so far.
+    """
+
+    def __init__(self, loader: str, target_rpm: Optional[float] = None):
+        self.loader = loader
+        if target_rpm is None:
+            target_rpm = BULK_TARGET_RPM or rate_budget.lane_rpm()
+        self.rpm = target_rpm or None  # None: unpaced
+
+        self.costs: Dict[int, float] = {}
+        self.from_history = 0
+        self.total = 0
+        self.remaining_estimate = 0.0
+        self.listing = True
+        self.done = 0
+        self.calls = 0
+        self.estimated_done = 0.0
+        self.started = time.monotonic()
+        self.next_start = self.started
+        self.last_report = self.started
+        self._lock = threading.Lock()
+
+    def add(self, project_ids: List[int], known: Dict[int, int], mean: Optional[float] = None):
+        """Queue projects with their cost from history (mean / DEFAULT_COSTS when unknown)."""
+        default = mean if mean is not None else DEFAULT_COSTS.get(self.loader, 10)
+        with self._lock:
+            for pid in project_ids:
+                self.costs[pid] = max(1.0, float(known.get(pid, default)))
+                self.remaining_estimate += self.costs[pid]
+            self.from_history += sum(1 for pid in project_ids if pid in known)
+            self.total += len(project_ids)
+
+    def listing_done(self):
+        self.listing = False
+
+    def plan(self) -> str:
+        rate = f"{self.rpm:,.0f} calls/min" if self.rpm else "unpaced"
+        eta = format_duration(self.remaining_estimate / self.rpm * 60) if self.rpm else "unknown"
+        return (f"🗓 {self.total:,} projects ≈ {self.remaining_estimate:,.0f} API calls "
+                f"({self.from_history:,} estimated from history) at {rate} → ETA {eta}")
+
+    def wait(self, pid: int):
+        """Sleep until this project's share of the budget is available, then book it."""
+        if not self.rpm:
+            return
+        now = time.monotonic()
+        if self.next_start > now:
+            time.sleep(self.next_start - now)
+        # never bank unused time: an idle stretch doesn't buy a later burst
+        self.next_start = max(self.next_start, now) + self.costs[pid] * 60 / self.rpm
+
+    def finished(self, pid: int, calls: int):
+        with self._lock:
+            self.done += 1
+            self.calls += calls
+            self.estimated_done += self.costs[pid]
+            self.remaining_estimate -= self.costs[pid]
+        now = time.monotonic()
+        if now - self.last_report >= PROGRESS_EVERY_S:
+            self.last_report = now
+            print(self.progress())
+
+    def eta_seconds(self) -> Optional[float]:
+        elapsed = time.monotonic() - self.started
+        observed = self.calls / elapsed * 60 if elapsed > 0 and self.calls else None
+        rate = min(r for r in (self.rpm, observed) if r) if (self.rpm or observed) else None
+        if not rate:
+            return None
+        # scale what's left by how far actual calls have run over/under estimate
+        drift = self.calls / self.estimated_done if self.estimated_done and self.calls else 1.0
+        return self.remaining_estimate * drift / rate * 60
+
+    def progress(self) -> str:
+        elapsed = time.monotonic() - self.started
+        per_min = self.calls / elapsed * 60 if elapsed > 0 else 0.0
+        eta = self.eta_seconds()
+        listed = f"{self.total:,}" + (" listed so far" if self.listing else "")
+        return (f"📈 {self.done:,}/{listed} projects, {self.calls:,} calls "
+                f"({per_min:,.0f}/min) in {format_duration(elapsed)}"
+                + (f" — ETA {format_duration(eta)}" if eta is not None and self.done < self.total else ""))
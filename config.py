@@ -24,3 +24,48 @@ DB_URL      = (
     f"postgresql://{DB_USER}:{DB_PASSWORD}"
     f"@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
+
+# CSV export
+EXPORT_ITERSIZE    = int(os.getenv("EXPORT_ITERSIZE", "2000"))               # rows per server-side cursor fetch
+EXPORT_ENGINE      = os.getenv("EXPORT_ENGINE", "copy")                      # "copy" (COPY TO STDOUT) or "cursor"
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))   # bytes per streamed chunk
+EXPORT_THREADS     = int(os.getenv("EXPORT_THREADS", "8"))                   # worker threads reserved for export streaming
+EXPORT_GZIP_LEVEL  = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))                # 1 (fast) .. 9 (small)
+EXPORT_ZSTD_LEVEL  = int(os.getenv("EXPORT_ZSTD_LEVEL", "3"))                # 1 (fast) .. 19 (small)
+EXPORT_SNAPSHOTS   = os.getenv("EXPORT_SNAPSHOTS", "1") == "1"               # serve /export/full.csv from cached snapshots
+EXPORT_SNAPSHOT_DIR    = os.getenv("EXPORT_SNAPSHOT_DIR", "export_snapshots")
+EXPORT_SNAPSHOT_POLL_S = int(os.getenv("EXPORT_SNAPSHOT_POLL_S", "30"))      # how often to check for new loads
+EXPORT_CHANGES_OVERLAP_S = int(os.getenv("EXPORT_CHANGES_OVERLAP_S", "120"))  # re-read window for /export/changes.csv
+EXPORT_ARROW_BATCH_ROWS = int(os.getenv("EXPORT_ARROW_BATCH_ROWS", "50000"))  # rows per Parquet row group / Arrow batch
+EXPORT_SOURCE      = os.getenv("EXPORT_SOURCE", "table")                     # "table" (dashboard_rows), "view" or "join"
+EXPORT_VIEW_DEBOUNCE_S = int(os.getenv("EXPORT_VIEW_DEBOUNCE_S", "15"))      # refresh once loads go quiet this long...
+EXPORT_VIEW_MAX_LAG_S  = int(os.getenv("EXPORT_VIEW_MAX_LAG_S", "300"))      # ...or at the latest this long after a change
+EXPORT_VIEW_POLL_S     = int(os.getenv("EXPORT_VIEW_POLL_S", "5"))
+
+# /projects read API
+PROJECTS_PAGE_SIZE     = int(os.getenv("PROJECTS_PAGE_SIZE", "100"))         # default ?limit=
+PROJECTS_MAX_PAGE_SIZE = int(os.getenv("PROJECTS_MAX_PAGE_SIZE", "1000"))    # largest ?limit= accepted
+
+# Webhook → RQ ingestion
+REDIS_URL            = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+WEBHOOK_DEBOUNCE_S   = int(os.getenv("WEBHOOK_DEBOUNCE_S", "10"))       # coalesce a project's webhooks for this long
+WEBHOOK_PENDING_TTL_S = int(os.getenv("WEBHOOK_PENDING_TTL_S", "900"))  # safety expiry on the pending key
+WEBHOOK_EVENT_TTL_S  = int(os.getenv("WEBHOOK_EVENT_TTL_S", "86400"))   # remember event ids this long to drop redeliveries
+
+# Filevine API rate budget, shared by every worker/loader through Redis
+API_RATE_LIMIT_RPM   = int(os.getenv("API_RATE_LIMIT_RPM", "600"))          # whole-org budget; 0 disables pacing
+API_RATE_WINDOW_S    = int(os.getenv("API_RATE_WINDOW_S", "10"))            # budget is enforced per window of this size
+API_RATE_SHARE_INCREMENTAL = float(os.getenv("API_RATE_SHARE_INCREMENTAL", "0.5"))  # max share for the incremental lane
+API_RATE_SHARE_BACKFILL    = float(os.getenv("API_RATE_SHARE_BACKFILL", "0.3"))     # max share for the backfill lane
+BULK_TARGET_RPM      = int(os.getenv("BULK_TARGET_RPM", "0"))              # pace bulk runs to this; 0 = the lane's share above
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))   # pooled connections shared by enqueue threads
+WEBHOOK_ENQUEUE_THREADS = int(os.getenv("WEBHOOK_ENQUEUE_THREADS", "32"))  # threads reserved for /webhook enqueues
+
+# Durable webhook journal (webhook_journal.py)
+WEBHOOK_JOURNAL       = os.getenv("WEBHOOK_JOURNAL", "1") == "1"          # append every accepted webhook to Postgres
+WEBHOOK_JOURNAL_BATCH = int(os.getenv("WEBHOOK_JOURNAL_BATCH", "500"))    # most events written per group commit
+
+# Z-drive sync receiver (webhook_receiver.py)
+ZDRIVE_SYNC_WORKERS   = int(os.getenv("ZDRIVE_SYNC_WORKERS", "4"))        # syncs run at once, in-process
+ZDRIVE_SYNC_MAX_QUEUE = int(os.getenv("ZDRIVE_SYNC_MAX_QUEUE", "500"))    # queued syncs before the receiver answers 503
+ZDRIVE_SYNC_IN_PROCESS = os.getenv("ZDRIVE_SYNC_IN_PROCESS", "0") == "1"  # call filevine_to_zdrive_sync.sync_project instead of a subprocess
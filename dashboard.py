@@ -0,0 +1,398 @@
+# dashboard.py
+#
+# dashboard_rows: one pre-joined row per project with every export column,
+# maintained by the loaders in the same transaction as their per-table
+# upserts. Exports and read APIs scan this one table instead of joining seven.
+
+from sqlalchemy import text
+
+# section (source table) -> [(dashboard_rows column, source column)]
+# Names that exist in more than one table get the section's prefix.
+DASHBOARD_SECTIONS = {
+    "projects": [
+        ("project_name",          "project_name"),
+        ("phase_name",            "phase_name"),
+        ("project_type_code",     "project_type_code"),
+        ("date_of_incident",      "date_of_incident"),
+        ("incident_date",         "incident_date"),
+        ("sol_due_date",          "sol_due_date"),
+        ("total_meds",            "total_meds"),
+        ("policy_limits",         "policy_limits"),
+        ("client_contact_count",  "client_contact_count"),
+        ("latest_client_contact", "latest_client_contact"),
+    ],
+    "contacts": [
+        ("case_manager", "case_manager"),
+        ("supervisor",   "supervisor"),
+        ("attorney",     "attorney"),
+        ("paralegal",    "paralegal"),
+    ],
+    "negotiation": [
+        ("negotiator",            "negotiator"),
+        ("settled",               "settled"),
+        ("settled_amount",        "settled_amount"),
+        ("nego_settlement_date",  "settlement_date"),
+        ("date_assigned_to_nego", "date_assigned_to_nego"),
+        ("nego_last_offer",       "last_offer"),
+        ("nego_last_offer_date",  "last_offer_date"),
+    ],
+    "insurance_info": [
+        ("defendant_insurance_name", "defendant_insurance_name"),
+        ("client_insurance_name",    "client_insurance_name"),
+    ],
+    "breakdown_info": [
+        ("lien_negotiator_name",    "lien_negotiator_name"),
+        ("breakdown_date_assigned", "date_assigned"),
+    ],
+    "lit_case_review": [
+        ("trial_date",             "trial_date"),
+        ("date_complaint_filed",   "date_complaint_filed"),
+        ("date_attorney_assigned", "date_attorney_assigned"),
+        ("lit_settlement_amount",  "settlement_amount"),
+        ("lit_settlement_date",    "settlement_date"),
+        ("dismissal_filed_on",     "dismissal_filed_on"),
+    ],
+    "demand_info": [
+        ("demand_approved", "demand_approved"),
+        ("approved_by",     "approved_by"),
+    ],
+}
+
+# Export header -> dashboard_rows column, in the CSV's column order
+# (same order and names as exports.EXPORT_COLUMNS).
+DASHBOARD_EXPORT_COLUMNS = [
+    ("Filevine Template Name",                       "project_type_code"),
+    ("Team Case Manager Full Name",                  "case_manager"),
+    ("Team Supervisor Full Name",                    "supervisor"),
+    ("Team Attorney Full Name",                      "attorney"),
+    ("Team Paralegal Full Name",                     "paralegal"),
+    ("Nego Assigned: Full Name",                     "negotiator"),
+    ("Name",                                         "project_name"),
+    ("Phase",                                        "phase_name"),
+    ("Date of Intake",                               "date_of_incident"),
+    ("Incident Date",                                "incident_date"),
+    ("SOL Due",                                      "sol_due_date"),
+    ("Medical Recs/Bills: Total Amount Billed",      "total_meds"),
+    ("NEGOTIATION: Settled",                         "settled"),
+    ("NEGOTIATION: Settlement Date",                 "nego_settlement_date"),
+    ("Policy Limits",                                "policy_limits"),
+    ("Count of Client Contact Items",                "client_contact_count"),
+    ("Client Contact: Latest Created",               "latest_client_contact"),
+    ("Defendant Insurance",                          "defendant_insurance_name"),
+    ("Client Insurance",                             "client_insurance_name"),
+    ("NEGOTIATION: Date Assigned to Nego",           "date_assigned_to_nego"),
+    ("NEGOTIATION: Last Offer",                      "nego_last_offer"),
+    ("NEGOTIATION: Last Offer Date",                 "nego_last_offer_date"),
+    ("BREAKDOWN: Lien Negotiator Assigned To",       "lien_negotiator_name"),
+    ("BREAKDOWN: Date Assigned To Breakdown",        "breakdown_date_assigned"),
+    ("SETTLEMENT: Latest Date of Settlement",        "nego_settlement_date"),
+    ("Lit Case Summary: Trial Date",                 "trial_date"),
+    ("Lit Case Summary: Date Complaint was Filed",   "date_complaint_filed"),
+    ("Lit Case Summary: Date Attorney was Assigned", "date_attorney_assigned"),
+    ("Lit Case Summary: Settlement Amount",          "lit_settlement_amount"),
+    ("Lit Case Summary: Settlement Date",            "lit_settlement_date"),
+    ("Lit Case Summary: Dismissal Filed On",         "dismissal_filed_on"),
+    ("Demand: Demand Approved",                      "demand_approved"),
+    ("Demand: Approved By",                          "approved_by"),
+]
+
+DASHBOARD_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS dashboard_rows (
+      project_id               BIGINT PRIMARY KEY REFERENCES projects(project_id) ON DELETE CASCADE,
+      project_name             TEXT,
+      phase_name               TEXT,
+      project_type_code        TEXT,
+      date_of_incident         DATE NULL,
+      incident_date            DATE NULL,
+      sol_due_date             DATE NULL,
+      total_meds               NUMERIC(14,2),
+      policy_limits            TEXT,
+      client_contact_count     INTEGER,
+      latest_client_contact    TIMESTAMP NULL,
+      case_manager             TEXT,
+      supervisor               TEXT,
+      attorney                 TEXT,
+      paralegal                TEXT,
+      negotiator               TEXT,
+      settled                  TEXT,
+      settled_amount           NUMERIC(14,2),
+      nego_settlement_date     DATE NULL,
+      date_assigned_to_nego    DATE NULL,
+      nego_last_offer          TEXT,
+      nego_last_offer_date     DATE NULL,
+      defendant_insurance_name TEXT,
+      client_insurance_name    TEXT,
+      lien_negotiator_name     TEXT,
+      breakdown_date_assigned  DATE NULL,
+      trial_date               DATE NULL,
+      date_complaint_filed     DATE NULL,
+      date_attorney_assigned   DATE NULL,
+      lit_settlement_amount    TEXT,
+      lit_settlement_date      DATE NULL,
+      dismissal_filed_on       DATE NULL,
+      demand_approved          DATE NULL,
+      approved_by              TEXT,
+      last_updated             TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS dashboard_rows_last_updated_idx ON dashboard_rows (last_updated)",
+    # /projects filters: equality filter + project_id, so a filtered page is
+    # one index range scan already in keyset order
+    "CREATE INDEX IF NOT EXISTS dashboard_rows_phase_idx        ON dashboard_rows (phase_name, project_id)",
+    "CREATE INDEX IF NOT EXISTS dashboard_rows_type_idx         ON dashboard_rows (project_type_code, project_id)",
+    "CREATE INDEX IF NOT EXISTS dashboard_rows_case_manager_idx ON dashboard_rows (case_manager, project_id)",
+    "CREATE INDEX IF NOT EXISTS dashboard_rows_settled_idx      ON dashboard_rows (settled, project_id)",
+    "CREATE INDEX IF NOT EXISTS dashboard_rows_sol_due_idx      ON dashboard_rows (sol_due_date)",
+]
+
+# settled_amount isn't an export column, but the settled totals below need
+# it; tables created before it existed get it added and filled in once.
+HAS_SETTLED_AMOUNT = text("""
+SELECT EXISTS (
+  SELECT 1 FROM information_schema.columns
+  WHERE table_schema = current_schema()
+    AND table_name = 'dashboard_rows' AND column_name = 'settled_amount'
+)
+""")
+
+ADD_SETTLED_AMOUNT = [
+    "ALTER TABLE dashboard_rows ADD COLUMN settled_amount NUMERIC(14,2)",
+    """
+    UPDATE dashboard_rows d SET settled_amount = n.settled_amount
+    FROM negotiation n
+    WHERE n.project_id = d.project_id AND n.settled_amount IS NOT NULL
+    """,
+]
+
+# Headline numbers, kept current by triggers on dashboard_rows: every
+# insert/update/delete subtracts the row's old contribution and adds its new
+# one, in the same transaction as the loader's write. SOL due dates are
+# bucketed by calendar month ("YYYY-MM"), since "due in the next 30 days"
+# style buckets shift every day without any write to maintain them.
+AGGREGATE_METRICS = [
+    "caseload_case_manager",  # projects per case manager
+    "caseload_attorney",      # projects per attorney
+    "projects_by_phase",      # projects per phase
+    "settled",                # projects and settled_amount per settled status
+    "meds_by_type",           # projects and total_meds per project type
+    "sol_due_month",          # projects per SOL due month ("none" = no date)
+]
+
+AGGREGATE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS dashboard_aggregates (
+      metric    TEXT   NOT NULL,
+      bucket    TEXT   NOT NULL,
+      projects  BIGINT NOT NULL DEFAULT 0,
+      amount    NUMERIC(16,2) NOT NULL DEFAULT 0,
+      PRIMARY KEY (metric, bucket)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION dashboard_contributions(r dashboard_rows, s INTEGER)
+    RETURNS TABLE (metric TEXT, bucket TEXT, projects BIGINT, amount NUMERIC) AS $$
+      SELECT * FROM (VALUES
+        ('caseload_case_manager', COALESCE(r.case_manager, 'N/A'),      s::BIGINT, 0::NUMERIC),
+        ('caseload_attorney',     COALESCE(r.attorney, 'N/A'),          s::BIGINT, 0::NUMERIC),
+        ('projects_by_phase',     COALESCE(r.phase_name, 'N/A'),        s::BIGINT, 0::NUMERIC),
+        ('settled',               COALESCE(r.settled, 'N/A'),           s::BIGINT, s * COALESCE(r.settled_amount, 0)),
+        ('meds_by_type',          COALESCE(r.project_type_code, 'N/A'), s::BIGINT, s * COALESCE(r.total_meds, 0)),
+        ('sol_due_month',         COALESCE(to_char(r.sol_due_date, 'YYYY-MM'), 'none'), s::BIGINT, 0::NUMERIC)
+      ) AS v (metric, bucket, projects, amount)
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    # Row deltas are only staged as rows are written, which locks nothing
+    # shared. A loader transaction writes many rows over several statements
+    # (one per section), so applying them row by row would lock aggregate
+    # rows in whatever order the rows came, and two loaders could deadlock.
+    """
+    CREATE UNLOGGED TABLE IF NOT EXISTS dashboard_aggregate_deltas (
+      txid      BIGINT  NOT NULL,
+      metric    TEXT    NOT NULL,
+      bucket    TEXT    NOT NULL,
+      projects  BIGINT  NOT NULL,
+      amount    NUMERIC NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS dashboard_aggregate_deltas_txid_idx ON dashboard_aggregate_deltas (txid)",
+    """
+    CREATE OR REPLACE FUNCTION apply_dashboard_aggregates() RETURNS trigger AS $$
+    BEGIN
+      INSERT INTO dashboard_aggregate_deltas (txid, metric, bucket, projects, amount)
+      SELECT txid_current(), d.metric, d.bucket, d.projects, d.amount
+      FROM (
+        SELECT * FROM dashboard_contributions(OLD, -1) WHERE TG_OP <> 'INSERT'
+        UNION ALL
+        SELECT * FROM dashboard_contributions(NEW, 1)  WHERE TG_OP <> 'DELETE'
+      ) d;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # Deferred to commit, once per transaction (the flag is transaction-local):
+    # the whole transaction's deltas are summed and applied in one statement
+    # in (metric, bucket) order, so every loader locks aggregate rows in the
+    # same order and only for the moment of its commit.
+    """
+    CREATE OR REPLACE FUNCTION flush_dashboard_aggregates() RETURNS trigger AS $$
+    BEGIN
+      IF COALESCE(current_setting('dashboard.aggregates_flushed', true), '') = '' THEN
+        PERFORM set_config('dashboard.aggregates_flushed', 'on', true);
+        WITH staged AS (
+          DELETE FROM dashboard_aggregate_deltas WHERE txid = txid_current()
+          RETURNING metric, bucket, projects, amount
+        )
+        INSERT INTO dashboard_aggregates AS a (metric, bucket, projects, amount)
+        SELECT metric, bucket, sum(projects), sum(amount)
+        FROM staged
+        GROUP BY metric, bucket
+        HAVING sum(projects) <> 0 OR sum(amount) <> 0
+        ORDER BY metric, bucket
+        ON CONFLICT (metric, bucket) DO UPDATE SET
+          projects = a.projects + EXCLUDED.projects,
+          amount   = a.amount   + EXCLUDED.amount;
+      END IF;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+AGGREGATE_TRIGGERS = {
+    "dashboard_rows_aggregates": """
+    CREATE TRIGGER dashboard_rows_aggregates
+    AFTER INSERT OR UPDATE OR DELETE ON dashboard_rows
+    FOR EACH ROW EXECUTE FUNCTION apply_dashboard_aggregates()
+    """,
+    "dashboard_rows_aggregates_flush": """
+    CREATE CONSTRAINT TRIGGER dashboard_rows_aggregates_flush
+    AFTER INSERT OR UPDATE OR DELETE ON dashboard_rows
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION flush_dashboard_aggregates()
+    """,
+}
+
+# Recount everything from dashboard_rows (used when the aggregates are new).
+REBUILD_AGGREGATES = text("""
+INSERT INTO dashboard_aggregates (metric, bucket, projects, amount)
+SELECT c.metric, c.bucket, sum(c.projects), sum(c.amount)
+FROM dashboard_rows r, LATERAL dashboard_contributions(r, 1) c
+GROUP BY c.metric, c.bucket
+""")
+
+
+# One lock for schema setup, so processes starting together don't both
+# create the same trigger or recount the same aggregates. It's transaction
+# scoped and re-entrant, so nested setup calls can take it again.
+SCHEMA_LOCK = text("SELECT pg_advisory_xact_lock(hashtext('filevine_dashboard_schema'))")
+
+READ_TRIGGERS = text("SELECT tgname FROM pg_trigger WHERE tgname = ANY(:names) AND NOT tgisinternal")
+
+
+def ensure_triggers(conn, triggers):
+    """
+    Run the CREATE TRIGGER for each {trigger name: DDL} that doesn't exist
+    yet. Dropping and recreating on every start would take an ACCESS
+    EXCLUSIVE lock on the table each time, queued behind running exports.
+    """
+    conn.execute(SCHEMA_LOCK)
+    existing = set(conn.execute(READ_TRIGGERS, {"names": list(triggers)}).scalars())
+    for name, ddl in triggers.items():
+        if name not in existing:
+            conn.execute(text(ddl))
+
+
+def _section_sync_sql(table: str, columns, where: str = "project_id = :project_id") -> str:
+    dest = [d for d, _ in columns]
+    src = [s for _, s in columns]
+    return f"""
+INSERT INTO dashboard_rows (project_id, {", ".join(dest)}, last_updated)
+SELECT project_id, {", ".join(src)}, NOW()
+FROM {table}
+WHERE {where}
+ON CONFLICT (project_id) DO UPDATE SET
+  {", ".join(f"{d} = EXCLUDED.{d}" for d in dest)},
+  last_updated = NOW()
+"""
+
+
+# Copy one section's columns from its source table into the project's row.
+SYNC_SECTION = {
+    table: text(_section_sync_sql(table, columns))
+    for table, columns in DASHBOARD_SECTIONS.items()
+}
+
+# The same for many projects at once, for the bulk updaters.
+SYNC_SECTION_MANY = {
+    table: text(_section_sync_sql(table, columns, "project_id = ANY(:project_ids)"))
+    for table, columns in DASHBOARD_SECTIONS.items()
+}
+
+# Full rebuild from the seven tables, used once when dashboard_rows is new.
+# Aliases follow DASHBOARD_SECTIONS order; rows keep their newest source stamp.
+BACKFILL_DASHBOARD_ROWS = text(f"""
+INSERT INTO dashboard_rows (project_id, {", ".join(d for cols in DASHBOARD_SECTIONS.values() for d, _ in cols)}, last_updated)
+SELECT p.project_id, {", ".join(
+    f"{alias}.{s}"
+    for alias, cols in zip("pcnibld", DASHBOARD_SECTIONS.values())
+    for _, s in cols
+)},
+       GREATEST(p.last_updated, c.last_updated, n.last_updated, i.last_updated,
+                b.last_updated, l.last_updated, d.last_updated)
+FROM projects p
+  LEFT JOIN contacts        c USING (project_id)
+  LEFT JOIN negotiation     n USING (project_id)
+  LEFT JOIN insurance_info  i USING (project_id)
+  LEFT JOIN breakdown_info  b USING (project_id)
+  LEFT JOIN lit_case_review l USING (project_id)
+  LEFT JOIN demand_info     d USING (project_id)
+ON CONFLICT (project_id) DO NOTHING
+""")
+
+
+def ensure_dashboard_rows(conn):
+    """
+    Create dashboard_rows and its aggregates if needed. An empty
+    dashboard_rows is filled from the seven tables (the triggers count it
+    into the aggregates on commit); empty aggregates over existing rows
+    are recounted. Runs under SCHEMA_LOCK, so concurrent starts take turns.
+    """
+    conn.execute(SCHEMA_LOCK)
+    for stmt in DASHBOARD_DDL:
+        conn.execute(text(stmt))
+    if not conn.execute(HAS_SETTLED_AMOUNT).scalar():
+        for stmt in ADD_SETTLED_AMOUNT:
+            conn.execute(text(stmt))
+    for stmt in AGGREGATE_DDL:
+        conn.execute(text(stmt))
+    ensure_triggers(conn, AGGREGATE_TRIGGERS)
+    if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM dashboard_aggregates)")).scalar():
+        conn.execute(REBUILD_AGGREGATES)
+    if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM dashboard_rows)")).scalar():
+        n = conn.execute(BACKFILL_DASHBOARD_ROWS).rowcount
+        if n:
+            print(f"🧱 Backfilled dashboard_rows with {n} projects")
+
+
+def sync_dashboard_row(conn, pid, sections):
+    """
+    Bring the project's dashboard row up to date for the given sections
+    (source table names). Call it on the loader's connection, inside the
+    same transaction as the upserts, with only the sections that changed.
+    The projects section goes first so the row exists with its name before
+    detail columns land on it.
+    """
+    for table in DASHBOARD_SECTIONS:
+        if table in sections:
+            conn.execute(SYNC_SECTION[table], {"project_id": pid})
+
+
+def sync_dashboard_rows(conn, pids, sections):
+    """sync_dashboard_row for a batch of projects: one statement per section."""
+    pids = list(pids)
+    if not pids:
+        return
+    for table in DASHBOARD_SECTIONS:
+        if table in sections:
+            conn.execute(SYNC_SECTION_MANY[table], {"project_ids": pids})
@@ -1,14 +1,39 @@
 # database.py
+#
+# Local freshness index: for each project, the /core/projects listing
+# timestamp as of its last successful full load. A bulk sync compares the
+# listing against it and only loads projects modified since.
 
 import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
 DB_PATH = "projects.db"
 
+SQLITE_MAX_VARS = 900   # stay under SQLite's bound-parameter limit
+FLUSH_EVERY     = 100   # buffered record_loaded() writes per transaction
+
+_pending: List[Tuple[int, str]] = []
+_pending_lock = threading.Lock()
+
+
+def connect() -> sqlite3.Connection:
+    """
+    A connection in WAL mode, so a sync writing the index doesn't block
+    another process reading it.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
 def init_db():
     """
     Ensure the `projects` table exists.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     conn.execute("""
       CREATE TABLE IF NOT EXISTS projects (
         project_id    INTEGER PRIMARY KEY,
@@ -23,7 +48,7 @@ def get_last_modified(project_id: int) -> str | None:
     Return the last_modified timestamp for a given project_id,
     or None if the project_id is not found.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cur  = conn.cursor()
     cur.execute(
         "SELECT last_modified FROM projects WHERE project_id = ?",
@@ -32,3 +57,78 @@ def get_last_modified(project_id: int) -> str | None:
     row = cur.fetchone()
     conn.close()
     return row[0] if row else None
+
+
+def get_last_modified_many(project_ids: Iterable[int]) -> Dict[int, str]:
+    """{project_id: last_modified} for the ids that are in the index."""
+    ids = list(project_ids)
+    out = {}
+    conn = connect()
+    for i in range(0, len(ids), SQLITE_MAX_VARS):
+        chunk = ids[i:i + SQLITE_MAX_VARS]
+        out.update(conn.execute(
+            f"SELECT project_id, last_modified FROM projects "
+            f"WHERE project_id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ).fetchall())
+    conn.close()
+    return out
+
+
+def set_last_modified_many(rows: Iterable[Tuple[int, str]]):
+    """Upsert (project_id, last_modified) pairs in one transaction."""
+    conn = connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO projects (project_id, last_modified) VALUES (?, ?) "
+            "ON CONFLICT (project_id) DO UPDATE SET last_modified = excluded.last_modified",
+            list(rows),
+        )
+    conn.close()
+
+
+def _parse(ts: Optional[str]) -> Optional[datetime]:
+    if not ts:
+        return None
+    try:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt
+
+
+def changed_since_load(listing: Dict[int, Optional[str]]) -> List[int]:
+    """
+    The project ids from {project_id: listing timestamp} that need loading:
+    never loaded, modified since their last load, or with a timestamp we
+    can't compare (those are always loaded).
+    """
+    stored = get_last_modified_many(listing)
+    changed = []
+    for pid, modified in listing.items():
+        new, old = _parse(modified), _parse(stored.get(pid))
+        if new is None or old is None or (new.tzinfo is None) != (old.tzinfo is None) or new > old:
+            changed.append(pid)
+    return changed
+
+
+def record_loaded(project_id: int, modified: Optional[str]):
+    """Buffer a successful load's listing timestamp; written FLUSH_EVERY at a time."""
+    if not modified:
+        return
+    with _pending_lock:
+        _pending.append((project_id, modified))
+        if len(_pending) < FLUSH_EVERY:
+            return
+        rows = _pending[:]
+        _pending.clear()
+    set_last_modified_many(rows)
+
+
+def flush():
+    """Write whatever record_loaded() still has buffered."""
+    with _pending_lock:
+        rows = _pending[:]
+        _pending.clear()
+    if rows:
+        set_last_modified_many(rows)
@@ -1,8 +1,28 @@
 #!/usr/bin/env python
+import gzip
+import shutil
 import requests
 from pathlib import Path
 import sys
 
+try:
+    import zstandard
+except ImportError:  # optional: fall back to gzip-only
+    zstandard = None
+
+def open_decoded(resp):
+    """
+    Return a file-like over the response body with any Content-Encoding
+    (zstd / gzip) undone, decompressing as it streams.
+    """
+    resp.raw.decode_content = False  # we decode ourselves, see below
+    encoding = resp.headers.get("Content-Encoding", "").strip().lower()
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(resp.raw)
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=resp.raw)
+    return resp.raw
+
 def main():
     # 1) Endpoint you want to fetch (adjust if you're using your cloudflare tunnel URL)
     URL = "http://localhost:8000/export/full.csv"
@@ -12,13 +32,15 @@ def main():
     downloads.mkdir(exist_ok=True)
     out_file = downloads / "filevine_full_export.csv"
 
-    # 3) Fetch + stream to disk
+    # 3) Ask for a compressed body (zstd if we can decode it, else gzip)
+    accept = "zstd, gzip" if zstandard is not None else "gzip"
+
+    # 4) Fetch + stream to disk
     try:
-        resp = requests.get(URL, stream=True, timeout=30)
+        resp = requests.get(URL, stream=True, timeout=30, headers={"Accept-Encoding": accept})
         resp.raise_for_status()
-        with open(out_file, "wb") as f:
-            for chunk in resp.iter_content(8192):
-                f.write(chunk)
+        with open_decoded(resp) as body, open(out_file, "wb") as f:
+            shutil.copyfileobj(body, f, 1024 * 1024)
         print(f"✅ CSV saved to {out_file}")
     except Exception as e:
         print(f"❌ Failed to download: {e}")
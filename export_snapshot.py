@@ -0,0 +1,223 @@
+# export_snapshot.py
+
+import os
+import json
+import gzip
+import time
+import logging
+import threading
+from pathlib import Path
+from contextlib import ExitStack
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from sqlalchemy import text
+from starlette.responses import FileResponse, Response
+
+from filevine_loader import engine
+from exports import iter_copy_export_csv, negotiate_encoding, zstandard, DATA_VERSION_SQL
+from config import (
+    EXPORT_SNAPSHOT_DIR, EXPORT_SNAPSHOT_POLL_S,
+    EXPORT_GZIP_LEVEL, EXPORT_ZSTD_LEVEL, EXPORT_SOURCE,
+)
+
+logger = logging.getLogger("filevine-export")
+
+SNAPSHOT_DIR = Path(EXPORT_SNAPSHOT_DIR)
+SNAPSHOT_FILENAME = "filevine_full_export.csv"
+
+# The dataset "version" is export_data_version, which moves forward as each
+# writing transaction commits (a max(last_updated) would miss a load that
+# commits after a newer-stamped one). When exports come from the
+# materialized view, it's whatever version the view last refreshed up to
+# instead, so a snapshot is never labelled newer than the rows in it.
+DATA_VERSION_EPOCH_SQL = text(f"""
+SELECT EXTRACT(EPOCH FROM ({DATA_VERSION_SQL}) AT TIME ZONE current_setting('TimeZone'))
+""")
+
+SNAPSHOT_VERSION_SQL = {
+    "table": DATA_VERSION_EPOCH_SQL,  # dashboard_rows is written with the base tables
+    "join":  DATA_VERSION_EPOCH_SQL,
+    "view":  text("""
+SELECT EXTRACT(EPOCH FROM source_version AT TIME ZONE current_setting('TimeZone'))
+FROM dashboard_export_mv_state WHERE id = 1
+"""),
+}[EXPORT_SOURCE]
+
+_build_lock = threading.Lock()
+_current: Optional[dict] = None
+_loaded = False
+
+
+def current_data_version() -> Optional[float]:
+    """Epoch seconds of the latest change to the export data, or None if empty."""
+    with engine.connect() as conn:
+        changed_at = conn.execute(SNAPSHOT_VERSION_SQL).scalar()
+    return float(changed_at) if changed_at is not None else None
+
+
+def current_snapshot() -> Optional[dict]:
+    """
+    Metadata for the newest complete snapshot (possibly stale), or None.
+    On first use it's picked up from current.json, so restarts keep serving.
+    """
+    global _current, _loaded
+    if not _loaded:
+        _loaded = True
+        try:
+            meta = json.loads((SNAPSHOT_DIR / "current.json").read_text())
+            if all((SNAPSHOT_DIR / name).exists() for name in meta["files"].values()):
+                _current = meta
+        except (OSError, ValueError, KeyError):
+            pass
+    return _current
+
+
+def build_snapshot(changed_at: float) -> dict:
+    """
+    Write the full export to disk once, plus gzip (and zstd) copies, then
+    atomically make it the current snapshot. Readers keep getting the
+    previous files until the swap.
+    """
+    global _current
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    version = str(int(changed_at * 1_000_000))
+    stem = f"full_{version}"
+    files = {"identity": f"{stem}.csv", "gzip": f"{stem}.csv.gz"}
+    if zstandard is not None:
+        files["zstd"] = f"{stem}.csv.zst"
+
+    started = time.monotonic()
+    with ExitStack() as stack:
+        raw = stack.enter_context(open(SNAPSHOT_DIR / (files["identity"] + ".tmp"), "wb"))
+        gz = stack.enter_context(gzip.open(SNAPSHOT_DIR / (files["gzip"] + ".tmp"), "wb",
+                                           compresslevel=EXPORT_GZIP_LEVEL))
+        sinks = [raw, gz]
+        if "zstd" in files:
+            zst = zstandard.ZstdCompressor(level=EXPORT_ZSTD_LEVEL).stream_writer(
+                open(SNAPSHOT_DIR / (files["zstd"] + ".tmp"), "wb"))
+            sinks.append(stack.enter_context(zst))
+        for chunk in iter_copy_export_csv():
+            for sink in sinks:
+                sink.write(chunk)
+
+    for name in files.values():
+        os.replace(SNAPSHOT_DIR / (name + ".tmp"), SNAPSHOT_DIR / name)
+
+    meta = {
+        "version": version,
+        "changed_at": changed_at,
+        "built_at": time.time(),
+        "files": files,
+    }
+    tmp_meta = SNAPSHOT_DIR / "current.json.tmp"
+    tmp_meta.write_text(json.dumps(meta))
+    os.replace(tmp_meta, SNAPSHOT_DIR / "current.json")
+
+    previous, _current = _current, meta
+    logger.info("📦 Export snapshot %s built in %.1fs", version, time.monotonic() - started)
+    _prune(keep={meta["version"], previous["version"] if previous else None})
+    return meta
+
+
+def _prune(keep: set):
+    """Delete snapshot files other than the current and previous version."""
+    for path in SNAPSHOT_DIR.glob("full_*"):
+        version = path.name.split(".")[0][len("full_"):]
+        if version in keep:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            # still being served (Windows won't unlink open files); next prune gets it
+            pass
+
+
+def refresh_snapshot() -> bool:
+    """
+    Rebuild the snapshot if the data has changed since it was taken.
+    Only one build runs at a time; returns True if this call built one.
+    """
+    if not _build_lock.acquire(blocking=False):
+        return False
+    try:
+        changed_at = current_data_version()
+        if changed_at is None:
+            return False
+        snap = current_snapshot()
+        if snap and snap["changed_at"] >= changed_at:
+            return False
+        build_snapshot(changed_at)
+        return True
+    except Exception:
+        logger.exception("❌ Export snapshot rebuild failed")
+        return False
+    finally:
+        _build_lock.release()
+
+
+def request_refresh():
+    """Kick off refresh_snapshot() in the background (no-op if one is running)."""
+    if not _build_lock.locked():
+        threading.Thread(target=refresh_snapshot, name="export-snapshot", daemon=True).start()
+
+
+def start_refresher():
+    """Poll the data version every EXPORT_SNAPSHOT_POLL_S and rebuild after loads."""
+    def loop():
+        while True:
+            refresh_snapshot()
+            time.sleep(EXPORT_SNAPSHOT_POLL_S)
+
+    threading.Thread(target=loop, name="export-snapshot-poller", daemon=True).start()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any(t.removeprefix("W/") == etag for t in tags)
+
+
+def _not_modified_since(if_modified_since: str, changed_at: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have 1s resolution
+    return int(changed_at) <= since
+
+
+def snapshot_response(req_headers, snap: dict) -> Response:
+    """
+    Serve a snapshot with ETag/Last-Modified validators: 304 for a matching
+    conditional GET, otherwise a FileResponse (which handles Range/If-Range
+    and uses the server's sendfile path when available).
+    """
+    files = snap["files"]
+    encoding = negotiate_encoding(req_headers.get("accept-encoding"))
+    if encoding not in files:
+        encoding = None
+
+    suffix = f"-{encoding}" if encoding else ""
+    headers = {
+        "ETag": f'"{snap["version"]}{suffix}"',
+        "Last-Modified": formatdate(snap["changed_at"], usegmt=True),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+
+    inm = req_headers.get("if-none-match")
+    ims = req_headers.get("if-modified-since")
+    if (inm and _etag_matches(inm, headers["ETag"])) or \
+       (not inm and ims and _not_modified_since(ims, snap["changed_at"])):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f'attachment; filename="{SNAPSHOT_FILENAME}"'
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(
+        SNAPSHOT_DIR / files[encoding or "identity"],
+        media_type="text/csv",
+        headers=headers,
+    )
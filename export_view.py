@@ -0,0 +1,166 @@
+# export_view.py
+
+import time
+import logging
+import threading
+from typing import Optional
+
+from sqlalchemy import text
+
+from filevine_loader import engine
+from exports import EXPORT_VIEW_DDL, DATA_VERSION_SQL
+from config import EXPORT_VIEW_DEBOUNCE_S, EXPORT_VIEW_MAX_LAG_S, EXPORT_VIEW_POLL_S
+
+logger = logging.getLogger("filevine-export")
+
+# One row: the newest data version (export_data_version) the view is known
+# to contain, so the snapshot builder can label files with the view's
+# version rather than the (possibly newer) base tables'.
+VIEW_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS dashboard_export_mv_state (
+  id              SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  source_version  TIMESTAMP,
+  refreshed_at    TIMESTAMPTZ,
+  refresh_seconds DOUBLE PRECISION
+)
+"""
+
+UPSERT_VIEW_STATE = text("""
+INSERT INTO dashboard_export_mv_state (id, source_version, refreshed_at, refresh_seconds)
+VALUES (1, :source_version, NOW(), :refresh_seconds)
+ON CONFLICT (id) DO UPDATE SET
+  source_version  = EXCLUDED.source_version,
+  refreshed_at    = EXCLUDED.refreshed_at,
+  refresh_seconds = EXCLUDED.refresh_seconds
+""")
+
+READ_VIEW_VERSION = text("SELECT source_version FROM dashboard_export_mv_state WHERE id = 1")
+
+# in-process numbers for /metrics
+metrics = {
+    "refreshes_total":         0,
+    "refresh_failures_total":  0,
+    "last_refresh_seconds":    None,  # duration of the last successful refresh
+    "last_refreshed_at":       None,  # epoch seconds
+    "pending_since":           None,  # monotonic time the view first fell behind
+}
+
+
+def ensure_export_view():
+    """
+    Create the materialized view, its unique index and the state table.
+    On first creation the view is populated from the current tables, so
+    that's recorded as its version straight away.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(VIEW_STATE_DDL))
+        exists = conn.execute(text("SELECT to_regclass('dashboard_export_mv')")).scalar()
+        if exists is None:
+            logger.info("🛠 Creating materialized view dashboard_export_mv")
+            version = conn.execute(text(DATA_VERSION_SQL)).scalar()
+            for stmt in EXPORT_VIEW_DDL:
+                conn.execute(text(stmt))
+            conn.execute(UPSERT_VIEW_STATE, {"source_version": version, "refresh_seconds": None})
+
+
+def data_version():
+    """The base tables' commit-ordered version (export_data_version)."""
+    with engine.connect() as conn:
+        return conn.execute(text(DATA_VERSION_SQL)).scalar()
+
+
+def view_version():
+    """Newest data version the view is known to include (None = unknown)."""
+    with engine.connect() as conn:
+        return conn.execute(READ_VIEW_VERSION).scalar()
+
+
+def refresh_export_view(source_version=None):
+    """
+    REFRESH MATERIALIZED VIEW CONCURRENTLY and record what it now contains.
+    The version is read *before* the refresh, so anything committed while
+    it runs is picked up by the next one.
+    """
+    started = time.monotonic()
+    if source_version is None:
+        source_version = data_version()
+    # CONCURRENTLY can't run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY dashboard_export_mv"))
+        elapsed = time.monotonic() - started
+        conn.execute(UPSERT_VIEW_STATE, {"source_version": source_version, "refresh_seconds": elapsed})
+
+    metrics["refreshes_total"] += 1
+    metrics["last_refresh_seconds"] = elapsed
+    metrics["last_refreshed_at"] = time.time()
+    logger.info("🔄 dashboard_export_mv refreshed in %.1fs", elapsed)
+    return elapsed
+
+
+def staleness_seconds() -> float:
+    """How long the view has been behind the base tables (0 when current)."""
+    pending = metrics["pending_since"]
+    return time.monotonic() - pending if pending is not None else 0.0
+
+
+def start_view_refresher():
+    """
+    Poll data_version() every EXPORT_VIEW_POLL_S. Once the view is behind,
+    refresh when loads have gone quiet for EXPORT_VIEW_DEBOUNCE_S, or at the
+    latest EXPORT_VIEW_MAX_LAG_S after it first fell behind, so a steady
+    stream of webhooks can't postpone it forever. The version follows
+    commit order, so a load that commits late still moves it past the
+    view's.
+    """
+    def loop():
+        current = view_version()
+        seen: Optional[object] = None  # latest change observed on the previous poll
+        last_activity = 0.0
+        while True:
+            try:
+                latest = data_version()
+                now = time.monotonic()
+                if latest is not None and (current is None or latest > current):
+                    if metrics["pending_since"] is None:
+                        metrics["pending_since"] = now
+                    if latest != seen:
+                        seen, last_activity = latest, now
+                    quiet = now - last_activity >= EXPORT_VIEW_DEBOUNCE_S
+                    overdue = now - metrics["pending_since"] >= EXPORT_VIEW_MAX_LAG_S
+                    if quiet or overdue:
+                        refresh_export_view(latest)
+                        current = latest
+                        metrics["pending_since"] = None
+                else:
+                    metrics["pending_since"] = None
+            except Exception:
+                metrics["refresh_failures_total"] += 1
+                logger.exception("❌ dashboard_export_mv refresh failed")
+            time.sleep(EXPORT_VIEW_POLL_S)
+
+    threading.Thread(target=loop, name="export-view-refresher", daemon=True).start()
+
+
+def metrics_text() -> str:
+    """The view's refresh metrics in Prometheus text exposition format."""
+    lines = [
+        "# HELP export_view_refreshes_total Successful REFRESH MATERIALIZED VIEW runs.",
+        "# TYPE export_view_refreshes_total counter",
+        f"export_view_refreshes_total {metrics['refreshes_total']}",
+        "# HELP export_view_refresh_failures_total Failed refresh attempts.",
+        "# TYPE export_view_refresh_failures_total counter",
+        f"export_view_refresh_failures_total {metrics['refresh_failures_total']}",
+        "# HELP export_view_staleness_seconds Time the view has been behind the base tables.",
+        "# TYPE export_view_staleness_seconds gauge",
+        f"export_view_staleness_seconds {staleness_seconds():.3f}",
+    ]
+    if metrics["last_refresh_seconds"] is not None:
+        lines += [
+            "# HELP export_view_last_refresh_seconds Duration of the last refresh.",
+            "# TYPE export_view_last_refresh_seconds gauge",
+            f"export_view_last_refresh_seconds {metrics['last_refresh_seconds']:.3f}",
+            "# HELP export_view_last_refresh_timestamp_seconds When the last refresh finished.",
+            "# TYPE export_view_last_refresh_timestamp_seconds gauge",
+            f"export_view_last_refresh_timestamp_seconds {metrics['last_refreshed_at']:.3f}",
+        ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,472 @@
+# exports.py
+
+import io
+import csv
+import zlib
+import re
+import base64
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+import anyio
+
+try:
+    import zstandard
+except ImportError:  # optional: without it we only offer gzip
+    zstandard = None
+
+from filevine_loader import engine
+from dashboard import DASHBOARD_EXPORT_COLUMNS
+from config import (
+    EXPORT_ITERSIZE, EXPORT_CHUNK_BYTES, EXPORT_THREADS,
+    EXPORT_GZIP_LEVEL, EXPORT_ZSTD_LEVEL, EXPORT_CHANGES_OVERLAP_S,
+    EXPORT_SOURCE,
+)
+
+# The dashboard dataset: every project joined to its six detail tables,
+# with the friendly column names Power BI expects.
+EXPORT_COLUMNS = """
+  p.project_type_code   AS "Filevine Template Name",
+  c.case_manager        AS "Team Case Manager Full Name",
+  c.supervisor          AS "Team Supervisor Full Name",
+  c.attorney            AS "Team Attorney Full Name",
+  c.paralegal           AS "Team Paralegal Full Name",
+  n.negotiator          AS "Nego Assigned: Full Name",
+  p.project_name        AS "Name",
+  p.phase_name          AS "Phase",
+  p.date_of_incident    AS "Date of Intake",
+  p.incident_date       AS "Incident Date",
+  p.sol_due_date        AS "SOL Due",
+  p.total_meds          AS "Medical Recs/Bills: Total Amount Billed",
+  n.settled             AS "NEGOTIATION: Settled",
+  n.settlement_date     AS "NEGOTIATION: Settlement Date",
+  p.policy_limits       AS "Policy Limits",
+  p.client_contact_count      AS "Count of Client Contact Items",
+  p.latest_client_contact     AS "Client Contact: Latest Created",
+  i.defendant_insurance_name  AS "Defendant Insurance",
+  i.client_insurance_name     AS "Client Insurance",
+  n.date_assigned_to_nego     AS "NEGOTIATION: Date Assigned to Nego",
+  n.last_offer                AS "NEGOTIATION: Last Offer",
+  n.last_offer_date           AS "NEGOTIATION: Last Offer Date",
+  b.lien_negotiator_name      AS "BREAKDOWN: Lien Negotiator Assigned To",
+  b.date_assigned             AS "BREAKDOWN: Date Assigned To Breakdown",
+  n.settlement_date           AS "SETTLEMENT: Latest Date of Settlement",
+  l.trial_date                AS "Lit Case Summary: Trial Date",
+  l.date_complaint_filed      AS "Lit Case Summary: Date Complaint was Filed",
+  l.date_attorney_assigned    AS "Lit Case Summary: Date Attorney was Assigned",
+  l.settlement_amount         AS "Lit Case Summary: Settlement Amount",
+  l.settlement_date           AS "Lit Case Summary: Settlement Date",
+  l.dismissal_filed_on        AS "Lit Case Summary: Dismissal Filed On",
+  d.demand_approved           AS "Demand: Demand Approved",
+  d.approved_by               AS "Demand: Approved By"
+"""
+
+EXPORT_JOINS = """
+FROM projects p
+  LEFT JOIN contacts        c USING (project_id)
+  LEFT JOIN negotiation     n USING (project_id)
+  LEFT JOIN insurance_info  i USING (project_id)
+  LEFT JOIN breakdown_info  b USING (project_id)
+  LEFT JOIN lit_case_review l USING (project_id)
+  LEFT JOIN demand_info     d USING (project_id)
+"""
+
+EXPORT_HEADERS = re.findall(r'AS "([^"]+)"', EXPORT_COLUMNS)
+
+FULL_EXPORT_QUERY = f"""
+SELECT{EXPORT_COLUMNS}{EXPORT_JOINS}ORDER BY p.project_id
+"""
+
+# The same join kept as a materialized view (see export_view.py), so full
+# exports are a plain scan instead of a seven-way join per request.
+# last_changed is informational; the unique index is what lets
+# REFRESH ... CONCURRENTLY run without blocking readers.
+EXPORT_VIEW_DDL = [
+    f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS dashboard_export_mv AS
+SELECT
+  p.project_id,{EXPORT_COLUMNS.rstrip()},
+  GREATEST(p.last_updated, c.last_updated, n.last_updated, i.last_updated,
+           b.last_updated, l.last_updated, d.last_updated) AS last_changed{EXPORT_JOINS}""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS dashboard_export_mv_project_id_idx ON dashboard_export_mv (project_id)",
+]
+
+VIEW_EXPORT_QUERY = (
+    "SELECT " + ", ".join(f'"{h}"' for h in EXPORT_HEADERS)
+    + " FROM dashboard_export_mv ORDER BY project_id"
+)
+
+# dashboard_rows (see dashboard.py) is kept current by the loaders at write
+# time, so this is a single-table scan that is never behind the base tables.
+TABLE_EXPORT_COLUMNS = ",\n".join(
+    f'  {column:<24} AS "{header}"' for header, column in DASHBOARD_EXPORT_COLUMNS
+)
+
+TABLE_EXPORT_QUERY = f"""
+SELECT
+{TABLE_EXPORT_COLUMNS}
+FROM dashboard_rows
+ORDER BY project_id
+"""
+
+EXPORT_QUERIES = {
+    "table": TABLE_EXPORT_QUERY,
+    "join":  FULL_EXPORT_QUERY,
+    "view":  VIEW_EXPORT_QUERY,
+}
+
+
+def export_query() -> str:
+    """The full-export SQL for the configured EXPORT_SOURCE."""
+    return EXPORT_QUERIES[EXPORT_SOURCE]
+
+
+# Projects with a row in any of the seven tables changed after %(since)s.
+# Each branch is a range scan on that table's last_updated index.
+CHANGED_PROJECT_IDS = """
+  SELECT project_id FROM projects        WHERE last_updated > %(since)s
+  UNION SELECT project_id FROM contacts        WHERE last_updated > %(since)s
+  UNION SELECT project_id FROM negotiation     WHERE last_updated > %(since)s
+  UNION SELECT project_id FROM insurance_info  WHERE last_updated > %(since)s
+  UNION SELECT project_id FROM breakdown_info  WHERE last_updated > %(since)s
+  UNION SELECT project_id FROM lit_case_review WHERE last_updated > %(since)s
+  UNION SELECT project_id FROM demand_info     WHERE last_updated > %(since)s
+"""
+
+# Same columns as the full export, led by the project id so consumers can
+# merge the rows into what they already have.
+CHANGES_EXPORT_QUERY = f"""
+SELECT
+  p.project_id          AS "Project ID",{EXPORT_COLUMNS}{EXPORT_JOINS}WHERE p.project_id IN ({CHANGED_PROJECT_IDS})
+ORDER BY p.project_id
+"""
+
+# The same delta off dashboard_rows: one range scan on its last_updated index,
+# which the loaders bump whenever any section of the row changes.
+TABLE_CHANGES_EXPORT_QUERY = f"""
+SELECT
+  project_id               AS "Project ID",
+{TABLE_EXPORT_COLUMNS}
+FROM dashboard_rows
+WHERE last_updated > %(since)s
+ORDER BY project_id
+"""
+
+
+def changes_query() -> str:
+    """
+    The delta SQL for the configured EXPORT_SOURCE. The materialized view
+    can lag, so with EXPORT_SOURCE=view deltas still read the base tables.
+    """
+    return TABLE_CHANGES_EXPORT_QUERY if EXPORT_SOURCE == "table" else CHANGES_EXPORT_QUERY
+
+
+# Projects deleted after %(since)s (and not re-created since).
+DELETIONS_EXPORT_QUERY = """
+SELECT
+  d.project_id          AS "Project ID",
+  d.deleted_at          AS "Deleted At"
+FROM project_deletions d
+WHERE d.deleted_at > %(since)s
+  AND NOT EXISTS (SELECT 1 FROM projects p WHERE p.project_id = d.project_id)
+ORDER BY d.project_id
+"""
+
+# The dataset's commit-ordered version (see export_data_version in
+# filevine_loader): what snapshots and the export view are labelled with.
+DATA_VERSION_SQL = "SELECT changed_at FROM export_data_version WHERE id = 1"
+
+# Newest change stamp anywhere in the dataset (DB-local, like last_updated);
+# the delta cursors compare against last_updated, so they use this instead.
+LATEST_CHANGE_SQL = """
+SELECT GREATEST(
+  (SELECT max(last_updated) FROM projects),
+  (SELECT max(last_updated) FROM contacts),
+  (SELECT max(last_updated) FROM negotiation),
+  (SELECT max(last_updated) FROM insurance_info),
+  (SELECT max(last_updated) FROM breakdown_info),
+  (SELECT max(last_updated) FROM lit_case_review),
+  (SELECT max(last_updated) FROM demand_info),
+  (SELECT max(deleted_at)   FROM project_deletions)
+)
+"""
+
+# How many COPY chunks may sit between the DB thread and the response.
+COPY_QUEUE_DEPTH = 64
+
+
+def iter_full_export_csv(query: Optional[str] = None, params: Optional[dict] = None, bind=None):
+    """
+    Streams exactly the joined columns & friendly headers you specified,
+    straight out of Postgres as CSV (rows are formatted in Python).
+    Rows are batched into ~EXPORT_CHUNK_BYTES strings before each yield.
+    """
+    # 1) Open a raw DB connection and a *named* (server-side) cursor, so
+    #    Postgres hands rows over EXPORT_ITERSIZE at a time instead of
+    #    psycopg2 buffering the whole join in this process.
+    query = query or export_query()
+    conn = (bind or engine).raw_connection()
+    cursor = conn.cursor(name="full_export")
+
+    try:
+        # 2) Execute the plain SQL string
+        cursor.execute(query, params)
+
+        # 3) Write the header (a named cursor only fills in
+        #    .description once the first FETCH has run)
+        rows = cursor.fetchmany(EXPORT_ITERSIZE)
+        header = [col[0] for col in cursor.description]
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(header)
+
+        # 4) Write rows, handing the buffer over each time it fills up
+        while rows:
+            for row in rows:
+                writer.writerow(row)
+                if buf.tell() >= EXPORT_CHUNK_BYTES:
+                    yield buf.getvalue()
+                    buf = io.StringIO()
+                    writer = csv.writer(buf)
+            rows = cursor.fetchmany(EXPORT_ITERSIZE)
+
+        if buf.tell():
+            yield buf.getvalue()
+    finally:
+        # also runs when the client disconnects mid-download
+        cursor.close()
+        conn.close()
+
+
+class _ExportCancelled(Exception):
+    """Raised inside the COPY thread once the consumer has gone away."""
+
+
+class _QueueSink:
+    """
+    File-like target for cursor.copy_expert(). psycopg2 writes one COPY
+    message (≈ one row) at a time; those are collected into
+    ~EXPORT_CHUNK_BYTES blocks and handed to a bounded queue, so the COPY
+    can't run ahead of the client.
+    """
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.pending = bytearray()
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise _ExportCancelled()
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data):
+        self.pending += data
+        if len(self.pending) >= EXPORT_CHUNK_BYTES:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.pending:
+            self.put(bytes(self.pending))
+            self.pending.clear()
+
+
+_COPY_DONE = object()
+
+
+def iter_copy_export_csv(query: Optional[str] = None, params: Optional[dict] = None, bind=None):
+    """
+    Streams the export as raw bytes from
+    `COPY (query) TO STDOUT WITH (FORMAT csv, HEADER)`.
+
+    Postgres does the CSV formatting, so no Python row objects are built.
+    psycopg2's copy_expert() only returns once the whole COPY is done, so it
+    runs on a helper thread that feeds a bounded queue this generator drains.
+    COPY can't take bind parameters, so `params` are inlined with mogrify().
+    """
+    copy_sql = f"COPY ({query or export_query()}) TO STDOUT WITH (FORMAT csv, HEADER)"
+    conn = (bind or engine).raw_connection()
+    chunks: queue.Queue = queue.Queue(maxsize=COPY_QUEUE_DEPTH)
+    cancelled = threading.Event()
+
+    sink = _QueueSink(chunks, cancelled)
+
+    def run_copy():
+        try:
+            try:
+                with conn.cursor() as cursor:
+                    sql = cursor.mogrify(copy_sql, params).decode() if params else copy_sql
+                    cursor.copy_expert(sql, sink)
+                sink.flush()
+            except _ExportCancelled:
+                raise
+            except Exception as e:
+                sink.put(e)
+            sink.put(_COPY_DONE)
+        except _ExportCancelled:
+            pass
+
+    worker = threading.Thread(target=run_copy, name="export-copy", daemon=True)
+    worker.start()
+
+    finished = False
+    try:
+        while True:
+            item = chunks.get()
+            if item is _COPY_DONE:
+                finished = True
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        worker.join()
+        if finished:
+            conn.close()
+        else:
+            # an aborted COPY leaves the connection mid-protocol; drop it
+            # rather than hand it back to the pool
+            conn.invalidate()
+
+
+def latest_change(bind=None) -> Optional[datetime]:
+    """Newest last_updated/deleted_at across the dataset, or None if empty."""
+    conn = (bind or engine).raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(LATEST_CHANGE_SQL)
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def encode_change_cursor(ts: datetime) -> str:
+    """Opaque, URL-safe cursor for the changes/deletions endpoints."""
+    return base64.urlsafe_b64encode(ts.isoformat().encode()).decode().rstrip("=")
+
+
+def decode_change_cursor(token: str) -> datetime:
+    """Inverse of encode_change_cursor(); raises ValueError on garbage."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {token!r}") from e
+    return datetime.fromisoformat(raw)
+
+
+def change_params(since: datetime) -> dict:
+    """
+    Query params for CHANGES_/DELETIONS_EXPORT_QUERY. `last_updated` is the
+    writing transaction's start time, so a load that commits after a cursor
+    was handed out can carry an older stamp; re-reading the last
+    EXPORT_CHANGES_OVERLAP_S seconds catches those (repeats are harmless,
+    consumers merge on Project ID).
+    """
+    return {"since": since - timedelta(seconds=EXPORT_CHANGES_OVERLAP_S)}
+
+
+def supported_encodings() -> list:
+    """Content-codings we can produce, best first."""
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick a Content-Encoding from an Accept-Encoding header, or None for
+    identity. Honors q-values (q=0 means "never"); on a tie zstd wins.
+    """
+    if not accept_encoding:
+        return None
+    offered = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            offered[token] = q
+
+    best, best_q = None, 0.0
+    for enc in supported_encodings():
+        q = offered.get(enc, offered.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def iter_compressed(chunks, encoding: Optional[str]):
+    """
+    Compress an export stream on the fly. Each input chunk is fed to one
+    long-lived compressor, so memory stays flat however big the export is.
+    """
+    if encoding is None:
+        yield from chunks
+        return
+
+    if encoding == "zstd":
+        comp = zstandard.ZstdCompressor(level=EXPORT_ZSTD_LEVEL).compressobj()
+    elif encoding == "gzip":
+        comp = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    else:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            out = comp.compress(chunk)
+            if out:
+                yield out
+        tail = comp.flush()
+        if tail:
+            yield tail
+    finally:
+        chunks.close()
+
+
+_END = object()
+_export_limiter = None
+
+
+def _get_export_limiter() -> anyio.CapacityLimiter:
+    # created lazily: a CapacityLimiter has to be built inside the event loop
+    global _export_limiter
+    if _export_limiter is None:
+        _export_limiter = anyio.CapacityLimiter(EXPORT_THREADS)
+    return _export_limiter
+
+
+async def aiter_export(chunks):
+    """
+    Drive a blocking export generator from the event loop.
+
+    Each chunk is pulled with its own short worker-thread hop on a dedicated
+    limiter (EXPORT_THREADS), so a long download only holds a thread while a
+    chunk is being produced and never starves the app's shared threadpool.
+    """
+    limiter = _get_export_limiter()
+    try:
+        while True:
+            chunk = await anyio.to_thread.run_sync(next, chunks, _END, limiter=limiter)
+            if chunk is _END:
+                break
+            yield chunk
+    finally:
+        # shielded: on a client disconnect we're already being cancelled,
+        # but the generator still has to close its cursor/connection
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(chunks.close, limiter=limiter)
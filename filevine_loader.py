@@ -4,7 +4,11 @@ from datetime import datetime
 from auth_refresh import get_dynamic_headers
 import re
 from sqlalchemy import create_engine, text
-from typing import Optional, List
+from typing import Callable, Iterable, Iterator, Optional, List
+from dashboard import SCHEMA_LOCK, ensure_dashboard_rows, ensure_triggers, sync_dashboard_row
+import database
+from load_runs import ensure_load_runs, create_run, latest_open_run, listing_complete, run_load, failed_projects
+import rate_budget
 # --- Configuration ---
 API_BASE_URL   = "https://calljacob.api.filevineapp.com"
 COMM_KEYWORDS  = re.compile(r"\b(spoke|call|text|message|vm)\b", re.IGNORECASE)
@@ -95,22 +99,137 @@ CREATE TABLE IF NOT EXISTS demand_info (
   demand_approved DATE NULL,
   approved_by     TEXT
 );
+
+-- tombstones for deleted projects, so "what changed" also covers removals
+CREATE TABLE IF NOT EXISTS project_deletions (
+  project_id  BIGINT    PRIMARY KEY,
+  deleted_at  TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- the dataset's version for export snapshots and the export view: moved
+-- forward by deferred triggers as each writing transaction commits, so it
+-- follows commit order (last_updated is transaction *start* time, and a
+-- load that commits late can carry an older stamp than one before it)
+CREATE TABLE IF NOT EXISTS export_data_version (
+  id          SMALLINT  PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  changed_at  TIMESTAMP NOT NULL
+);
+INSERT INTO export_data_version (id, changed_at) VALUES (1, NOW())
+ON CONFLICT (id) DO NOTHING
 """
 
+# tables whose commits move export_data_version
+VERSIONED_TABLES = [
+    "projects", "contacts", "negotiation", "insurance_info",
+    "breakdown_info", "lit_case_review", "demand_info", "project_deletions",
+]
+
+# Change tracking: every table carries a last_updated stamp (only bumped by
+# the upserts below when a row really changes), indexed for cheap
+# max()/range scans. Columns and indexes are looked up in the catalog first
+# and only the missing ones are added: this runs on every import, and
+# ALTER TABLE takes an ACCESS EXCLUSIVE lock (CREATE INDEX a SHARE lock)
+# even when there's nothing to do.
+CHANGE_TRACKED_TABLES = [
+    "projects", "negotiation", "insurance_info", "breakdown_info",
+    "lit_case_review", "contacts", "demand_info",
+]
+
+CHANGE_TRACKING_INDEXES = {
+    **{f"{table}_last_updated_idx": f"CREATE INDEX IF NOT EXISTS {table}_last_updated_idx ON {table} (last_updated)"
+       for table in CHANGE_TRACKED_TABLES},
+    "project_deletions_deleted_at_idx":
+        "CREATE INDEX IF NOT EXISTS project_deletions_deleted_at_idx ON project_deletions (deleted_at)",
+}
+
+MISSING_LAST_UPDATED = text("""
+SELECT t FROM unnest(CAST(:tables AS TEXT[])) AS t
+WHERE NOT EXISTS (
+  SELECT 1 FROM information_schema.columns c
+  WHERE c.table_schema = current_schema() AND c.table_name = t AND c.column_name = 'last_updated'
+)
+""")
+
+MISSING_INDEXES = text("SELECT i FROM unnest(CAST(:names AS TEXT[])) AS i WHERE to_regclass(i) IS NULL")
+
+
+def ensure_change_tracking(conn):
+    conn.execute(SCHEMA_LOCK)
+    for table in conn.execute(MISSING_LAST_UPDATED, {"tables": CHANGE_TRACKED_TABLES}).scalars():
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS last_updated TIMESTAMP DEFAULT NOW()"))
+    for name in conn.execute(MISSING_INDEXES, {"names": list(CHANGE_TRACKING_INDEXES)}).scalars():
+        conn.execute(text(CHANGE_TRACKING_INDEXES[name]))
+
+# Statements with bodies containing ';' can't go through the DDL.split() above.
+TRIGGER_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION record_project_deletion() RETURNS trigger AS $$
+    BEGIN
+      INSERT INTO project_deletions (project_id, deleted_at)
+      VALUES (OLD.project_id, NOW())
+      ON CONFLICT (project_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+      RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # Deferred to commit, once per transaction (the flag is transaction-local).
+    # The row lock makes committers take turns, and GREATEST keeps the
+    # version strictly increasing even if the clock steps back.
+    """
+    CREATE OR REPLACE FUNCTION bump_export_data_version() RETURNS trigger AS $$
+    BEGIN
+      IF COALESCE(current_setting('export.version_bumped', true), '') = '' THEN
+        PERFORM set_config('export.version_bumped', 'on', true);
+        UPDATE export_data_version
+           SET changed_at = GREATEST(clock_timestamp()::timestamp, changed_at + interval '1 microsecond')
+         WHERE id = 1;
+      END IF;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+# Created only when missing (see dashboard.ensure_triggers).
+TRIGGERS = {
+    "projects_record_deletion": """
+    CREATE TRIGGER projects_record_deletion
+    AFTER DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION record_project_deletion()
+    """,
+    **{
+        f"{table}_bump_export_version": f"""
+    CREATE CONSTRAINT TRIGGER {table}_bump_export_version
+    AFTER INSERT OR UPDATE OR DELETE ON {table}
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION bump_export_data_version()
+    """
+        for table in VERSIONED_TABLES
+    },
+}
+
 with engine.begin() as conn:
     for stmt in DDL.split(";"):
         stmt = stmt.strip()
         if stmt:
             conn.execute(text(stmt))
+    ensure_change_tracking(conn)
+    for stmt in TRIGGER_DDL:
+        conn.execute(text(stmt))
+    ensure_triggers(conn, TRIGGERS)
+    ensure_dashboard_rows(conn)
+    ensure_load_runs(conn)
 
 
 def fetch_json(endpoint):
     headers = get_dynamic_headers()
     try:
+        rate_budget.acquire()
         r = requests.get(API_BASE_URL + endpoint, headers=headers)
         if r.status_code == 401:
             # retry once on unauthorized
             headers = get_dynamic_headers()
+            rate_budget.acquire()
             r = requests.get(API_BASE_URL + endpoint, headers=headers)
         elif r.status_code == 429:
             # Handle rate limiting
@@ -155,13 +274,14 @@ def sol_dol_meds_policy_limits(pid):
                 out[label] = format_date(val) if ft == "DateOnly" else val or "N/A"
     return out
 
-def get_intake_date(pid):
-    # First get the project type code
-    project_data = fetch_json(f"/core/projects/{pid}")
-    if not project_data:
-        return "N/A"
-    
-    project_type_code = project_data.get("projectTypeCode", "").strip()
+def get_intake_date(pid, project_type_code=None):
+    # First get the project type code (callers that already have the project pass it in)
+    if project_type_code is None:
+        project_data = fetch_json(f"/core/projects/{pid}")
+        if not project_data:
+            return "N/A"
+        project_type_code = project_data.get("projectTypeCode") or ""
+    project_type_code = project_type_code.strip()
     
     # Define the endpoint mapping
     endpoint_mapping = {
@@ -271,9 +391,11 @@ def get_notes(project_id):
 
     while True:
         url = f"{API_BASE_URL}/core/projects/{project_id}/notes?offset={offset}&limit={limit}"
+        rate_budget.acquire()
         r = requests.get(url, headers=headers)
         if r.status_code == 401:
             headers = get_dynamic_headers()
+            rate_budget.acquire()
             r = requests.get(url, headers=headers)
         try:
             r.raise_for_status()
@@ -421,12 +543,12 @@ INSERT INTO projects(
   project_id, project_name, phase_name, incident_date,
   sol_due_date, total_meds, policy_limits, personal_injury_type,
   liability_decision, last_offer, date_of_incident,
-  client_contact_count, latest_client_contact, project_type_code
+  client_contact_count, latest_client_contact, project_type_code, last_updated
 ) VALUES (
   :project_id, :project_name, :phase_name, :incident_date,
   :sol_due_date, :total_meds, :policy_limits, :personal_injury_type,
   :liability_decision, :last_offer, :date_of_incident,
-  :client_contact_count, :latest_client_contact, :project_type_code
+  :client_contact_count, :latest_client_contact, :project_type_code, NOW()
 )
 ON CONFLICT (project_id) DO UPDATE SET
   project_name           = EXCLUDED.project_name,
@@ -441,16 +563,30 @@ ON CONFLICT (project_id) DO UPDATE SET
   date_of_incident       = EXCLUDED.date_of_incident,
   client_contact_count   = EXCLUDED.client_contact_count,
   latest_client_contact  = EXCLUDED.latest_client_contact,
-  project_type_code      = EXCLUDED.project_type_code;
+  project_type_code      = EXCLUDED.project_type_code,
+  last_updated           = NOW()
+WHERE (projects.project_name, projects.phase_name, projects.incident_date,
+       projects.sol_due_date, projects.total_meds, projects.policy_limits,
+       projects.personal_injury_type, projects.liability_decision,
+       projects.last_offer, projects.date_of_incident,
+       projects.client_contact_count, projects.latest_client_contact,
+       projects.project_type_code)
+  IS DISTINCT FROM
+      (EXCLUDED.project_name, EXCLUDED.phase_name, EXCLUDED.incident_date,
+       EXCLUDED.sol_due_date, EXCLUDED.total_meds, EXCLUDED.policy_limits,
+       EXCLUDED.personal_injury_type, EXCLUDED.liability_decision,
+       EXCLUDED.last_offer, EXCLUDED.date_of_incident,
+       EXCLUDED.client_contact_count, EXCLUDED.latest_client_contact,
+       EXCLUDED.project_type_code);
 """)
 
 UPSERT_NEGOTIATION = text("""
 INSERT INTO negotiation(
   project_id, negotiator, settlement_date, settled,
-  settled_amount, last_offer, last_offer_date, date_assigned_to_nego
+  settled_amount, last_offer, last_offer_date, date_assigned_to_nego, last_updated
 ) VALUES (
   :project_id, :negotiator, :settlement_date, :settled,
-  :settled_amount, :last_offer, :last_offer_date, :date_assigned_to_nego
+  :settled_amount, :last_offer, :last_offer_date, :date_assigned_to_nego, NOW()
 )
 ON CONFLICT (project_id) DO UPDATE SET
   negotiator            = EXCLUDED.negotiator,
@@ -459,27 +595,40 @@ ON CONFLICT (project_id) DO UPDATE SET
   settled_amount        = EXCLUDED.settled_amount,
   last_offer            = EXCLUDED.last_offer,
   last_offer_date       = EXCLUDED.last_offer_date,
-  date_assigned_to_nego = EXCLUDED.date_assigned_to_nego;
+  date_assigned_to_nego = EXCLUDED.date_assigned_to_nego,
+  last_updated          = NOW()
+WHERE (negotiation.negotiator, negotiation.settlement_date, negotiation.settled,
+       negotiation.settled_amount, negotiation.last_offer,
+       negotiation.last_offer_date, negotiation.date_assigned_to_nego)
+  IS DISTINCT FROM
+      (EXCLUDED.negotiator, EXCLUDED.settlement_date, EXCLUDED.settled,
+       EXCLUDED.settled_amount, EXCLUDED.last_offer, EXCLUDED.last_offer_date,
+       EXCLUDED.date_assigned_to_nego);
 """)
 
 UPSERT_INSURANCE = text("""
 INSERT INTO insurance_info(
-  project_id, defendant_insurance_name, client_insurance_name
+  project_id, defendant_insurance_name, client_insurance_name, last_updated
 ) VALUES (
-  :project_id, :def_name, :cli_name
+  :project_id, :def_name, :cli_name, NOW()
 )
 ON CONFLICT (project_id) DO UPDATE SET
   defendant_insurance_name = EXCLUDED.defendant_insurance_name,
-  client_insurance_name    = EXCLUDED.client_insurance_name;
+  client_insurance_name    = EXCLUDED.client_insurance_name,
+  last_updated             = NOW()
+WHERE (insurance_info.defendant_insurance_name,
+       insurance_info.client_insurance_name)
+  IS DISTINCT FROM
+      (EXCLUDED.defendant_insurance_name, EXCLUDED.client_insurance_name);
 """)
 
 UPSERT_BREAKDOWN = text("""
 INSERT INTO breakdown_info(
   project_id, lien_negotiator_name, lien_negotiator_company,
-  lien_negotiator_title, lien_negotiator_dept, date_assigned, date_completed
+  lien_negotiator_title, lien_negotiator_dept, date_assigned, date_completed, last_updated
 ) VALUES (
   :project_id, :lien_name, :lien_company,
-  :lien_title, :lien_dept, :date_assigned, :date_completed
+  :lien_title, :lien_dept, :date_assigned, :date_completed, NOW()
 )
 ON CONFLICT (project_id) DO UPDATE SET
   lien_negotiator_name    = EXCLUDED.lien_negotiator_name,
@@ -487,18 +636,26 @@ ON CONFLICT (project_id) DO UPDATE SET
   lien_negotiator_title   = EXCLUDED.lien_negotiator_title,
   lien_negotiator_dept    = EXCLUDED.lien_negotiator_dept,
   date_assigned           = EXCLUDED.date_assigned,
-  date_completed          = EXCLUDED.date_completed;
+  date_completed          = EXCLUDED.date_completed,
+  last_updated            = NOW()
+WHERE (breakdown_info.lien_negotiator_name, breakdown_info.lien_negotiator_company,
+       breakdown_info.lien_negotiator_title, breakdown_info.lien_negotiator_dept,
+       breakdown_info.date_assigned, breakdown_info.date_completed)
+  IS DISTINCT FROM
+      (EXCLUDED.lien_negotiator_name, EXCLUDED.lien_negotiator_company,
+       EXCLUDED.lien_negotiator_title, EXCLUDED.lien_negotiator_dept,
+       EXCLUDED.date_assigned, EXCLUDED.date_completed);
 """)
 
 UPSERT_LIT = text("""
 INSERT INTO lit_case_review(
   project_id, trial_date, date_complaint_filed,
   date_attorney_assigned, settlement_amount, settlement_date,
-  dismissal_filed_on
+  dismissal_filed_on, last_updated
 ) VALUES (
   :project_id, :trial_date, :date_complaint_filed,
   :date_attorney_assigned, :settlement_amount, :settlement_date,
-  :dismissal_filed_on
+  :dismissal_filed_on, NOW()
 )
 ON CONFLICT (project_id) DO UPDATE SET
   trial_date             = EXCLUDED.trial_date,
@@ -506,33 +663,51 @@ ON CONFLICT (project_id) DO UPDATE SET
   date_attorney_assigned = EXCLUDED.date_attorney_assigned,
   settlement_amount      = EXCLUDED.settlement_amount,
   settlement_date        = EXCLUDED.settlement_date,
-  dismissal_filed_on     = EXCLUDED.dismissal_filed_on;
+  dismissal_filed_on     = EXCLUDED.dismissal_filed_on,
+  last_updated           = NOW()
+WHERE (lit_case_review.trial_date, lit_case_review.date_complaint_filed,
+       lit_case_review.date_attorney_assigned, lit_case_review.settlement_amount,
+       lit_case_review.settlement_date, lit_case_review.dismissal_filed_on)
+  IS DISTINCT FROM
+      (EXCLUDED.trial_date, EXCLUDED.date_complaint_filed,
+       EXCLUDED.date_attorney_assigned, EXCLUDED.settlement_amount,
+       EXCLUDED.settlement_date, EXCLUDED.dismissal_filed_on);
 """)
 
 UPSERT_DEMAND = text("""
 INSERT INTO demand_info(
-  project_id, demand_approved, approved_by
+  project_id, demand_approved, approved_by, last_updated
 ) VALUES (
-  :project_id, :demand_approved, :approved_by
+  :project_id, :demand_approved, :approved_by, NOW()
 )
 ON CONFLICT (project_id) DO UPDATE SET
   demand_approved = EXCLUDED.demand_approved,
-  approved_by     = EXCLUDED.approved_by;
+  approved_by     = EXCLUDED.approved_by,
+  last_updated    = NOW()
+WHERE (demand_info.demand_approved, demand_info.approved_by)
+  IS DISTINCT FROM
+      (EXCLUDED.demand_approved, EXCLUDED.approved_by);
 """)
 
 UPSERT_CONTACTS = text("""
 INSERT INTO contacts(
   project_id, case_manager, supervisor,
-  attorney, paralegal
+  attorney, paralegal, last_updated
 ) VALUES (
   :project_id, :case_manager, :supervisor,
-  :attorney, :paralegal
+  :attorney, :paralegal, NOW()
 )
 ON CONFLICT (project_id) DO UPDATE SET
   case_manager = EXCLUDED.case_manager,
   supervisor   = EXCLUDED.supervisor,
   attorney     = EXCLUDED.attorney,
-  paralegal    = EXCLUDED.paralegal;
+  paralegal    = EXCLUDED.paralegal,
+  last_updated = NOW()
+WHERE (contacts.case_manager, contacts.supervisor, contacts.attorney,
+       contacts.paralegal)
+  IS DISTINCT FROM
+      (EXCLUDED.case_manager, EXCLUDED.supervisor, EXCLUDED.attorney,
+       EXCLUDED.paralegal);
 """)
 
 # def get_projects_by_type(code: str, limit: int = 200) -> list[int]:
@@ -555,39 +730,35 @@ ON CONFLICT (project_id) DO UPDATE SET
 #     return projects
 
 
-def get_projects_by_type(code: str, limit: Optional[int] = None) -> List[int]:
+def iter_project_listing(code: Optional[str] = None, limit: Optional[int] = None) -> Iterator[dict]:
     """
-    Fetch all project IDs of a given FileVine projectTypeCode.
-    If `limit` is None, will page until no more items; otherwise stops at `limit`.
+    Yield the /core/projects listing items (projectId, phaseName, ...) of a
+    given FileVine projectTypeCode, or of every project when `code` is None,
+    page by page as they arrive, so callers can start loading before the
+    listing finishes. If `limit` is None, pages until no more items.
+
+    One token and one keep-alive session serve every page; the token is only
+    refreshed when a page comes back 401.
     """
-    projects: List[int] = []
+    count = 0
     offset = 0
     page_sz = 100  # FileVine max page size
     attempts = 0
     max_attempts = 5
+    type_filter = {"projectTypeCode": code} if code else {}
+    session = requests.Session()
+    headers = get_dynamic_headers()
 
     while True:
         try:
-            headers = get_dynamic_headers()
-            resp = requests.get(
-                f"{API_BASE_URL}/core/projects",
-                headers=headers,
-                params={
-                    "offset": offset,
-                    "limit": page_sz,
-                    "projectTypeCode": code,
-                },
-                timeout=30,
-            )
+            params = {"offset": offset, "limit": page_sz, **type_filter}
+            rate_budget.acquire()
+            resp = session.get(f"{API_BASE_URL}/core/projects", headers=headers, params=params, timeout=30)
             # Retry once if unauthorized
             if resp.status_code == 401:
                 headers = get_dynamic_headers()
-                resp = requests.get(
-                    f"{API_BASE_URL}/core/projects",
-                    headers=headers,
-                    params={"offset": offset, "limit": page_sz, "projectTypeCode": code},
-                    timeout=30,
-                )
+                rate_budget.acquire()
+                resp = session.get(f"{API_BASE_URL}/core/projects", headers=headers, params=params, timeout=30)
             resp.raise_for_status()
 
             items = resp.json().get("items", [])
@@ -596,15 +767,11 @@ def get_projects_by_type(code: str, limit: Optional[int] = None) -> List[int]:
                 break
 
             for pj in items:
-                pid = pj["projectId"]["native"]
-                projects.append(pid)
-                # if a numeric limit is set and we've reached it, bail out
-                if limit is not None and len(projects) >= limit:
-                    break
-
-            # stop if we hit our numeric limit
-            if limit is not None and len(projects) >= limit:
-                break
+                yield pj
+                count += 1
+                # if a numeric limit is set and we've reached it, stop
+                if limit is not None and count >= limit:
+                    return
 
             # otherwise advance to next page
             offset += page_sz
@@ -620,10 +787,65 @@ def get_projects_by_type(code: str, limit: Optional[int] = None) -> List[int]:
             time.sleep(backoff)
 
     # warn if we asked for N but got fewer
-    if limit is not None and len(projects) < limit:
-        print(f"⚠️ Warning: Only found {len(projects)}/{limit} projects of type '{code}'")
+    if limit is not None and count < limit:
+        print(f"⚠️ Warning: Only found {count}/{limit} projects of type '{code}'")
+
+
+def get_project_listing(code: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    """The whole listing as a list (see iter_project_listing)."""
+    return list(iter_project_listing(code, limit))
+
 
-    return projects if limit is None else projects[:limit]
+def listing_modified(pj: dict) -> Optional[str]:
+    """A listing item's last-activity timestamp, as kept in the freshness index (database.py)."""
+    return pj.get("lastActivity") or pj.get("lastActivityDate") or pj.get("lastModifiedDate")
+
+
+def listing_batches(items: Iterable[dict], modified: dict, skip_unchanged: bool = True,
+                    keep: Callable[[dict], bool] = lambda pj: True, size: int = 100,
+                    listed_items: Optional[dict] = None) -> Iterator[List[int]]:
+    """
+    Turn a (streamed) listing into batches of project ids to load, keeping
+    only items `keep` accepts and, with skip_unchanged, only projects the
+    freshness index says changed since their last load. Fills `modified`
+    with {project_id: listing timestamp} as it goes, and `listed_items` (if
+    given) with {project_id: listing item} for the batches it yields, so the
+    loader can use them as the project core.
+    """
+    listed = skipped = 0
+    page: dict = {}
+    page_items: dict = {}
+
+    def flush():
+        nonlocal skipped
+        modified.update(page)
+        ids = database.changed_since_load(page) if skip_unchanged else list(page)
+        skipped += len(page) - len(ids)
+        if listed_items is not None:
+            listed_items.update((pid, page_items[pid]) for pid in ids)
+        page.clear()
+        page_items.clear()
+        return ids
+
+    for pj in items:
+        if not keep(pj):
+            continue
+        listed += 1
+        page[pj["projectId"]["native"]] = listing_modified(pj)
+        page_items[pj["projectId"]["native"]] = pj
+        if len(page) >= size:
+            yield flush()
+    if page:
+        yield flush()
+    print(f"📋 Listing done: {listed} projects" + (f", {skipped} unchanged since their last load" if skip_unchanged else ""))
+
+
+def get_projects_by_type(code: str, limit: Optional[int] = None) -> List[int]:
+    """
+    Fetch all project IDs of a given FileVine projectTypeCode.
+    If `limit` is None, will page until no more items; otherwise stops at `limit`.
+    """
+    return [pj["projectId"]["native"] for pj in get_project_listing(code, limit)]
 
 
 # def load_project(pid):
@@ -697,114 +919,213 @@ def get_projects_by_type(code: str, limit: Optional[int] = None) -> List[int]:
 #             "paralegal":    role_map.get("Paralegal", "N/A")
 #         })
 
-def load_project(pid):
+
+# --- Sections: fetch one part of a project, shaped for its statement ---
+# Each returns the statement's params (minus project_id), or None when there
+# is nothing to write. load_project runs all of them; refresh_project_sections
+# runs only the ones a webhook says changed.
+
+def core_fields(pid, pj=None):
+    pj = pj if pj is not None else (fetch_json(f"/core/projects/{pid}") or {})
+    return {
+        "project_name":      pj.get("projectOrClientName", "N/A"),
+        "phase_name":        pj.get("phaseName"),
+        "incident_date":     mmddyyyy_to_iso(format_date(pj.get("incidentDate")))
+                             if pj.get("incidentDate") else None,
+        "project_type_code": pj.get("projectTypeCode"),
+    }
+
+def vitals_fields(pid):
+    vitals = sol_dol_meds_policy_limits(pid) or {}
+    return {
+        "total_meds":           float(vitals.get("Total Meds"))
+                                if vitals.get("Total Meds") not in [None, "N/A"] else None,
+        "policy_limits":        vitals.get("Policy Limits", "N/A"),
+        "personal_injury_type": vitals.get("Personal Injury Type", "N/A"),
+        "liability_decision":   vitals.get("Liability Decision", "N/A"),
+        "last_offer":           vitals.get("Last Offer", "N/A"),
+    }
+
+def sol_fields(pid):
+    sol = get_case_summary_sol(pid)
+    return {"sol_due_date": mmddyyyy_to_iso(sol) if sol != "N/A" else None}
+
+def intake_fields(pid, pj=None):
+    doi = get_intake_date(pid, pj.get("projectTypeCode") if pj else None)
+    return {"date_of_incident": mmddyyyy_to_iso(doi) if doi != "N/A" else None}
+
+def contact_metrics_fields(pid):
+    contact_count, contact_latest = get_client_contact_metrics(pid)
+    return {"client_contact_count": contact_count, "latest_client_contact": contact_latest}
+
+def negotiation_fields(pid):
+    nego = get_nego_info(pid) or {}
+    if not nego:
+        return None
+    return {
+        "negotiator":            nego.get("negotiator", "N/A"),
+        "settlement_date":       mmddyyyy_to_iso(nego.get("settlement_date")) if nego.get("settlement_date") != "N/A" else None,
+        "settled":               nego.get("settled", "N/A"),
+        "settled_amount":        float(nego.get("settled_amount")) if nego.get("settled_amount") not in [None, "N/A"] else None,
+        "last_offer":            nego.get("last_offer", "N/A"),
+        "last_offer_date":       mmddyyyy_to_iso(nego.get("last_offer_date")) if nego.get("last_offer_date") != "N/A" else None,
+        "date_assigned_to_nego": mmddyyyy_to_iso(nego.get("date_assigned_to_nego")) if nego.get("date_assigned_to_nego") != "N/A" else None,
+    }
+
+def insurance_fields(pid):
+    ins = get_insurance(pid) or {"def_name": "N/A", "cli_name": "N/A"}
+    return {
+        "def_name": ins.get("def_name", "N/A"),
+        "cli_name": ins.get("cli_name", "N/A")
+    }
+
+def breakdown_fields(pid):
+    br = get_breakdown(pid) or {}
+    if not br:
+        return None
+    return {
+        "lien_name": br.get("lien_name", "N/A"),
+        "lien_company": br.get("lien_company", "N/A"),
+        "lien_title": br.get("lien_title", "N/A"),
+        "lien_dept": br.get("lien_dept", "N/A"),
+        "date_assigned": mmddyyyy_to_iso(br.get("date_assigned")) if br.get("date_assigned") != "N/A" else None,
+        "date_completed": mmddyyyy_to_iso(br.get("date_completed")) if br.get("date_completed") != "N/A" else None
+    }
+
+def lit_fields(pid):
+    lit = get_lit_review(pid) or {}
+    if not lit:
+        return None
+    return {
+        "trial_date": mmddyyyy_to_iso(lit.get("trial_date")) if lit.get("trial_date") != "N/A" else None,
+        "date_complaint_filed": mmddyyyy_to_iso(lit.get("date_complaint_filed")) if lit.get("date_complaint_filed") != "N/A" else None,
+        "date_attorney_assigned": mmddyyyy_to_iso(lit.get("date_attorney_assigned")) if lit.get("date_attorney_assigned") != "N/A" else None,
+        "settlement_amount": lit.get("settlement_amount", "N/A"),
+        "settlement_date": mmddyyyy_to_iso(lit.get("settlement_date")) if lit.get("settlement_date") != "N/A" else None,
+        "dismissal_filed_on": mmddyyyy_to_iso(lit.get("dismissal_filed_on")) if lit.get("dismissal_filed_on") != "N/A" else None
+    }
+
+def demand_fields(pid):
+    demand_dt, demand_by = get_demand_info(pid)
+    if not (demand_dt or demand_by):
+        return None
+    return {
+        "demand_approved": mmddyyyy_to_iso(demand_dt) if demand_dt and demand_dt != "N/A" else None,
+        "approved_by": demand_by or "N/A"
+    }
+
+def contacts_fields(pid):
+    role_map = {m["role"]: m["full_name"] for m in get_relevant_team_members(pid)}
+    return {
+        "case_manager": role_map.get("Case Manager", "N/A"),
+        "supervisor":   role_map.get("Supervisor", "N/A"),
+        "attorney":     role_map.get("Attorney", "N/A"),
+        "paralegal":    role_map.get("Paralegal", "N/A")
+    }
+
+
+def _update_projects(columns):
+    """UPDATE of some projects columns, a no-op (rowcount 0) if none differ."""
+    return text(f"""
+UPDATE projects SET
+  {", ".join(f"{c} = :{c}" for c in columns)},
+  last_updated = NOW()
+WHERE project_id = :project_id
+  AND ({", ".join(columns)})
+      IS DISTINCT FROM
+      ({", ".join(f":{c}" for c in columns)})
+""")
+
+UPDATE_PROJECT_CORE     = _update_projects(["project_name", "phase_name", "incident_date", "project_type_code"])
+UPDATE_PROJECT_VITALS   = _update_projects(["total_meds", "policy_limits", "personal_injury_type",
+                                            "liability_decision", "last_offer"])
+UPDATE_PROJECT_SOL      = _update_projects(["sol_due_date"])
+UPDATE_PROJECT_INTAKE   = _update_projects(["date_of_incident"])
+UPDATE_PROJECT_CONTACTS = _update_projects(["client_contact_count", "latest_client_contact"])
+
+# section -> (fields builder, statement, dashboard_rows section it feeds)
+SECTIONS = {
+    "core":            (core_fields,            UPDATE_PROJECT_CORE,     "projects"),
+    "vitals":          (vitals_fields,          UPDATE_PROJECT_VITALS,   "projects"),
+    "sol":             (sol_fields,             UPDATE_PROJECT_SOL,      "projects"),
+    "intake":          (intake_fields,          UPDATE_PROJECT_INTAKE,   "projects"),
+    "contact_metrics": (contact_metrics_fields, UPDATE_PROJECT_CONTACTS, "projects"),
+    "negotiation":     (negotiation_fields,     UPSERT_NEGOTIATION,      "negotiation"),
+    "insurance":       (insurance_fields,       UPSERT_INSURANCE,        "insurance_info"),
+    "breakdown":       (breakdown_fields,       UPSERT_BREAKDOWN,        "breakdown_info"),
+    "lit":             (lit_fields,             UPSERT_LIT,              "lit_case_review"),
+    "demand":          (demand_fields,          UPSERT_DEMAND,           "demand_info"),
+    "team":            (contacts_fields,        UPSERT_CONTACTS,         "contacts"),
+}
+
+# Builders that take the project core (pj) to save a /core/projects/{pid} call
+USES_CORE = {"core", "intake"}
+
+# Listing item keys core_fields reads; an item with all of them stands in for
+# the /core/projects/{pid} response
+CORE_LISTING_FIELDS = ("projectOrClientName", "phaseName", "projectTypeCode", "incidentDate")
+
+# Written by UPSERT_PROJECT in a full load; the rest are their own tables.
+PROJECT_SECTIONS = ["core", "vitals", "sol", "intake", "contact_metrics"]
+DETAIL_SECTIONS  = ["negotiation", "insurance", "breakdown", "lit", "demand", "team"]
+
+
+def write_sections(conn, pid, fields):
+    """
+    Run each section's statement; returns the dashboard_rows sections whose
+    rows actually changed (each statement is a no-op when nothing differs).
+    """
+    changed = set()
+    for section, params in fields.items():
+        if params is None:
+            continue
+        _, stmt, table = SECTIONS[section]
+        if conn.execute(stmt, {"project_id": pid, **params}).rowcount:
+            changed.add(table)
+    return changed
+
+
+def has_core_fields(pj: Optional[dict]) -> bool:
+    """Whether a /core/projects listing item carries everything core_fields needs."""
+    return bool(pj) and bool((pj.get("projectId") or {}).get("native")) and all(k in pj for k in CORE_LISTING_FIELDS)
+
+
+def load_project(pid, listing_item=None):
+    """
+    Fetch and write every section of a project. Bulk runs pass the project's
+    /core/projects listing item, which already holds the core fields, so
+    the per-project /core/projects/{pid} call is only made when it doesn't.
+    Returns False if the project couldn't be fetched.
+    """
     try:
         # Fetch basic project info
-        pj = fetch_json(f"/core/projects/{pid}") or {}
+        if has_core_fields(listing_item):
+            pj = listing_item
+        else:
+            pj = fetch_json(f"/core/projects/{pid}") or {}
         if not pj:
             print(f"⚠️ Could not fetch project {pid}")
-            return
+            return False
 
         print(f"⏳ Loading {pid} – {pj.get('projectOrClientName','<no name>')} ...")
 
-        # Get all data with error handling
-        vitals = sol_dol_meds_policy_limits(pid) or {}
-        nego = get_nego_info(pid) or {}
-        ins = get_insurance(pid) or {"def_name": "N/A", "cli_name": "N/A"}
-        br = get_breakdown(pid) or {}
-        lit = get_lit_review(pid) or {}
-        demand_dt, demand_by = get_demand_info(pid)
-        contact_count, contact_latest = get_client_contact_metrics(pid)
-        project_type_code = pj.get("projectTypeCode")
-
-        # Prepare project record
-        rec = {
-            "project_id":          pj["projectId"]["native"],
-            "project_name":        pj.get("projectOrClientName", "N/A"),
-            "phase_name":          pj.get("phaseName"),
-            "incident_date":       mmddyyyy_to_iso(format_date(pj.get("incidentDate"))) 
-                                if pj.get("incidentDate") else None,
-            "sol_due_date":        mmddyyyy_to_iso(get_case_summary_sol(pid)) 
-                                if get_case_summary_sol(pid) != "N/A" else None,
-            "total_meds":          float(vitals.get("Total Meds")) 
-                                if vitals.get("Total Meds") not in [None, "N/A"] else None,
-            "policy_limits":       vitals.get("Policy Limits", "N/A"),
-            "personal_injury_type":vitals.get("Personal Injury Type", "N/A"),
-            "liability_decision":  vitals.get("Liability Decision", "N/A"),
-            "last_offer":          vitals.get("Last Offer", "N/A"),
-            "date_of_incident":    mmddyyyy_to_iso(get_intake_date(pid)) 
-                                if get_intake_date(pid) != "N/A" else None,
-            "client_contact_count":contact_count,
-            "latest_client_contact":contact_latest,
-            "project_type_code":   project_type_code
-        }
-
+        # Get all data up front, so no API call runs inside the transaction
+        rec = {"project_id": pj["projectId"]["native"], **core_fields(pid, pj)}
+        for section in PROJECT_SECTIONS[1:]:
+            builder = SECTIONS[section][0]
+            rec.update(builder(pid, pj) if section in USES_CORE else builder(pid))
+        details = {section: SECTIONS[section][0](pid) for section in DETAIL_SECTIONS}
 
         with engine.begin() as conn:
-            # Insert project data
-            conn.execute(UPSERT_PROJECT, rec)
-            
-            # Insert negotiation data if available
-            if nego:
-                conn.execute(UPSERT_NEGOTIATION, {
-                    "project_id":            pid,
-                    "negotiator":            nego.get("negotiator", "N/A"),
-                    "settlement_date":       mmddyyyy_to_iso(nego.get("settlement_date")) if nego.get("settlement_date") != "N/A" else None,
-                    "settled":               nego.get("settled", "N/A"),
-                    "settled_amount":        float(nego.get("settled_amount")) if nego.get("settled_amount") not in [None, "N/A"] else None,
-                    "last_offer":            nego.get("last_offer", "N/A"),
-                    "last_offer_date":       mmddyyyy_to_iso(nego.get("last_offer_date")) if nego.get("last_offer_date") != "N/A" else None,
-                    "date_assigned_to_nego": mmddyyyy_to_iso(nego.get("date_assigned_to_nego")) if nego.get("date_assigned_to_nego") != "N/A" else None,
-                })
-            
-            # Insert insurance info
-            conn.execute(UPSERT_INSURANCE, {
-                "project_id": pid,
-                "def_name":   ins.get("def_name", "N/A"),
-                "cli_name":   ins.get("cli_name", "N/A")
-            })
-            
-            # Insert breakdown info if available
-            if br:
-                conn.execute(UPSERT_BREAKDOWN, {
-                    "project_id": pid,
-                    "lien_name": br.get("lien_name", "N/A"),
-                    "lien_company": br.get("lien_company", "N/A"),
-                    "lien_title": br.get("lien_title", "N/A"),
-                    "lien_dept": br.get("lien_dept", "N/A"),
-                    "date_assigned": mmddyyyy_to_iso(br.get("date_assigned")) if br.get("date_assigned") != "N/A" else None,
-                    "date_completed": mmddyyyy_to_iso(br.get("date_completed")) if br.get("date_completed") != "N/A" else None
-                })
-            
-            # Insert litigation info if available
-            if lit:
-                conn.execute(UPSERT_LIT, {
-                    "project_id": pid,
-                    "trial_date": mmddyyyy_to_iso(lit.get("trial_date")) if lit.get("trial_date") != "N/A" else None,
-                    "date_complaint_filed": mmddyyyy_to_iso(lit.get("date_complaint_filed")) if lit.get("date_complaint_filed") != "N/A" else None,
-                    "date_attorney_assigned": mmddyyyy_to_iso(lit.get("date_attorney_assigned")) if lit.get("date_attorney_assigned") != "N/A" else None,
-                    "settlement_amount": lit.get("settlement_amount", "N/A"),
-                    "settlement_date": mmddyyyy_to_iso(lit.get("settlement_date")) if lit.get("settlement_date") != "N/A" else None,
-                    "dismissal_filed_on": mmddyyyy_to_iso(lit.get("dismissal_filed_on")) if lit.get("dismissal_filed_on") != "N/A" else None
-                })
-            
-            # Insert demand info if available
-            if demand_dt or demand_by:
-                conn.execute(UPSERT_DEMAND, {
-                    "project_id": pid,
-                    "demand_approved": mmddyyyy_to_iso(demand_dt) if demand_dt and demand_dt != "N/A" else None,
-                    "approved_by": demand_by or "N/A"
-                })
-            
-            # Insert contact info
-            role_map = {m["role"]: m["full_name"] for m in get_relevant_team_members(pid)}
-            conn.execute(UPSERT_CONTACTS, {
-                "project_id": pid,
-                "case_manager": role_map.get("Case Manager", "N/A"),
-                "supervisor":   role_map.get("Supervisor", "N/A"),
-                "attorney":     role_map.get("Attorney", "N/A"),
-                "paralegal":    role_map.get("Paralegal", "N/A")
-            })
+            # Each upsert only touches its row when a value really changed
+            # (rowcount 0 otherwise); those sections get copied into
+            # dashboard_rows at the end of this transaction.
+            changed = set()
+            if conn.execute(UPSERT_PROJECT, rec).rowcount:
+                changed.add("projects")
+            changed |= write_sections(conn, pid, details)
+            sync_dashboard_row(conn, pid, changed)
+        return True
 
     except Exception as e:
         print(f"❌ Failed to load {pid}: {str(e)}")
@@ -814,54 +1135,87 @@ def load_project(pid):
         raise  # Re-raise if you want the main loop to track failed projects
 
 
+def refresh_project_sections(pid, sections):
+    """
+    Fetch and write only the given sections (see SECTIONS) – one or two API
+    calls for most webhooks instead of a dozen. Falls back to load_project
+    for projects we haven't loaded yet, or when no section is recognised.
+    """
+    wanted = [s for s in SECTIONS if s in sections]
+    with engine.connect() as conn:
+        known = conn.execute(text("SELECT 1 FROM projects WHERE project_id = :pid"), {"pid": pid}).scalar()
+    if not wanted or not known:
+        return load_project(pid)
+
+    try:
+        print(f"⏳ Refreshing {pid} – {', '.join(wanted)} ...")
+        fields = {section: SECTIONS[section][0](pid) for section in wanted}
+        with engine.begin() as conn:
+            changed = write_sections(conn, pid, fields)
+            sync_dashboard_row(conn, pid, changed)
+    except Exception as e:
+        print(f"❌ Failed to refresh {pid}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+
 if __name__ == "__main__":
-    # Initialize variables
-    project_ids = get_projects_by_type("LOJE 2.0", limit=None)
-    print(f"Total projects fetched: {len(project_ids)}")
-    
-    failed_projects = []
-    successful_count = 0
-    batch_size = 20
-    retry_delay = 5  # seconds
-    
-    # Process projects in batches
-    for i in range(0, len(project_ids), batch_size):
-        batch = project_ids[i:i + batch_size]
-        print(f"\nProcessing batch {i//batch_size + 1} (projects {i+1}-{min(i+batch_size, len(project_ids))})...")
-        
-        for pid in batch:
-            try:
-                load_project(pid)
-                successful_count += 1
-            except Exception as e:
-                print(f"❌ Failed to load {pid}: {str(e)}")
-                failed_projects.append(pid)
-                continue
-        
-        # Add delay between batches to avoid rate limiting
-        if i + batch_size < len(project_ids):
-            print(f"⏳ Waiting {retry_delay} seconds before next batch...")
-            time.sleep(retry_delay)
-    
-    # Retry failed projects once
-    if failed_projects:
-        print(f"\nRetrying {len(failed_projects)} failed projects...")
-        retry_failed = []
-        
-        for pid in failed_projects:
-            try:
-                print(f"\nRetrying project {pid}")
-                load_project(pid)
-                successful_count += 1
-            except Exception as e:
-                print(f"❌ Failed again to load {pid}: {str(e)}")
-                retry_failed.append(pid)
-                continue
-        
-        # Final report
-        print("\n" + "="*50)
-        print(f"Processing complete!")
-        print(f"Successfully loaded: {successful_count}/{len(project_ids)}")
-        print(f"Failed after retry: {len(retry_failed)}")
-        if retry_failed:
-            print("Failed project IDs:", retry_failed)
\ No newline at end of file
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Full reload of every project of a type, checkpointed in load_runs.")
+    ap.add_argument("--type", default="LOJE 2.0", help="FileVine projectTypeCode to load")
+    ap.add_argument("--resume", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                    help="continue an interrupted run (default: the latest unfinished one for --type)")
+    ap.add_argument("--max-attempts", type=int, default=3, help="tries per project before giving up")
+    ap.add_argument("--backoff", type=float, default=30, help="seconds before the first retry; doubles each time")
+    ap.add_argument("--all", action="store_true", help="load every project, even ones unchanged since their last load")
+    args = ap.parse_args()
+
+    # a full reload is bulk work: keep it inside the backfill share of the API budget
+    rate_budget.set_lane("backfill")
+
+    label = f"filevine_loader:{args.type}"
+    run_id = None
+    if args.resume == "latest":
+        run_id = latest_open_run(engine, label)
+        if run_id is None:
+            print(f"⚠️ No unfinished run for {args.type}; starting a new one")
+    elif args.resume:
+        run_id = int(args.resume)
+
+    database.init_db()
+    modified = {}  # project_id -> listing timestamp, recorded in the freshness index once loaded
+    listed_items = {}  # project_id -> listing item, used as the project core
+    stream = None
+    if run_id is None:
+        run_id = create_run(engine, label, streamed=True)
+        print(f"🆕 Started run {run_id}")
+    else:
+        print(f"⏯ Resuming run {run_id}")
+    if not listing_complete(engine, run_id):
+        # loads start with the first listing page instead of after the last;
+        # a resumed run whose listing was cut short lists again and adds what it missed
+        stream = listing_batches(iter_project_listing(args.type), modified, skip_unchanged=not args.all,
+                                 listed_items=listed_items)
+
+    def load_and_record(pid):
+        # the listing item is used once; retries fetch the project fresh
+        if not load_project(pid, listed_items.pop(pid, None)):
+            raise RuntimeError(f"project {pid} could not be fetched")
+        database.record_loaded(pid, modified.get(pid))
+
+    try:
+        counts = run_load(engine, run_id, load_and_record, stream=stream,
+                          max_attempts=args.max_attempts, backoff_s=args.backoff)
+    finally:
+        database.flush()
+
+    # Final report
+    total = sum(counts.values())
+    print("\n" + "="*50)
+    print(f"Run {run_id} complete!")
+    print(f"Successfully loaded: {counts['done']}/{total}")
+    print(f"Failed after {args.max_attempts} attempts: {counts['failed']}")
+    if counts["failed"]:
+        print("Failed project IDs:", failed_projects(engine, run_id))
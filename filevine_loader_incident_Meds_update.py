@@ -5,12 +5,16 @@ import time
 import json
 import requests
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from typing import Optional, List, Dict, Tuple, Any
+from typing import Optional, List, Dict, Tuple, Any, Iterable, Iterator
 
 from sqlalchemy import create_engine, text
 from auth_refresh import get_dynamic_headers
+from dashboard import ensure_dashboard_rows, sync_dashboard_row, sync_dashboard_rows
+import rate_budget
 
 # =========================
 # Configuration
@@ -26,6 +30,9 @@ DB_URL      = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAM
 
 engine = create_engine(DB_URL, echo=False)
 
+FETCH_WORKERS = 8     # projects fetched at once (still paced by rate_budget)
+UPSERT_CHUNK  = 500   # projects per bulk read / batched upsert transaction
+
 # =========================
 # SQL
 # =========================
@@ -46,6 +53,30 @@ FROM projects
 WHERE project_id = :pid
 """)
 
+# READ_PROJECT_CORE for a whole chunk of projects in one round trip
+READ_PROJECT_CORES = text("""
+SELECT project_id, project_name, date_of_incident, total_meds
+FROM projects
+WHERE project_id = ANY(:ids)
+""")
+
+# UPSERT_PROJECT_CORE for many projects in one statement
+UPSERT_PROJECT_CORES = text("""
+INSERT INTO projects (project_id, project_name, date_of_incident, total_meds, last_updated)
+SELECT r.project_id, r.project_name, r.date_of_incident, r.total_meds, NOW()
+FROM jsonb_to_recordset(CAST(:rows AS JSONB)) AS r(
+  project_id       BIGINT,
+  project_name     TEXT,
+  date_of_incident DATE,
+  total_meds       NUMERIC(14,2)
+)
+ON CONFLICT (project_id) DO UPDATE SET
+  project_name     = EXCLUDED.project_name,
+  date_of_incident = EXCLUDED.date_of_incident,
+  total_meds       = EXCLUDED.total_meds,
+  last_updated     = NOW();
+""")
+
 # =========================
 # Utility helpers
 # =========================
@@ -76,9 +107,11 @@ def fetch_json(endpoint: str) -> Any:
     """GET helper with retry for 401/429; returns parsed JSON (dict/list) or {}."""
     headers = get_dynamic_headers()
     try:
+        rate_budget.acquire()
         r = requests.get(API_BASE_URL + endpoint, headers=headers, timeout=30)
         if r.status_code == 401:
             headers = get_dynamic_headers()
+            rate_budget.acquire()
             r = requests.get(API_BASE_URL + endpoint, headers=headers, timeout=30)
         elif r.status_code == 429:
             retry_after = int(r.headers.get('Retry-After', 5))
@@ -208,16 +241,19 @@ def sol_dol_meds_policy_limits(pid: int) -> Dict[str, Any]:
 # =========================
 # Intake date
 # =========================
-def get_intake_date(pid: int) -> str:
+def get_intake_date(pid: int, project_type_code: Optional[str] = None) -> str:
     """
     Returns 'MM-DD-YYYY' or 'N/A' from the appropriate intake form based on projectTypeCode.
     Adjust the key below if your form uses a different field name.
+    Pass project_type_code when the project is already at hand to skip a fetch.
     """
-    project_data = fetch_json(f"/core/projects/{pid}")
-    if not project_data or not isinstance(project_data, dict):
-        return "N/A"
+    if project_type_code is None:
+        project_data = fetch_json(f"/core/projects/{pid}")
+        if not project_data or not isinstance(project_data, dict):
+            return "N/A"
+        project_type_code = project_data.get("projectTypeCode")
 
-    project_type_code = (project_data.get("projectTypeCode") or "").strip()
+    project_type_code = (project_type_code or "").strip()
     endpoint_mapping = {
         "PIMaster": "intake2",
         "LOJE 2.0": "lOJEIntake20Demo",
@@ -283,12 +319,28 @@ def _get_current_project_core(pid: int) -> Dict[str, Any]:
             "total_meds": tm
         }
 
-def _compute_project_core_from_api(pid: int) -> Dict[str, Any]:
-    pj = fetch_json(f"/core/projects/{pid}") or {}
+def _get_current_project_cores(project_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """_get_current_project_core for many projects at once; missing projects read as all None."""
+    out = {pid: {"project_name": None, "date_of_incident": None, "total_meds": None} for pid in project_ids}
+    with engine.connect() as conn:
+        for pid, name, doi, tm in conn.execute(READ_PROJECT_CORES, {"ids": list(project_ids)}):
+            out[pid] = {
+                "project_name": name,
+                "date_of_incident": doi,
+                "total_meds": _parse_currency_decimal(tm) if tm is not None else None,
+            }
+    return out
+
+def _compute_project_core_from_api(pid: int, listing_item: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # the /core/projects listing item already has the name and type; fetch only without one
+    if listing_item and "projectOrClientName" in listing_item and "projectTypeCode" in listing_item:
+        pj = listing_item
+    else:
+        pj = fetch_json(f"/core/projects/{pid}") or {}
     project_name = pj.get("projectOrClientName") or "N/A"
 
     # date_of_incident
-    doi_mmddyyyy = get_intake_date(pid)  # 'MM-DD-YYYY' or 'N/A'
+    doi_mmddyyyy = get_intake_date(pid, pj.get("projectTypeCode") if pj else None)  # 'MM-DD-YYYY' or 'N/A'
     doi_iso = mmddyyyy_to_iso(doi_mmddyyyy) if doi_mmddyyyy and doi_mmddyyyy != "N/A" else None
 
     # total_meds (get raw from vitals -> Decimal here)
@@ -325,15 +377,25 @@ def _diff_core(old: Dict[str, Any], new: Dict[str, Any]) -> Tuple[bool, Dict[str
 # =========================
 # Updater
 # =========================
-def update_project_core_fields(pid: int) -> Tuple[bool, bool, Optional[Dict[str, Tuple[Any, Any]]]]:
+def _core_payload(pid: int, new: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "project_id": pid,
+        "project_name": new["project_name"] or "N/A",
+        "date_of_incident": _normalize_date(new["date_of_incident"]),
+        "total_meds": _normalize_dec(new["total_meds"]),  # Decimal(2dp) or None
+    }
+
+def update_project_core_fields(pid: int, listing_item: Optional[Dict[str, Any]] = None
+                               ) -> Tuple[bool, bool, Optional[Dict[str, Tuple[Any, Any]]]]:
     """
     Update date_of_incident and total_meds (and project_name) for one project if they differ.
+    `listing_item` is the project's /core/projects listing entry, when the caller has it.
     Returns: (success, updated, changes_dict)
     """
     try:
         print(f"\n🔍 Checking project {pid}...")
         old = _get_current_project_core(pid)
-        new = _compute_project_core_from_api(pid)
+        new = _compute_project_core_from_api(pid, listing_item)
 
         has_change, changes = _diff_core(old, new)
         if not has_change:
@@ -344,17 +406,13 @@ def update_project_core_fields(pid: int) -> Tuple[bool, bool, Optional[Dict[str,
         for field, (o, n) in changes.items():
             print(f"   - {field}: {o} → {n}")
 
-        payload = {
-            "project_id": pid,
-            "project_name": new["project_name"] or "N/A",
-            "date_of_incident": _normalize_date(new["date_of_incident"]),
-            "total_meds": _normalize_dec(new["total_meds"]),  # Decimal(2dp) or None
-        }
+        payload = _core_payload(pid, new)
         # Debug payload
         # print("UPSERT payload:", payload)
 
         with engine.begin() as conn:
             conn.execute(UPSERT_PROJECT_CORE, payload)
+            sync_dashboard_row(conn, pid, {"projects"})
 
         print(f"💾 Project {pid}: Updated")
         return True, True, changes
@@ -367,33 +425,29 @@ def update_project_core_fields(pid: int) -> Tuple[bool, bool, Optional[Dict[str,
 # =========================
 # (Optional) Pull ALL project IDs from Filevine
 # =========================
-def get_all_filevine_project_ids(limit: Optional[int] = None) -> List[int]:
+def iter_filevine_projects(limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
     """
-    Fetch ALL project IDs from /core/projects (paged). If limit is provided, stop after reaching it.
+    Yield every /core/projects listing item, page by page as they arrive. If
+    limit is provided, stop after reaching it. One token and keep-alive
+    session serve all pages; the token is only refreshed on a 401.
     """
-    projects: List[int] = []
+    count = 0
     offset = 0
     page_sz = 100
     attempts = 0
     max_attempts = 5
+    session = requests.Session()
+    headers = get_dynamic_headers()
 
     while True:
         try:
-            headers = get_dynamic_headers()
-            resp = requests.get(
-                f"{API_BASE_URL}/core/projects",
-                headers=headers,
-                params={"offset": offset, "limit": page_sz},
-                timeout=30,
-            )
+            params = {"offset": offset, "limit": page_sz}
+            rate_budget.acquire()
+            resp = session.get(f"{API_BASE_URL}/core/projects", headers=headers, params=params, timeout=30)
             if resp.status_code == 401:
                 headers = get_dynamic_headers()
-                resp = requests.get(
-                    f"{API_BASE_URL}/core/projects",
-                    headers=headers,
-                    params={"offset": offset, "limit": page_sz},
-                    timeout=30,
-                )
+                rate_budget.acquire()
+                resp = session.get(f"{API_BASE_URL}/core/projects", headers=headers, params=params, timeout=30)
             resp.raise_for_status()
 
             body = resp.json() or {}
@@ -402,14 +456,11 @@ def get_all_filevine_project_ids(limit: Optional[int] = None) -> List[int]:
                 break
 
             for pj in items:
-                pid = pj.get("projectId", {}).get("native")
-                if pid:
-                    projects.append(int(pid))
-                    if limit is not None and len(projects) >= limit:
-                        break
-
-            if limit is not None and len(projects) >= limit:
-                break
+                if pj.get("projectId", {}).get("native"):
+                    yield pj
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
 
             offset += page_sz
             attempts = 0
@@ -423,7 +474,17 @@ def get_all_filevine_project_ids(limit: Optional[int] = None) -> List[int]:
             print(f"⚠️  Error fetching projects (attempt {attempts}), retrying in {backoff}s: {e}")
             time.sleep(backoff)
 
-    return projects if limit is None else projects[:limit]
+
+def iter_filevine_project_ids(limit: Optional[int] = None) -> Iterator[int]:
+    for pj in iter_filevine_projects(limit):
+        yield int(pj["projectId"]["native"])
+
+
+def get_all_filevine_project_ids(limit: Optional[int] = None) -> List[int]:
+    """
+    Fetch ALL project IDs from /core/projects (paged). If limit is provided, stop after reaching it.
+    """
+    return list(iter_filevine_project_ids(limit))
 
 # =========================
 # Batch runner
@@ -459,20 +520,145 @@ def update_core_fields_batch(project_ids: List[int], batch_size: int = 20, pause
     print(f"➖ No change: {nochange}")
     print(f"❌ Failed: {failed}")
 
+# =========================
+# Concurrent pipeline
+# =========================
+def _progress_bar(done: int, listed: int, listing: bool, started: float, width: int = 30) -> str:
+    elapsed = max(time.monotonic() - started, 1e-9)
+    rate = done / elapsed
+    filled = int(width * done / listed) if listed else 0
+    bar = "█" * filled + "░" * (width - filled)
+    total = f"{listed}+" if listing else f"{listed}"
+    eta = f" ETA {int((listed - done) / rate)}s" if rate and not listing else ""
+    return f"[{bar}] {done}/{total} projects {rate:.1f}/s{eta}"
+
+def write_project_cores(rows: Dict[int, Dict[str, Any]]) -> int:
+    """Batched UPSERT_PROJECT_CORES plus their dashboard rows, UPSERT_CHUNK projects per transaction."""
+    pids = list(rows)
+    for i in range(0, len(pids), UPSERT_CHUNK):
+        chunk = pids[i:i + UPSERT_CHUNK]
+        payload = []
+        for pid in chunk:
+            row = _core_payload(pid, rows[pid])
+            if row["total_meds"] is not None:
+                row["total_meds"] = str(row["total_meds"])
+            payload.append(row)
+        with engine.begin() as conn:
+            conn.execute(UPSERT_PROJECT_CORES, {"rows": json.dumps(payload)})
+            sync_dashboard_rows(conn, chunk, {"projects"})
+    return len(pids)
+
+def update_core_fields_concurrent(listing: Iterable[Dict[str, Any]], workers: int = FETCH_WORKERS) -> Dict[str, Any]:
+    """
+    update_project_core_fields for every project in a /core/projects listing,
+    as a pipeline: projects are fetched by `workers` threads while the listing
+    is still paging in (each project once, even if the listing repeats it),
+    and every UPSERT_CHUNK fetched projects are diffed against one bulk read
+    of their current values and written in one transaction. Every request
+    still takes a slot from the shared rate budget, so more workers only
+    overlap request latency.
+    Returns the summary counts plus how often each field changed.
+    """
+    summary = {"updated": 0, "nochange": 0, "failed": 0}
+    field_counts: Dict[str, int] = {}
+    fetched: Dict[int, Dict[str, Any]] = {}
+    seen = set()
+    done = 0
+    listing_open = True
+    started = time.monotonic()
+
+    def fetch(pj):
+        pid = int(pj["projectId"]["native"])
+        try:
+            return pid, _compute_project_core_from_api(pid, pj)
+        except Exception as e:
+            print(f"\n❌ Project {pid}: Failed to fetch - {e}")
+            return pid, None
+
+    def flush():
+        if not fetched:
+            return
+        current = _get_current_project_cores(list(fetched))
+        changed = {}
+        for pid, new in fetched.items():
+            has_change, changes = _diff_core(current[pid], new)
+            if not has_change:
+                summary["nochange"] += 1
+                continue
+            changed[pid] = new
+            for field in changes:
+                field_counts[field] = field_counts.get(field, 0) + 1
+        try:
+            summary["updated"] += write_project_cores(changed)
+        except Exception as e:
+            print(f"\n❌ Failed to write {len(changed)} project(s) - {e}")
+            summary["failed"] += len(changed)
+        fetched.clear()
+
+    def collect(futures):
+        nonlocal done
+        for fut in futures:
+            pid, new = fut.result()
+            done += 1
+            if new is None:
+                summary["failed"] += 1
+            else:
+                fetched[pid] = new
+        if len(fetched) >= UPSERT_CHUNK:
+            flush()
+        sys.stdout.write("\r" + _progress_bar(done, len(seen), listing_open, started))
+        sys.stdout.flush()
+
+    # the budget lane is per thread, so each worker joins the incremental lane
+    with ThreadPoolExecutor(max_workers=workers, initializer=rate_budget.set_lane,
+                            initargs=("incremental",)) as pool:
+        in_flight = set()
+        for pj in listing:
+            pid = int(pj["projectId"]["native"])
+            if pid in seen:
+                continue
+            seen.add(pid)
+            in_flight.add(pool.submit(fetch, pj))
+            # keep the listing only a few pages ahead of the fetchers
+            if len(in_flight) >= workers * 4:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+        listing_open = False
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(finished)
+    flush()
+    print("\r" + _progress_bar(done, len(seen), False, started))
+
+    summary["projects"] = len(seen)
+    summary["elapsed"] = time.monotonic() - started
+    summary["fields"] = field_counts
+    return summary
+
 # =========================
 # Main
 # =========================
 def main():
     print("🚀 Starting core fields updater…")
+    rate_budget.set_lane("incremental")
+    with engine.begin() as conn:
+        ensure_dashboard_rows(conn)
 
     # --- Option A: test specific project IDs (recommended while validating) ---
-    # project_ids = [1699079, 1743170]  # <-- put your specific project_id(s) here for testing
+    # update_core_fields_batch([1699079, 1743170], batch_size=1, pause_s=0)
 
-    # --- Option B: when ready for all ---
-    project_ids = get_all_filevine_project_ids(limit=None)
+    # --- Option B: every project, fetched concurrently as the listing pages in ---
+    summary = update_core_fields_concurrent(iter_filevine_projects(limit=None))
 
-    print(f"📊 Projects to process: {project_ids}")
-    update_core_fields_batch(project_ids, batch_size=1, pause_s=0)
+    print("\n" + "="*52)
+    print("📊 Core Fields Update Summary")
+    print(f"📋 Projects: {summary['projects']} in {summary['elapsed']/60:.1f} min "
+          f"({summary['projects'] / max(summary['elapsed'], 1e-9):.1f}/s)")
+    print(f"✅ Updated: {summary['updated']}")
+    print(f"➖ No change: {summary['nochange']}")
+    print(f"❌ Failed: {summary['failed']}")
+    for field, n in sorted(summary["fields"].items()):
+        print(f"   - {field}: {n}")
 
     print("🎉 Done!")
 
@@ -1,9 +1,13 @@
+import json
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from auth_refresh import get_dynamic_headers
 from sqlalchemy import create_engine, text
 from typing import List, Tuple, Dict, Any, Optional
+from dashboard import ensure_dashboard_rows, sync_dashboard_row, sync_dashboard_rows
+import rate_budget
 
 # --- Configuration ---
 API_BASE_URL = "https://calljacob.api.filevineapp.com"
@@ -21,10 +25,10 @@ engine = create_engine(DB_URL, echo=False)
 UPSERT_NEGOTIATION = text("""
 INSERT INTO negotiation(
   project_id, negotiator, settlement_date, settled,
-  settled_amount, last_offer, last_offer_date, date_assigned_to_nego
+  settled_amount, last_offer, last_offer_date, date_assigned_to_nego, last_updated
 ) VALUES (
   :project_id, :negotiator, :settlement_date, :settled,
-  :settled_amount, :last_offer, :last_offer_date, :date_assigned_to_nego
+  :settled_amount, :last_offer, :last_offer_date, :date_assigned_to_nego, NOW()
 )
 ON CONFLICT (project_id) DO UPDATE SET
   negotiator            = EXCLUDED.negotiator,
@@ -33,7 +37,54 @@ ON CONFLICT (project_id) DO UPDATE SET
   settled_amount        = EXCLUDED.settled_amount,
   last_offer            = EXCLUDED.last_offer,
   last_offer_date       = EXCLUDED.last_offer_date,
-  date_assigned_to_nego = EXCLUDED.date_assigned_to_nego;
+  date_assigned_to_nego = EXCLUDED.date_assigned_to_nego,
+  last_updated          = NOW();
+""")
+
+NEGO_FIELDS = [
+    "negotiator", "settlement_date", "settled",
+    "settled_amount", "last_offer", "last_offer_date",
+    "date_assigned_to_nego",
+]
+
+FETCH_WORKERS = 8     # negotiation forms fetched at once (still paced by rate_budget)
+UPSERT_CHUNK  = 500   # rows per batched upsert transaction
+
+# Current negotiation rows for every target project in one round trip
+READ_NEGOTIATIONS = text("""
+SELECT project_id, negotiator, settlement_date, settled,
+       settled_amount, last_offer, last_offer_date, date_assigned_to_nego
+FROM negotiation
+WHERE project_id = ANY(:ids)
+""")
+
+# UPSERT_NEGOTIATION for a whole batch: the rows travel as one JSON array
+UPSERT_NEGOTIATIONS = text("""
+INSERT INTO negotiation(
+  project_id, negotiator, settlement_date, settled,
+  settled_amount, last_offer, last_offer_date, date_assigned_to_nego, last_updated
+)
+SELECT r.project_id, r.negotiator, r.settlement_date, r.settled,
+       r.settled_amount, r.last_offer, r.last_offer_date, r.date_assigned_to_nego, NOW()
+FROM jsonb_to_recordset(CAST(:rows AS JSONB)) AS r(
+  project_id            BIGINT,
+  negotiator            TEXT,
+  settlement_date       DATE,
+  settled               TEXT,
+  settled_amount        NUMERIC(14,2),
+  last_offer            TEXT,
+  last_offer_date       DATE,
+  date_assigned_to_nego DATE
+)
+ON CONFLICT (project_id) DO UPDATE SET
+  negotiator            = EXCLUDED.negotiator,
+  settlement_date       = EXCLUDED.settlement_date,
+  settled               = EXCLUDED.settled,
+  settled_amount        = EXCLUDED.settled_amount,
+  last_offer            = EXCLUDED.last_offer,
+  last_offer_date       = EXCLUDED.last_offer_date,
+  date_assigned_to_nego = EXCLUDED.date_assigned_to_nego,
+  last_updated          = NOW()
 """)
 
 def mmddyyyy_to_iso(s: Optional[str]) -> Optional[str]:
@@ -50,9 +101,11 @@ def fetch_json(endpoint: str) -> Dict:
     """Fetch JSON from API endpoint with retry logic"""
     headers = get_dynamic_headers()
     try:
+        rate_budget.acquire()
         r = requests.get(API_BASE_URL + endpoint, headers=headers, timeout=30)
         if r.status_code == 401:
             headers = get_dynamic_headers()
+            rate_budget.acquire()
             r = requests.get(API_BASE_URL + endpoint, headers=headers, timeout=30)
         elif r.status_code == 429:
             retry_after = int(r.headers.get('Retry-After', 5))
@@ -100,15 +153,25 @@ def get_current_negotiation_data(pid: int) -> Dict[str, Any]:
     """)
     with engine.connect() as conn:
         result = conn.execute(query, {"pid": pid}).fetchone()
-        return {
-            "negotiator": result[0] if result else None,
-            "settlement_date": result[1] if result else None,
-            "settled": result[2] if result else None,
-            "settled_amount": float(result[3]) if result and result[3] is not None else None,
-            "last_offer": result[4] if result else None,
-            "last_offer_date": result[5] if result else None,
-            "date_assigned_to_nego": result[6] if result else None
-        } if result else {}
+        return _negotiation_row(result) if result else {}
+
+def _negotiation_row(result) -> Dict[str, Any]:
+    """(negotiator, ..., date_assigned_to_nego) as read from the table -> comparable dict"""
+    return {
+        "negotiator": result[0],
+        "settlement_date": result[1],
+        "settled": result[2],
+        "settled_amount": float(result[3]) if result[3] is not None else None,
+        "last_offer": result[4],
+        "last_offer_date": result[5],
+        "date_assigned_to_nego": result[6]
+    }
+
+def get_current_negotiations(project_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """get_current_negotiation_data for many projects with a single query"""
+    with engine.connect() as conn:
+        rows = conn.execute(READ_NEGOTIATIONS, {"ids": list(project_ids)}).fetchall()
+    return {row[0]: _negotiation_row(row[1:]) for row in rows}
 
 def get_nego_info(pid: int) -> Dict[str, Any]:
     """Get negotiation info from API with enhanced error handling"""
@@ -140,30 +203,55 @@ def has_changes(current: Dict[str, Any], new: Dict[str, Any]) -> Tuple[bool, Dic
     Returns (True, changes_dict) if changes found, (False, {}) otherwise.
     """
     changes = {}
-    fields_to_compare = [
-        "negotiator", "settlement_date", "settled",
-        "settled_amount", "last_offer", "last_offer_date",
-        "date_assigned_to_nego"
-    ]
-    
-    for field in fields_to_compare:
-        current_val = current.get(field)
-        new_val = new.get(field)
-        
-        # Special handling for different field types
-        if field == "settled_amount":
-            current_val = float(current_val) if current_val not in [None, "N/A"] else None
-            new_val = float(new_val) if new_val not in [None, "N/A"] else None
-        elif field.endswith("_date"):
-            current_val = str(current_val or "")
-            new_val = str(new_val or "")
-        
+    for field in NEGO_FIELDS:
+        current_val = _comparable(field, current.get(field))
+        new_val = _comparable(field, new.get(field))
+
         # Compare values
         if str(current_val or "") != str(new_val or ""):
             changes[field] = (current_val, new_val)
     
     return (bool(changes), changes)
 
+def _comparable(field: str, value: Any) -> Any:
+    """Special handling for different field types before comparing"""
+    if field == "settled_amount":
+        return float(value) if value not in [None, "N/A"] else None
+    if field.endswith("_date"):
+        return str(value or "")
+    return value
+
+def diff_negotiations(current: Dict[int, Dict[str, Any]], fetched: Dict[int, Dict[str, Any]]
+                      ) -> Tuple[Dict[int, Dict[str, Tuple[Any, Any]]], Dict[str, int]]:
+    """
+    has_changes over a whole batch, a column at a time: each field is
+    normalised and compared for every project in one pass.
+    Returns ({pid: {field: (old, new)}} for changed projects, {field: projects changed}).
+    """
+    pids = list(fetched)
+    changes: Dict[int, Dict[str, Tuple[Any, Any]]] = {}
+    field_counts: Dict[str, int] = {}
+    for field in NEGO_FIELDS:
+        old_col = [_comparable(field, current.get(pid, {}).get(field)) for pid in pids]
+        new_col = [_comparable(field, fetched[pid].get(field)) for pid in pids]
+        hits = [(pid, o, n) for pid, o, n in zip(pids, old_col, new_col) if str(o or "") != str(n or "")]
+        field_counts[field] = len(hits)
+        for pid, o, n in hits:
+            changes.setdefault(pid, {})[field] = (o, n)
+    return changes, field_counts
+
+def process_nego_info(new_data: Dict[str, Any]) -> Dict[str, Any]:
+    """get_nego_info output -> the negotiation table's column values"""
+    return {
+        "negotiator": new_data["negotiator"],
+        "settlement_date": mmddyyyy_to_iso(new_data["settlement_date"]),
+        "settled": new_data["settled"],
+        "settled_amount": new_data["settled_amount"],
+        "last_offer": new_data["last_offer"],
+        "last_offer_date": mmddyyyy_to_iso(new_data["last_offer_date"]),
+        "date_assigned_to_nego": mmddyyyy_to_iso(new_data["date_assigned_to_nego"])
+    }
+
 def update_negotiation(pid: int) -> Tuple[bool, bool, Optional[Dict]]:
     """Update negotiation info for a single project with detailed change tracking"""
     try:
@@ -179,15 +267,7 @@ def update_negotiation(pid: int) -> Tuple[bool, bool, Optional[Dict]]:
             return False, False, None
         
         # Prepare data for comparison
-        new_data_processed = {
-            "negotiator": new_data["negotiator"],
-            "settlement_date": mmddyyyy_to_iso(new_data["settlement_date"]),
-            "settled": new_data["settled"],
-            "settled_amount": new_data["settled_amount"],
-            "last_offer": new_data["last_offer"],
-            "last_offer_date": mmddyyyy_to_iso(new_data["last_offer_date"]),
-            "date_assigned_to_nego": mmddyyyy_to_iso(new_data["date_assigned_to_nego"])
-        }
+        new_data_processed = process_nego_info(new_data)
         
         # Check for changes
         has_change, changes = has_changes(current_data, new_data_processed)
@@ -207,6 +287,7 @@ def update_negotiation(pid: int) -> Tuple[bool, bool, Optional[Dict]]:
                 "project_id": pid,
                 **new_data_processed
             })
+            sync_dashboard_row(conn, pid, {"negotiation"})
         
         print(f"💾 Project {pid}: Successfully updated")
         return True, True, changes
@@ -217,8 +298,62 @@ def update_negotiation(pid: int) -> Tuple[bool, bool, Optional[Dict]]:
         traceback.print_exc()
         return False, False, None
 
+def fetch_negotiations(project_ids: List[int], workers: int = FETCH_WORKERS) -> Dict[int, Dict[str, Any]]:
+    """
+    Negotiation forms for many projects, fetched concurrently. Every request
+    still takes a slot from the shared rate budget, so more workers only
+    overlap request latency; they can't exceed the incremental lane's share.
+    Projects whose form couldn't be fetched are left out.
+    """
+    def fetch(pid):
+        data = get_nego_info(pid)
+        return pid, process_nego_info(data) if data else None
+
+    fetched: Dict[int, Dict[str, Any]] = {}
+    started = time.monotonic()
+    # the budget lane is per thread, so each worker joins the incremental lane
+    with ThreadPoolExecutor(max_workers=workers, initializer=rate_budget.set_lane,
+                            initargs=("incremental",)) as pool:
+        for i, (pid, data) in enumerate(pool.map(fetch, project_ids), 1):
+            if data:
+                fetched[pid] = data
+            if i % 100 == 0 or i == len(project_ids):
+                rate = i / max(time.monotonic() - started, 1e-9)
+                print(f"📥 Fetched {i}/{len(project_ids)} negotiation forms ({rate:.1f}/s)")
+    return fetched
+
+def write_negotiations(rows: Dict[int, Dict[str, Any]]) -> Tuple[int, List[int]]:
+    """
+    Batched UPSERT_NEGOTIATIONS plus their dashboard rows, UPSERT_CHUNK
+    projects per transaction. A chunk that fails is rolled back and its
+    projects reported as failed; the other chunks are still written.
+    Returns (written, failed project ids).
+    """
+    pids = list(rows)
+    written, failed = 0, []
+    for i in range(0, len(pids), UPSERT_CHUNK):
+        chunk = pids[i:i + UPSERT_CHUNK]
+        payload = json.dumps([{"project_id": pid, **rows[pid]} for pid in chunk])
+        try:
+            with engine.begin() as conn:
+                conn.execute(UPSERT_NEGOTIATIONS, {"rows": payload})
+                sync_dashboard_rows(conn, chunk, {"negotiation"})
+        except Exception as e:
+            print(f"❌ Failed to write {len(chunk)} project(s) - {e}")
+            failed.extend(chunk)
+            continue
+        written += len(chunk)
+    return written, failed
+
 def main():
-    """Main execution function"""
+    """
+    Main execution function: one bulk read of the current rows, concurrent
+    form fetches, a column-wise diff and one batched upsert of what changed.
+    """
+    rate_budget.set_lane("incremental")
+    with engine.begin() as conn:
+        ensure_dashboard_rows(conn)
+
     # Get projects in target phases
     project_ids = get_projects_to_update()
     print(f"Found {len(project_ids)} projects to check for updates")
@@ -227,58 +362,38 @@ def main():
         print("No projects found in target phases")
         return
     
-    # Process projects
-    failed_projects = []
-    successful_updates = 0
-    no_changes_count = 0
-    changed_fields = {}
-    batch_size = 20
-    retry_delay = 5
-    
-    for i in range(0, len(project_ids), batch_size):
-        batch = project_ids[i:i + batch_size]
-        print(f"\n📦 Processing batch {i//batch_size + 1} (projects {i+1}-{min(i+batch_size, len(project_ids))})...")
-        
-        for pid in batch:
-            success, updated, changes = update_negotiation(pid)
-            if success:
-                if updated:
-                    successful_updates += 1
-                    changed_fields[pid] = changes
-                else:
-                    no_changes_count += 1
-            else:
-                failed_projects.append(pid)
-        
-        # Add delay between batches
-        if i + batch_size < len(project_ids):
-            print(f"⏳ Waiting {retry_delay} seconds before next batch...")
-            time.sleep(retry_delay)
-    
-    # Retry failed projects once
-    if failed_projects:
-        print(f"\n🔄 Retrying {len(failed_projects)} failed projects...")
-        retry_failed = []
-        
-        for pid in failed_projects:
-            print(f"\n🔍 Retrying project {pid}")
-            success, updated, changes = update_negotiation(pid)
-            if success:
-                if updated:
-                    successful_updates += 1
-                    changed_fields[pid] = changes
-                else:
-                    no_changes_count += 1
-            else:
-                retry_failed.append(pid)
-    
+    started = time.monotonic()
+    current = get_current_negotiations(project_ids)
+    print(f"📚 Read {len(current)} current negotiation rows")
+
+    fetched = fetch_negotiations(project_ids)
+
+    # Retry failed fetches once
+    missing = [pid for pid in project_ids if pid not in fetched]
+    if missing:
+        print(f"\n🔄 Retrying {len(missing)} failed fetches...")
+        fetched.update(fetch_negotiations(missing))
+    retry_failed = [pid for pid in project_ids if pid not in fetched]
+
+    changed_fields, field_counts = diff_negotiations(current, fetched)
+    written, write_failed = write_negotiations({pid: fetched[pid] for pid in changed_fields})
+    failed = retry_failed + write_failed
+    elapsed = time.monotonic() - started
+
     # Final report
     print("\n" + "="*50)
     print("📊 Update Summary:")
-    print(f"✅ Successfully updated: {successful_updates} projects")
-    print(f"➖ No changes needed: {no_changes_count} projects")
-    print(f"❌ Failed to update: {len(retry_failed)} projects")
-    
+    print(f"✅ Successfully updated: {written} projects")
+    print(f"➖ No changes needed: {len(fetched) - len(changed_fields)} projects")
+    print(f"❌ Failed to update: {len(failed)} projects")
+    print(f"⏱ {len(project_ids)} projects in {elapsed:.0f}s ({len(project_ids) / max(elapsed, 1e-9):.1f}/s)")
+
+    if any(field_counts.values()):
+        print("\n📈 Changes per field:")
+        for field in NEGO_FIELDS:
+            if field_counts[field]:
+                print(f"   - {field}: {field_counts[field]}")
+
     # Print detailed changes
     if changed_fields:
         print("\n🔍 Field Changes Breakdown:")
@@ -287,8 +402,8 @@ def main():
             for field, (old_val, new_val) in changes.items():
                 print(f"   - {field}: {old_val} → {new_val}")
     
-    if retry_failed:
-        print("\nFailed project IDs:", retry_failed)
+    if failed:
+        print("\nFailed project IDs:", failed)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,380 @@
+# load_runs.py
+#
+# Checkpoints for bulk loads. A run records its target project list (up
+# front, or page by page as a streamed listing arrives) and each project's
+# status as it's loaded, so an interrupted run can be resumed (--resume)
+# without reloading what already finished, and a failing project is retried
+# with backoff instead of failing the run. A streamed run whose listing was
+# cut short is listed again on resume, adding only the projects it missed.
+
+import time
+import queue
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+import rate_budget
+from bulk_scheduler import Schedule
+
+LOAD_RUNS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS load_runs (
+      run_id      BIGSERIAL   PRIMARY KEY,
+      label       TEXT        NOT NULL,
+      started_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      listed_at   TIMESTAMPTZ,  -- target list complete; NULL while a streamed listing is unfinished
+      finished_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS load_run_projects (
+      run_id          BIGINT      NOT NULL REFERENCES load_runs (run_id) ON DELETE CASCADE,
+      project_id      BIGINT      NOT NULL,
+      position        INTEGER     NOT NULL,
+      status          TEXT        NOT NULL DEFAULT 'pending',  -- pending | done | failed
+      attempts        INTEGER     NOT NULL DEFAULT 0,
+      next_attempt_at TIMESTAMPTZ,
+      last_error      TEXT,
+      updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      PRIMARY KEY (run_id, project_id)
+    )
+    """,
+    # API calls each project took on its last successful load, per loader;
+    # bulk_scheduler uses it to estimate and pace the next run
+    """
+    CREATE TABLE IF NOT EXISTS project_api_costs (
+      loader      TEXT        NOT NULL,
+      project_id  BIGINT      NOT NULL,
+      calls       INTEGER     NOT NULL,
+      updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      PRIMARY KEY (loader, project_id)
+    )
+    """,
+]
+
+# runs created before listed_at existed get it added once (checked first:
+# ALTER TABLE takes an ACCESS EXCLUSIVE lock even when the column is there)
+HAS_LISTED_AT = text("""
+SELECT EXISTS (
+  SELECT 1 FROM information_schema.columns
+  WHERE table_schema = current_schema()
+    AND table_name = 'load_runs' AND column_name = 'listed_at'
+)
+""")
+
+ADD_LISTED_AT = "ALTER TABLE load_runs ADD COLUMN listed_at TIMESTAMPTZ"
+
+LISTING_QUEUE_SIZE = 200  # listed-but-not-yet-loaded projects a streamed run holds in memory
+
+CREATE_RUN = text("""
+INSERT INTO load_runs (label, listed_at)
+VALUES (:label, CASE WHEN :streamed THEN NULL ELSE NOW() END)
+RETURNING run_id
+""")
+
+MARK_LISTED = text("UPDATE load_runs SET listed_at = NOW() WHERE run_id = :run_id")
+
+IS_LISTED = text("SELECT listed_at IS NOT NULL FROM load_runs WHERE run_id = :run_id")
+
+# where a re-listing appends projects the interrupted listing never reached
+NEXT_POSITION = text("SELECT COALESCE(MAX(position) + 1, 0) FROM load_run_projects WHERE run_id = :run_id")
+
+# a chunk of the target list in one statement, in listing order after :start;
+# returns the ids that weren't in the run yet
+ADD_RUN_PROJECTS = text("""
+INSERT INTO load_run_projects (run_id, project_id, position)
+SELECT :run_id, t.pid, :start + t.pos
+FROM unnest(CAST(:ids AS BIGINT[])) WITH ORDINALITY AS t(pid, pos)
+ON CONFLICT (run_id, project_id) DO NOTHING
+RETURNING project_id
+""")
+
+LATEST_OPEN_RUN = text("""
+SELECT run_id FROM load_runs
+WHERE label = :label AND finished_at IS NULL
+ORDER BY run_id DESC LIMIT 1
+""")
+
+# not yet loaded, or failed and due for another attempt
+DUE_PROJECTS = text("""
+SELECT project_id FROM load_run_projects
+WHERE run_id = :run_id
+  AND (status = 'pending'
+       OR (status = 'failed' AND attempts < :max_attempts
+           AND (next_attempt_at IS NULL OR next_attempt_at <= NOW())))
+ORDER BY position
+""")
+
+NEXT_RETRY_IN = text("""
+SELECT EXTRACT(EPOCH FROM MIN(next_attempt_at) - NOW())
+FROM load_run_projects
+WHERE run_id = :run_id AND status = 'failed' AND attempts < :max_attempts
+""")
+
+MARK_DONE = text("""
+UPDATE load_run_projects
+SET status = 'done', attempts = attempts + 1, last_error = NULL, updated_at = NOW()
+WHERE run_id = :run_id AND project_id = :project_id
+""")
+
+RECORD_COST = text("""
+INSERT INTO project_api_costs (loader, project_id, calls)
+VALUES (:loader, :project_id, :calls)
+ON CONFLICT (loader, project_id) DO UPDATE SET calls = EXCLUDED.calls, updated_at = NOW()
+""")
+
+READ_COSTS = text("""
+SELECT project_id, calls FROM project_api_costs
+WHERE loader = :loader AND project_id = ANY(:ids)
+""")
+
+MEAN_COST = text("SELECT AVG(calls) FROM project_api_costs WHERE loader = :loader")
+
+# backoff doubles with each attempt: backoff_s, 2*backoff_s, 4*backoff_s ...
+MARK_FAILED = text("""
+UPDATE load_run_projects
+SET status = 'failed',
+    attempts = attempts + 1,
+    next_attempt_at = NOW() + make_interval(secs => :backoff_s * power(2, attempts)),
+    last_error = :error,
+    updated_at = NOW()
+WHERE run_id = :run_id AND project_id = :project_id
+""")
+
+RUN_COUNTS = text("""
+SELECT status, COUNT(*) FROM load_run_projects WHERE run_id = :run_id GROUP BY status
+""")
+
+FAILED_PROJECTS = text("""
+SELECT project_id FROM load_run_projects
+WHERE run_id = :run_id AND status = 'failed' ORDER BY position
+""")
+
+# The newest run of each label under :pattern (a LIKE pattern; backslash is
+# Postgres' default LIKE escape). Older runs of a label were superseded by a
+# re-run and would otherwise be counted twice.
+RUNS_REPORT = text("""
+WITH latest AS (
+  SELECT DISTINCT ON (label) run_id, label, started_at, finished_at
+  FROM load_runs
+  WHERE label LIKE :pattern
+  ORDER BY label, run_id DESC
+)
+SELECT r.run_id, r.label, r.started_at, r.finished_at,
+       COUNT(p.project_id) FILTER (WHERE p.status = 'done')    AS done,
+       COUNT(p.project_id) FILTER (WHERE p.status = 'failed')  AS failed,
+       COUNT(p.project_id) FILTER (WHERE p.status = 'pending') AS pending
+FROM latest r
+LEFT JOIN load_run_projects p USING (run_id)
+GROUP BY r.run_id, r.label, r.started_at, r.finished_at
+ORDER BY r.label
+""")
+
+FINISH_RUN = text("UPDATE load_runs SET finished_at = NOW() WHERE run_id = :run_id")
+
+
+def ensure_load_runs(conn):
+    for stmt in LOAD_RUNS_DDL:
+        conn.execute(text(stmt))
+    if not conn.execute(HAS_LISTED_AT).scalar():
+        conn.execute(text(ADD_LISTED_AT))
+
+
+def create_run(engine, label: str, project_ids: Iterable[int] = (), streamed: bool = False) -> int:
+    """
+    Record a new run and its target project list; returns the run id.
+    Streamed runs start empty and add projects as they're listed; their
+    target list only counts as complete once the listing has finished.
+    """
+    with engine.begin() as conn:
+        run_id = conn.execute(CREATE_RUN, {"label": label, "streamed": streamed}).scalar()
+        conn.execute(ADD_RUN_PROJECTS, {"run_id": run_id, "ids": list(project_ids), "start": 0})
+    return run_id
+
+
+def add_run_projects(engine, run_id: int, project_ids: List[int], start: int) -> List[int]:
+    """Append targets to the run; returns the ones it didn't have yet."""
+    with engine.begin() as conn:
+        return list(conn.execute(ADD_RUN_PROJECTS, {"run_id": run_id, "ids": project_ids,
+                                                    "start": start}).scalars())
+
+
+def listing_complete(engine, run_id: int) -> bool:
+    """Whether the run's target list is complete (False while a streamed listing never finished)."""
+    with engine.connect() as conn:
+        return bool(conn.execute(IS_LISTED, {"run_id": run_id}).scalar())
+
+
+def latest_open_run(engine, label: str) -> Optional[int]:
+    """The newest unfinished run with this label, if any."""
+    with engine.connect() as conn:
+        return conn.execute(LATEST_OPEN_RUN, {"label": label}).scalar()
+
+
+def due_projects(engine, run_id: int, max_attempts: int) -> List[int]:
+    with engine.connect() as conn:
+        return list(conn.execute(DUE_PROJECTS, {"run_id": run_id, "max_attempts": max_attempts}).scalars())
+
+
+def mark_done(engine, run_id: int, project_id: int, loader: Optional[str] = None,
+              calls: Optional[int] = None):
+    """Checkpoint a loaded project, recording its API call count for `loader` when given."""
+    with engine.begin() as conn:
+        conn.execute(MARK_DONE, {"run_id": run_id, "project_id": project_id})
+        if loader and calls is not None:
+            conn.execute(RECORD_COST, {"loader": loader, "project_id": project_id, "calls": calls})
+
+
+def project_costs(engine, loader: str, project_ids: List[int]) -> Tuple[Dict[int, int], Optional[float]]:
+    """({project_id: calls last time}, mean calls over every project this loader has seen)."""
+    with engine.connect() as conn:
+        known = dict(conn.execute(READ_COSTS, {"loader": loader, "ids": list(project_ids)}).all())
+        mean = conn.execute(MEAN_COST, {"loader": loader}).scalar()
+    return known, float(mean) if mean is not None else None
+
+
+def mark_failed(engine, run_id: int, project_id: int, error: str, backoff_s: float):
+    with engine.begin() as conn:
+        conn.execute(MARK_FAILED, {"run_id": run_id, "project_id": project_id,
+                                   "error": error[:2000], "backoff_s": backoff_s})
+
+
+def run_counts(engine, run_id: int) -> dict:
+    with engine.connect() as conn:
+        counts = dict(conn.execute(RUN_COUNTS, {"run_id": run_id}).all())
+    return {status: counts.get(status, 0) for status in ("done", "failed", "pending")}
+
+
+def failed_projects(engine, run_id: int) -> List[int]:
+    with engine.connect() as conn:
+        return list(conn.execute(FAILED_PROJECTS, {"run_id": run_id}).scalars())
+
+
+def runs_report(engine, prefix: str) -> List[dict]:
+    """
+    One dict per label starting with `prefix`, for its newest run: run_id,
+    label, started_at, finished_at, done, failed, pending.
+    """
+    pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    with engine.connect() as conn:
+        return [dict(r) for r in conn.execute(RUNS_REPORT, {"pattern": pattern}).mappings()]
+
+
+def _stream_pass(engine, run_id: int, batches: Iterable[List[int]], load_one: Callable[[int], None],
+                 schedule: Schedule):
+    """
+    First pass of a streamed run: a listing thread appends each batch to the
+    run and feeds a bounded queue while this thread loads from it, so loads
+    start with the first page and the listing never runs more than
+    LISTING_QUEUE_SIZE projects ahead. Only projects new to the run are
+    queued, so re-listing a resumed run skips what it already has. The run
+    is marked listed once the listing has been read to the end.
+    """
+    work: "queue.Queue" = queue.Queue(maxsize=LISTING_QUEUE_SIZE)
+    end = object()
+    errors = []
+    lane = rate_budget.current_lane()
+
+    def produce():
+        # the budget lane is per thread: bill listing pages to the run's lane
+        rate_budget.set_lane(lane)
+        seen = set()
+        try:
+            with engine.connect() as conn:
+                position = conn.execute(NEXT_POSITION, {"run_id": run_id}).scalar()
+            for batch in batches:
+                # offset paging can repeat an item when projects are added mid-listing
+                batch = [pid for pid in batch if pid not in seen]
+                if not batch:
+                    continue
+                seen.update(batch)
+                added = add_run_projects(engine, run_id, batch, position)
+                position += len(batch)
+                if not added:
+                    continue
+                known, mean = project_costs(engine, schedule.loader, added)
+                schedule.add(added, known, mean)
+                for pid in added:
+                    work.put(pid)
+            with engine.begin() as conn:
+                conn.execute(MARK_LISTED, {"run_id": run_id})
+        except Exception as e:
+            errors.append(e)
+        finally:
+            schedule.listing_done()
+            work.put(end)
+
+    threading.Thread(target=produce, name=f"listing-{run_id}", daemon=True).start()
+    while True:
+        pid = work.get()
+        if pid is end:
+            break
+        load_one(pid)
+    if errors:
+        print(f"❌ Listing failed part-way; run {run_id} stays open for --resume: {errors[0]}")
+        raise errors[0]
+
+
+def run_load(engine, run_id: int, load_fn: Callable[[int], object],
+             max_attempts: int = 3, backoff_s: float = 30,
+             loader: str = "full", target_rpm: Optional[float] = None,
+             stream: Optional[Iterable[List[int]]] = None) -> dict:
+    """
+    Load every project of the run that isn't done yet, checkpointing each
+    one as it finishes. Project starts are paced to target_rpm API calls per
+    minute using each project's cost from earlier runs (bulk_scheduler), and
+    progress is reported with an ETA. Failures are retried after backoff_s,
+    2*backoff_s, ... (up to max_attempts in total) while the rest of the run
+    carries on; the run is marked finished once nothing is left to retry.
+
+    With `stream` (batches of project ids, e.g. one per listing page) the
+    run's targets are added as they arrive and loading starts straight away
+    instead of after the whole listing. A run whose listing never completed
+    is left open rather than finished, so --resume can list the rest.
+    """
+    def load_one(pid):
+        schedule.wait(pid)
+        calls_before = rate_budget.calls_made()
+        try:
+            load_fn(pid)
+            calls = rate_budget.calls_made() - calls_before
+            mark_done(engine, run_id, pid, loader, calls)
+        except Exception as e:
+            calls = rate_budget.calls_made() - calls_before
+            print(f"❌ Failed to load {pid}: {str(e)}")
+            mark_failed(engine, run_id, pid, str(e), backoff_s)
+        schedule.finished(pid, calls)
+
+    if stream is not None:
+        schedule = Schedule(loader, target_rpm)
+        print("🗓 Loading while the listing streams in ...")
+        _stream_pass(engine, run_id, stream, load_one, schedule)
+        print(schedule.progress())
+
+    while True:
+        due = due_projects(engine, run_id, max_attempts)
+        if due:
+            known, mean = project_costs(engine, loader, due)
+            schedule = Schedule(loader, target_rpm)
+            schedule.add(due, known, mean)
+            schedule.listing_done()
+            print(schedule.plan())
+            for pid in due:
+                load_one(pid)
+            print(schedule.progress())
+
+        with engine.connect() as conn:
+            wait = conn.execute(NEXT_RETRY_IN, {"run_id": run_id, "max_attempts": max_attempts}).scalar()
+        if wait is None:
+            break
+        if wait > 0:
+            print(f"🔁 Retrying failed projects in {float(wait):.0f}s ...")
+            time.sleep(float(wait))
+
+    if not listing_complete(engine, run_id):
+        print(f"⚠️ Run {run_id}'s listing never completed; leaving it open — resume it to list the rest")
+        return run_counts(engine, run_id)
+    with engine.begin() as conn:
+        conn.execute(FINISH_RUN, {"run_id": run_id})
+    return run_counts(engine, run_id)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Load-test /webhook ack latency.
+
+Fires POSTs at a fixed rate (open loop: request i is due at t0 + i/rate, and
+its latency is measured from that moment, so a stalled server can't hide
+queueing delay) over a pool of keep-alive connections, then reports
+p50/p90/p99/max ack latency.
+
+    python loadtest_webhook.py --rate 500 --duration 30
+    python loadtest_webhook.py --url http://localhost:8000/webhook --p99-budget-ms 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from urllib.parse import urlsplit
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections, opened lazily up to `size`."""
+
+    def __init__(self, host: str, port: int, size: int):
+        self.host, self.port = host, port
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(size)
+
+    async def get(self):
+        await self.slots.acquire()
+        if not self.idle.empty():
+            return self.idle.get_nowait()
+        return await asyncio.open_connection(self.host, self.port)
+
+    def put(self, conn, reusable: bool = True):
+        if reusable:
+            self.idle.put_nowait(conn)
+        else:
+            conn[1].close()
+        self.slots.release()
+
+    async def close(self):
+        while not self.idle.empty():
+            _, writer = self.idle.get_nowait()
+            writer.close()
+
+
+async def post_json(pool: ConnectionPool, host: str, path: str, body: bytes) -> int:
+    conn = await pool.get()
+    reader, writer = conn
+    try:
+        writer.write(
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n".encode() + body
+        )
+        await writer.drain()
+
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        keep_alive = True
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection" and value.strip().lower() == "close":
+                keep_alive = False
+        await reader.readexactly(length)
+    except Exception:
+        pool.put(conn, reusable=False)
+        raise
+    pool.put(conn, reusable=keep_alive)
+    return status
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+async def run(args) -> dict:
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    path = url.path or "/"
+    pool = ConnectionPool(host, port, args.connections)
+
+    latencies, errors, statuses = [], 0, {}
+    total = int(args.rate * args.duration)
+
+    async def one(i: int, due: float):
+        nonlocal errors
+        payload = {
+            "projectId": random.randint(1, args.projects),
+            "eventId": str(uuid.uuid4()),
+            "Object": "Note",
+            "Event": "Created",
+        }
+        try:
+            status = await post_json(pool, host, path, json.dumps(payload).encode())
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - due)
+            else:
+                errors += 1
+        except Exception:
+            errors += 1
+
+    tasks = []
+    t0 = time.perf_counter()
+    for i in range(total):
+        due = t0 + i / args.rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i, due)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - t0
+    await pool.close()
+
+    latencies.sort()
+    return {
+        "sent":     total,
+        "ok":       len(latencies),
+        "errors":   errors,
+        "statuses": statuses,
+        "rate":     total / wall if wall else 0.0,
+        "p50_ms":   percentile(latencies, 50) * 1000,
+        "p90_ms":   percentile(latencies, 90) * 1000,
+        "p99_ms":   percentile(latencies, 99) * 1000,
+        "max_ms":   (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://localhost:8000/webhook")
+    ap.add_argument("--rate", type=float, default=500, help="requests per second (default 500)")
+    ap.add_argument("--duration", type=float, default=20, help="seconds to run (default 20)")
+    ap.add_argument("--connections", type=int, default=256, help="max concurrent connections")
+    ap.add_argument("--projects", type=int, default=5000, help="random project ids drawn from 1..N")
+    ap.add_argument("--p99-budget-ms", type=float, default=None, help="exit 1 if p99 exceeds this")
+    args = ap.parse_args()
+
+    print(f"🔥 {args.rate:.0f} req/s for {args.duration:.0f}s against {args.url} ...")
+    r = asyncio.run(run(args))
+
+    print("\n" + "=" * 60)
+    print(f"sent {r['sent']:,}  ok {r['ok']:,}  errors {r['errors']:,}  "
+          f"achieved {r['rate']:,.0f} req/s  statuses {r['statuses']}")
+    print(f"ack latency ms   p50 {r['p50_ms']:.1f}   p90 {r['p90_ms']:.1f}   "
+          f"p99 {r['p99_ms']:.1f}   max {r['max_ms']:.1f}")
+
+    if args.p99_budget_ms is not None and r["p99_ms"] > args.p99_budget_ms:
+        print(f"❌ p99 {r['p99_ms']:.1f} ms is over the {args.p99_budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
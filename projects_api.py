@@ -0,0 +1,113 @@
+# projects_api.py
+
+from datetime import date
+from typing import Optional, List
+
+from sqlalchemy import text
+
+from filevine_loader import engine
+from dashboard import DASHBOARD_SECTIONS, AGGREGATE_METRICS
+
+# Every column a /projects caller may ask for via ?fields=
+PROJECT_FIELDS = (
+    ["project_id"]
+    + [column for columns in DASHBOARD_SECTIONS.values() for column, _ in columns]
+    + ["last_updated"]
+)
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    ?fields=a,b,c -> validated column list (project_id always included, since
+    it's the pagination key). None/empty means every column.
+    """
+    if not fields:
+        return PROJECT_FIELDS
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in PROJECT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return ["project_id"] + [f for f in wanted if f != "project_id"]
+
+
+def query_projects(
+    fields: List[str],
+    limit: int,
+    after: Optional[int] = None,
+    phase_name: Optional[List[str]] = None,
+    project_type_code: Optional[List[str]] = None,
+    case_manager: Optional[str] = None,
+    sol_due_from: Optional[date] = None,
+    sol_due_to: Optional[date] = None,
+    settled: Optional[str] = None,
+    bind=None,
+) -> dict:
+    """
+    One page of dashboard_rows in project_id order, after the `after` cursor.
+    Keyset pagination: every page is an index range scan starting at the
+    cursor, so page 1000 costs the same as page 1. Fetches one extra row to
+    know whether there's a next page.
+    """
+    where, params = [], {"limit": limit + 1}
+    if after is not None:
+        where.append("project_id > :after")
+        params["after"] = after
+    if phase_name:
+        where.append("phase_name = ANY(:phase_name)")
+        params["phase_name"] = list(phase_name)
+    if project_type_code:
+        where.append("project_type_code = ANY(:project_type_code)")
+        params["project_type_code"] = list(project_type_code)
+    if case_manager:
+        where.append("case_manager = :case_manager")
+        params["case_manager"] = case_manager
+    if sol_due_from:
+        where.append("sol_due_date >= :sol_due_from")
+        params["sol_due_from"] = sol_due_from
+    if sol_due_to:
+        where.append("sol_due_date <= :sol_due_to")
+        params["sol_due_to"] = sol_due_to
+    if settled:
+        where.append("settled = :settled")
+        params["settled"] = settled
+
+    # column names come from PROJECT_FIELDS only (see parse_fields)
+    sql = f"SELECT {', '.join(fields)} FROM dashboard_rows"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY project_id LIMIT :limit"
+
+    with (bind or engine).connect() as conn:
+        rows = conn.execute(text(sql), params).mappings().all()
+
+    has_more = len(rows) > limit
+    items = [dict(r) for r in rows[:limit]]
+    return {
+        "items": items,
+        "count": len(items),
+        "next_after": items[-1]["project_id"] if has_more else None,
+    }
+
+
+def query_aggregates(metric: Optional[str] = None, bind=None) -> dict:
+    """
+    The trigger-maintained dashboard_aggregates as {metric: [{bucket,
+    projects, amount}, ...]}. A read of a few hundred rows, however many
+    projects there are. Buckets that have dropped to zero are left out.
+    """
+    if metric is not None and metric not in AGGREGATE_METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    sql = "SELECT metric, bucket, projects, amount FROM dashboard_aggregates WHERE (projects <> 0 OR amount <> 0)"
+    params = {}
+    if metric:
+        sql += " AND metric = :metric"
+        params["metric"] = metric
+    sql += " ORDER BY metric, bucket"
+
+    with (bind or engine).connect() as conn:
+        rows = conn.execute(text(sql), params).all()
+
+    out = {m: [] for m in ([metric] if metric else AGGREGATE_METRICS)}
+    for m, bucket, projects, amount in rows:
+        out.setdefault(m, []).append({"bucket": bucket, "projects": projects, "amount": amount})
+    return out
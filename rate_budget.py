@@ -0,0 +1,103 @@
+# rate_budget.py
+#
+# One Filevine API budget shared by the webhook workers, the bulk loaders
+# and the updaters. Every request takes a slot in the current window; the
+# bulk lanes are capped to a share of it, so there is always headroom left
+# for real-time (webhook) loads.
+
+import time
+import threading
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from config import (
+    REDIS_URL, API_RATE_LIMIT_RPM, API_RATE_WINDOW_S,
+    API_RATE_SHARE_INCREMENTAL, API_RATE_SHARE_BACKFILL,
+)
+
+LANES = ("realtime", "incremental", "backfill")
+
+LANE_SHARES = {
+    "realtime":    1.0,
+    "incremental": API_RATE_SHARE_INCREMENTAL,
+    "backfill":    API_RATE_SHARE_BACKFILL,
+}
+
+# Take a slot only if both the org-wide and the lane's counter for this
+# window have room, atomically across processes.
+ACQUIRE_LUA = """
+local total = tonumber(redis.call('GET', KEYS[1]) or '0')
+local lane  = tonumber(redis.call('GET', KEYS[2]) or '0')
+if total >= tonumber(ARGV[1]) or lane >= tonumber(ARGV[2]) then
+  return 0
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+_redis = Redis.from_url(REDIS_URL)
+_acquire = _redis.register_script(ACQUIRE_LUA)
+_local = threading.local()
+_warned = False
+
+
+def set_lane(lane: str):
+    """Lane this thread's API calls are charged to (see LANES)."""
+    if lane not in LANE_SHARES:
+        raise ValueError(f"Unknown lane: {lane}")
+    _local.lane = lane
+
+
+def current_lane() -> str:
+    return getattr(_local, "lane", "realtime")
+
+
+def window_limit(lane: str) -> int:
+    """Requests `lane` may make per API_RATE_WINDOW_S window."""
+    per_window = API_RATE_LIMIT_RPM * API_RATE_WINDOW_S / 60
+    return max(1, int(per_window * LANE_SHARES[lane]))
+
+
+def calls_made() -> int:
+    """API requests this thread has made so far (for per-project cost history)."""
+    return getattr(_local, "calls", 0)
+
+
+def lane_rpm(lane: str = None) -> float:
+    """Requests per minute `lane` (default: this thread's) is allowed; 0 if pacing is off."""
+    if API_RATE_LIMIT_RPM <= 0:
+        return 0.0
+    return window_limit(lane or current_lane()) * 60 / API_RATE_WINDOW_S
+
+
+def acquire(lane: str = None):
+    """
+    Block until the lane may make one more API request. If Redis can't be
+    reached the request goes ahead unmetered (with a warning), so a
+    standalone script still runs.
+    """
+    global _warned
+    _local.calls = calls_made() + 1
+    if API_RATE_LIMIT_RPM <= 0:
+        return
+    lane = lane or current_lane()
+    total_limit = window_limit("realtime")
+    while True:
+        window = int(time.time() // API_RATE_WINDOW_S)
+        try:
+            ok = _acquire(
+                keys=[f"filevine:rate:all:{window}", f"filevine:rate:{lane}:{window}"],
+                args=[total_limit, window_limit(lane), API_RATE_WINDOW_S * 2],
+            )
+        except RedisError as e:
+            if not _warned:
+                _warned = True
+                print(f"⚠️ Rate budget unavailable ({e}); API calls are not being paced")
+            return
+        if ok:
+            return
+        time.sleep(max(0.05, (window + 1) * API_RATE_WINDOW_S - time.time()))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Re-enqueue webhooks from webhook_journal after Redis was flushed or workers
+lost queued jobs. Events in the range are collapsed to one load per project
+covering the union of their sections (any full-load event makes it a full
+load), so a project that received 50 webhooks is reloaded once.
+
+    python replay_webhooks.py --since "2025-06-01 08:00" --until "2025-06-01 09:30"
+    python replay_webhooks.py --since "2025-06-01" --lane backfill
+    python replay_webhooks.py --since "2025-06-01 08:00" --dry-run
+"""
+import argparse
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from sqlalchemy import text
+
+from filevine_loader import engine
+from tasks import enqueue_project, enqueue_bulk
+
+# one row per project: NULL sections if any event in the range needed a full load
+REPLAY_QUERY = text("""
+SELECT project_id,
+       bool_or(sections IS NULL)                       AS full_load,
+       array_agg(DISTINCT s) FILTER (WHERE s IS NOT NULL) AS sections,
+       count(*)                                        AS events
+FROM webhook_journal
+LEFT JOIN LATERAL unnest(sections) AS s ON TRUE
+WHERE received_at >= :since
+  AND (CAST(:until AS TIMESTAMPTZ) IS NULL OR received_at < :until)
+GROUP BY project_id
+ORDER BY project_id
+""")
+
+
+def journaled_projects(since: datetime, until: Optional[datetime] = None) -> Dict[int, Optional[Set[str]]]:
+    """{project_id: sections to refresh (None = full load)} for events in [since, until)."""
+    with engine.connect() as conn:
+        rows = conn.execute(REPLAY_QUERY, {"since": since, "until": until}).all()
+    out = {}
+    for pid, full_load, sections, _ in rows:
+        out[pid] = None if full_load or not sections else set(sections)
+    return out
+
+
+def replay(since: datetime, until: Optional[datetime] = None, lane: str = "realtime",
+           dry_run: bool = False) -> dict:
+    projects = journaled_projects(since, until)
+    summary = {"projects": len(projects), "queued": 0, "coalesced": 0}
+    if dry_run or not projects:
+        return summary
+
+    if lane == "realtime":
+        # same path as /webhook: sections merge into any load already pending
+        for pid, sections in projects.items():
+            status, _ = enqueue_project(pid, sections=sections)
+            summary[status] = summary.get(status, 0) + 1
+    else:
+        # bulk lanes always run full loads
+        summary["queued"] = len(enqueue_bulk(projects, lane=lane))
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--since", required=True, type=datetime.fromisoformat, help="start of the range (inclusive)")
+    ap.add_argument("--until", type=datetime.fromisoformat, default=None, help="end of the range (exclusive, default now)")
+    ap.add_argument("--lane", choices=["realtime", "incremental", "backfill"], default="realtime",
+                    help="queue to replay onto (bulk lanes do full loads)")
+    ap.add_argument("--dry-run", action="store_true", help="only report what would be replayed")
+    args = ap.parse_args()
+
+    print(f"⏪ Replaying webhooks from {args.since} to {args.until or 'now'} onto the {args.lane} lane ...")
+    summary = replay(args.since, args.until, lane=args.lane, dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"🔎 {summary['projects']} project(s) would be re-enqueued")
+    else:
+        print(f"✅ {summary['projects']} project(s): {summary['queued']} queued, "
+              f"{summary['coalesced']} already pending")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,150 @@
 # tasks.py
+#
+# Three RQ lanes, highest priority first. Start workers with the queues in
+# this order so they always drain webhook loads before bulk work:
+#
+#   rq worker --with-scheduler filevine filevine-incremental filevine-backfill
+#
+# --with-scheduler runs the delayed (debounced) webhook loads; without any
+# such worker, enqueue_project queues loads immediately instead.
+#
+# Bulk lanes are additionally held to their share of the API budget
+# (rate_budget.py), so a backfill can't starve webhook loads of API calls.
 
-from redis import Redis
+from datetime import timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+from redis import Redis, BlockingConnectionPool
 from rq import Queue, Retry
-from worker_tasks import process_project
-
-# Connect to local Redis
-redis_conn = Redis(host="localhost", port=6379, db=0)
-q = Queue("filevine", connection=redis_conn)
-
-def enqueue_project(project_id):
-    redis_conn = Redis()          # or your REDIS_URL
-    q = Queue("filevine", connection=redis_conn)
-    # retry up to 3 times with default backoff
-    job = q.enqueue(
-        process_project,
-        project_id,
-        retry=Retry(max=3)
+from rq.scheduler import RQScheduler
+from worker_tasks import process_project, pending_key, sections_key, project_job_id, FULL_LOAD, LANE_QUEUES
+from config import (
+    REDIS_URL, REDIS_MAX_CONNECTIONS,
+    WEBHOOK_DEBOUNCE_S, WEBHOOK_PENDING_TTL_S, WEBHOOK_EVENT_TTL_S,
+)
+
+# One bounded pool for every thread that enqueues: callers wait for a free
+# connection instead of opening a new one per webhook.
+redis_conn = Redis(connection_pool=BlockingConnectionPool.from_url(
+    REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS, timeout=5,
+))
+queues = {lane: Queue(name, connection=redis_conn) for lane, name in LANE_QUEUES.items()}
+q = queues["realtime"]
+
+
+def event_key(event_id: str) -> str:
+    return f"filevine:event:{event_id}"
+
+
+# Event dedup, section bookkeeping and the pending check in one round trip.
+# Returns {status} or {status, job id of the pending load}.
+# ARGV: has_event, event_ttl, pending_ttl, job_id, section...
+INGEST_LUA = """
+if ARGV[1] == '1' then
+  if not redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[2]) then
+    return {'duplicate'}
+  end
+end
+redis.call('SADD', KEYS[2], unpack(ARGV, 5))
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+local pending = redis.call('GET', KEYS[3])
+if pending then
+  return {'coalesced', pending}
+end
+redis.call('SET', KEYS[3], ARGV[4], 'EX', ARGV[3])
+return {'queued', ARGV[4]}
+"""
+_ingest = redis_conn.register_script(INGEST_LUA)
+
+# Undo INGEST_LUA when scheduling the job failed, so the redelivered webhook
+# isn't dropped as a duplicate and later events aren't coalesced into a job
+# that doesn't exist. The pending key is only cleared if it's still ours.
+# ARGV: has_event, job_id
+UNDO_INGEST_LUA = """
+if ARGV[1] == '1' then
+  redis.call('DEL', KEYS[1])
+end
+if redis.call('GET', KEYS[2]) == ARGV[2] then
+  redis.call('DEL', KEYS[2])
+end
+return 1
+"""
+_undo_ingest = redis_conn.register_script(UNDO_INGEST_LUA)
+
+
+def scheduler_running(queue: Queue) -> bool:
+    """Whether some `rq worker --with-scheduler` holds the queue's scheduler lock."""
+    return bool(redis_conn.exists(RQScheduler.get_locking_key(queue.name)))
+
+
+def enqueue_project(project_id, event_id: Optional[str] = None,
+                    sections: Optional[Set[str]] = None) -> Tuple[str, Optional[str]]:
+    """
+    Queue a load of `project_id`, coalescing webhook bursts.
+    Returns (status, job_id) where status is:
+      "duplicate" - this Filevine event id was already accepted (redelivery)
+      "coalesced" - a load for the project is already waiting; nothing added
+      "queued"    - a new load was scheduled WEBHOOK_DEBOUNCE_S from now
+
+    The pending key is set when a load is scheduled and cleared by the worker
+    as the load starts, so every event that arrives before the start is
+    covered by that load, and anything later schedules exactly one more.
+    If scheduling fails, the event and pending keys are removed again
+    before the error propagates.
+    Delayed jobs need a worker started with `rq worker --with-scheduler`;
+    without one the load is queued straight away instead (no debounce),
+    since a delayed job would never run and its pending key would hold
+    off every later webhook until it expired.
+
+    `sections` (see webhook_events) are accumulated per project, so the one
+    coalesced load refreshes the union of what its events touched; None
+    means a full load.
+    """
+    job_id = project_job_id(project_id)
+    result = _ingest(
+        keys=[event_key(event_id or ""), sections_key(project_id), pending_key(project_id)],
+        args=["1" if event_id else "0", WEBHOOK_EVENT_TTL_S, WEBHOOK_PENDING_TTL_S, job_id,
+              *(sections or [FULL_LOAD])],
     )
-    return job.id
+    status = result[0].decode()
+    if status == "duplicate":
+        return status, None
+    if status == "coalesced":
+        return status, result[1].decode()
+
+    try:
+        # retry up to 3 times with default backoff
+        if scheduler_running(q):
+            job = q.enqueue_in(
+                timedelta(seconds=WEBHOOK_DEBOUNCE_S),
+                process_project,
+                project_id,
+                job_id=job_id,
+                retry=Retry(max=3),
+            )
+        else:
+            job = q.enqueue(process_project, project_id, job_id=job_id, retry=Retry(max=3))
+    except Exception:
+        # the caller answers 500 and Filevine redelivers; the sections stay
+        # in the set for whichever load gets scheduled next
+        _undo_ingest(
+            keys=[event_key(event_id or ""), pending_key(project_id)],
+            args=["1" if event_id else "0", job_id],
+        )
+        raise
+    return "queued", job.id
+
 
+def enqueue_bulk(project_ids: Iterable[int], lane: str = "backfill") -> List[str]:
+    """
+    Queue full loads for many projects on a bulk lane ("incremental" or
+    "backfill") in one round trip. No debouncing: each id gets one job.
+    """
+    if lane == "realtime":
+        raise ValueError("use enqueue_project for real-time loads")
+    queue = queues[lane]
+    jobs = queue.enqueue_many([
+        Queue.prepare_data(process_project, (pid,), retry=Retry(max=3))
+        for pid in project_ids
+    ])
+    return [job.id for job in jobs]
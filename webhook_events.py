@@ -0,0 +1,74 @@
+# webhook_events.py
+#
+# Which loader sections (filevine_loader.SECTIONS) a webhook can have
+# touched. Anything we can't place maps to None, i.e. a full load_project.
+
+import re
+from typing import Optional, Set
+
+# "<object>.<event>", lower-cased with punctuation stripped from each part
+EVENT_SECTIONS = {
+    "note.created":          {"contact_metrics"},
+    "note.updated":          {"contact_metrics"},
+    "note.deleted":          {"contact_metrics"},
+    "project.phasechanged":  {"core"},
+    "project.renamed":       {"core"},
+    "project.teamchanged":   {"team"},
+    "team.memberadded":      {"team"},
+    "team.memberremoved":    {"team"},
+    "team.rolechanged":      {"team"},
+}
+
+# Form/section updates: the form's section selector -> sections it feeds.
+SELECTOR_SECTIONS = {
+    "negotiation":      {"negotiation"},
+    "demandprep":       {"insurance"},
+    "breakdown":        {"breakdown"},
+    "litcasereview2":   {"lit"},
+    "demand":           {"demand"},
+    "casesummary":      {"sol"},
+    "intake2":          {"intake"},
+    "lojeintake20demo": {"intake"},
+    "wcintake":         {"intake"},
+}
+
+FORM_EVENTS = {
+    "form.updated", "form.created",
+    "section.updated", "project.sectionupdated",
+    "collectionitem.created", "collectionitem.updated", "collectionitem.deleted",
+}
+
+
+def _norm(s) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(s or "").lower())
+
+
+def event_name(data: dict) -> str:
+    """Normalised "<object>.<event>" for a Filevine webhook payload."""
+    evt = data.get("eventType") or data.get("Event") or ""
+    if "." in evt:
+        obj, _, evt = evt.partition(".")
+    else:
+        obj = data.get("Object") or data.get("objectType") or ""
+    return f"{_norm(obj)}.{_norm(evt)}"
+
+
+def section_selector(data: dict) -> str:
+    other = data.get("Other") or data.get("other") or {}
+    inner = data.get("data") or {}
+    return _norm(
+        (other.get("SectionSelector") if isinstance(other, dict) else None)
+        or data.get("sectionSelector")
+        or (inner.get("sectionSelector") if isinstance(inner, dict) else None)
+    )
+
+
+def sections_for_event(data: dict) -> Optional[Set[str]]:
+    """The minimal sections to refresh for this webhook, or None for a full load."""
+    name = event_name(data)
+    if name in EVENT_SECTIONS:
+        return set(EVENT_SECTIONS[name])
+    if name in FORM_EVENTS:
+        sections = SELECTOR_SECTIONS.get(section_selector(data))
+        return set(sections) if sections else None
+    return None
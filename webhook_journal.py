@@ -0,0 +1,138 @@
+# webhook_journal.py
+#
+# Durable record of every webhook /webhook accepted, independent of Redis.
+# If Redis is flushed or a worker dies with jobs in flight, replay_webhooks.py
+# re-enqueues just the projects touched in the affected time range.
+#
+# Writes are group-committed: one writer thread drains whatever has queued up
+# since its last commit and inserts it as a single multi-row INSERT + COMMIT,
+# so a burst of webhooks costs a handful of commits rather than one each.
+
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Optional, Set
+
+from psycopg2.extras import execute_values
+from sqlalchemy import text
+
+from filevine_loader import engine
+from config import WEBHOOK_JOURNAL_BATCH
+
+logger = logging.getLogger("filevine-webhook")
+
+JOURNAL_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS webhook_journal (
+      id          BIGSERIAL PRIMARY KEY,
+      received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      project_id  BIGINT NOT NULL,
+      event_id    TEXT,
+      event_type  TEXT,
+      sections    TEXT[]          -- NULL = full load
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS webhook_journal_received_at_idx ON webhook_journal (received_at)",
+]
+
+INSERT_JOURNAL = "INSERT INTO webhook_journal (project_id, event_id, event_type, sections) VALUES %s"
+
+# in-process numbers for /metrics
+metrics = {
+    "events_total":   0,
+    "commits_total":  0,
+    "failures_total": 0,
+}
+
+_queue: "queue.Queue" = queue.Queue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def ensure_journal():
+    with engine.begin() as conn:
+        for stmt in JOURNAL_DDL:
+            conn.execute(text(stmt))
+
+
+def _write_loop():
+    conn = None
+    while True:
+        batch = [_queue.get()]
+        # everything that arrived while the previous commit was in flight
+        while len(batch) < WEBHOOK_JOURNAL_BATCH:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            if conn is None:
+                conn = engine.raw_connection()
+            with conn.cursor() as cur:
+                execute_values(cur, INSERT_JOURNAL, [row for row, _ in batch], page_size=len(batch))
+            conn.commit()
+        except Exception as e:
+            metrics["failures_total"] += 1
+            logger.exception("❌ Failed to journal %d webhook(s)", len(batch))
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+            for _, fut in batch:
+                fut.set_exception(e)
+            continue
+
+        metrics["events_total"] += len(batch)
+        metrics["commits_total"] += 1
+        for _, fut in batch:
+            fut.set_result(None)
+
+
+def start_journal_writer():
+    """Create the journal table and start the writer thread (idempotent)."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            return
+        ensure_journal()
+        _writer = threading.Thread(target=_write_loop, name="webhook-journal", daemon=True)
+        _writer.start()
+
+
+def journal_event(project_id, event_id: Optional[str] = None, event_type: Optional[str] = None,
+                  sections: Optional[Set[str]] = None) -> Future:
+    """
+    Queue one event for the next group commit. The returned Future resolves
+    once the row is committed (or carries the database error), so callers can
+    hold their ack until the event is durable.
+    """
+    fut: Future = Future()
+    row = (int(project_id), event_id, event_type, sorted(sections) if sections else None)
+    _queue.put((row, fut))
+    return fut
+
+
+def queue_depth() -> int:
+    return _queue.qsize()
+
+
+def metrics_text() -> str:
+    """The journal writer's counters in Prometheus text exposition format."""
+    return "\n".join([
+        "# HELP webhook_journal_events_total Webhook events committed to webhook_journal.",
+        "# TYPE webhook_journal_events_total counter",
+        f"webhook_journal_events_total {metrics['events_total']}",
+        "# HELP webhook_journal_commits_total Group commits to webhook_journal.",
+        "# TYPE webhook_journal_commits_total counter",
+        f"webhook_journal_commits_total {metrics['commits_total']}",
+        "# HELP webhook_journal_failures_total Failed journal batches.",
+        "# TYPE webhook_journal_failures_total counter",
+        f"webhook_journal_failures_total {metrics['failures_total']}",
+        "# HELP webhook_journal_queue_depth Events waiting for the next commit.",
+        "# TYPE webhook_journal_queue_depth gauge",
+        f"webhook_journal_queue_depth {queue_depth()}",
+    ]) + "\n"
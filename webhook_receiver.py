@@ -1,10 +1,81 @@
 from flask import Flask, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+import importlib
 import subprocess
+import threading
+import sys
 import os
 
+from config import ZDRIVE_SYNC_WORKERS, ZDRIVE_SYNC_MAX_QUEUE, ZDRIVE_SYNC_IN_PROCESS
+
 # Flask App
 app = Flask(__name__)
 
+# Syncs run on a fixed pool of threads in this process instead of one new
+# interpreter per webhook, so a burst of events queues up here rather than
+# forking hundreds of Pythons. A project already waiting in the queue isn't
+# queued twice: the pending sync will pick up whatever changed.
+executor = ThreadPoolExecutor(max_workers=ZDRIVE_SYNC_WORKERS, thread_name_prefix="zdrive-sync")
+_lock = threading.Lock()
+_pending = set()   # project ids queued but not yet started
+_running = 0
+_sync_fn = None
+
+
+def run_sync_script(project_id):
+    subprocess.run(
+        [sys.executable, "filevine_to_zdrive_sync.py", str(project_id)],
+        env=os.environ.copy(), check=True,
+    )
+
+
+def get_sync_fn():
+    """
+    The sync entry point. By default the script runs as a subprocess, still
+    through the pool, so concurrency stays bounded. With
+    ZDRIVE_SYNC_IN_PROCESS=1 its module is imported once and kept warm
+    (with whatever connections it holds), and its sync_project(project_id)
+    is called directly; the module must then guard its script code with
+    `if __name__ == "__main__"`.
+    """
+    global _sync_fn
+    if _sync_fn is None:
+        _sync_fn = run_sync_script
+        if ZDRIVE_SYNC_IN_PROCESS:
+            try:
+                module = importlib.import_module("filevine_to_zdrive_sync")
+            except ImportError as e:
+                print(f"⚠️ Could not import filevine_to_zdrive_sync ({e}); running it as a script")
+            else:
+                if callable(getattr(module, "sync_project", None)):
+                    _sync_fn = module.sync_project
+                else:
+                    print("⚠️ filevine_to_zdrive_sync has no sync_project(project_id); running it as a script")
+    return _sync_fn
+
+
+def run_sync(project_id):
+    global _running
+    with _lock:
+        _pending.discard(project_id)
+        _running += 1
+    try:
+        print(f"🚀 Syncing project {project_id}")
+        get_sync_fn()(project_id)
+        print(f"✅ Synced project {project_id}")
+    except Exception as e:
+        print(f"❌ Sync failed for project {project_id}: {e}")
+    finally:
+        with _lock:
+            _running -= 1
+
+
+def queue_stats():
+    with _lock:
+        return {"queued": len(_pending), "running": _running,
+                "workers": ZDRIVE_SYNC_WORKERS, "maxQueue": ZDRIVE_SYNC_MAX_QUEUE}
+
+
 # @app.route('/trigger-sync', methods=['POST'])
 @app.route('/', methods=['POST'])
 def trigger_sync():
@@ -20,18 +91,32 @@ def trigger_sync():
     print(f"🔹 Project ID   : {project_id}")
     print(f"🔹 Project Name : {project_name}")
 
-    # Start your sync script with the projectId
-    try:
-        print(f"🚀 Calling sync script for project: {project_id} ({type(project_id)})")
-        subprocess.Popen(["python", "filevine_to_zdrive_sync.py", str(project_id)], env=os.environ.copy())
-        # subprocess.Popen(["python", "filevine_to_zdrive_sync.py", str(project_id)])
-        return jsonify({
-            "status": "success",
-            "projectId": project_id,
-            "projectName": project_name
-        })
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    project_id = str(project_id)
+    with _lock:
+        if project_id in _pending:
+            status = "coalesced"
+        elif len(_pending) >= ZDRIVE_SYNC_MAX_QUEUE:
+            status = "busy"
+        else:
+            _pending.add(project_id)
+            status = "queued"
+
+    if status == "busy":
+        return jsonify({"status": "error", "message": "Sync queue is full", **queue_stats()}), 503
+    if status == "queued":
+        executor.submit(run_sync, project_id)
+    return jsonify({
+        "status": status,
+        "projectId": project_id,
+        "projectName": project_name,
+        **queue_stats(),
+    })
+
+
+@app.route('/status', methods=['GET'])
+def status():
+    return jsonify(queue_stats())
+
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -1,14 +1,78 @@
 # worker_tasks.py
 
-from filevine_loader import load_project
+import uuid
+
+from rq import get_current_job
+
+from filevine_loader import load_project, refresh_project_sections
+import rate_budget
+
+# marker in the sections set meaning "reload everything"
+FULL_LOAD = "*"
+
+# priority lane -> RQ queue name ("filevine" stays the real-time queue)
+LANE_QUEUES = {
+    "realtime":    "filevine",
+    "incremental": "filevine-incremental",
+    "backfill":    "filevine-backfill",
+}
+QUEUE_LANES = {name: lane for lane, name in LANE_QUEUES.items()}
+
+
+def pending_key(project_id) -> str:
+    """Redis key marking a scheduled-but-not-started load (see tasks.enqueue_project)."""
+    return f"filevine:pending:{project_id}"
+
+
+def sections_key(project_id) -> str:
+    """Redis set of loader sections the pending load should refresh."""
+    return f"filevine:sections:{project_id}"
+
+
+def project_job_id(project_id) -> str:
+    """
+    A fresh RQ job id per scheduled load. Reusing one id per project would
+    overwrite the hash of a job with that id that's still running or
+    retrying; deduplication lives in the pending key instead.
+    """
+    return f"project-{project_id}-{uuid.uuid4().hex[:12]}"
+
+
+def claim_sections(redis_conn, project_id):
+    """
+    Take the accumulated sections and clear the pending marker in one step,
+    so webhooks from here on schedule a new load. Returns None for a full
+    load (asked for, or nothing recorded, e.g. on an RQ retry).
+    """
+    with redis_conn.pipeline() as pipe:  # MULTI/EXEC
+        pipe.smembers(sections_key(project_id))
+        pipe.delete(sections_key(project_id), pending_key(project_id))
+        members, _ = pipe.execute()
+    sections = {m.decode() if isinstance(m, bytes) else m for m in members}
+    if not sections or FULL_LOAD in sections:
+        return None
+    return sections
+
 
 def process_project(project_id: int):
     """
     RQ worker entrypoint. Calls your loader and lets failures be retried.
     """
-    print(f"🚀 Worker: processing project {project_id}")
+    job = get_current_job()
+    lane = QUEUE_LANES.get(job.origin, "realtime") if job is not None else "realtime"
+    rate_budget.set_lane(lane)
+    print(f"🚀 Worker: processing project {project_id} ({lane})")
+
+    # From here on new webhooks need a fresh load, so let them schedule one.
+    # Bulk jobs are always full loads and leave the webhook state alone.
+    sections = None
+    if job is not None and lane == "realtime":
+        sections = claim_sections(job.connection, project_id)
     try:
-        load_project(project_id)
+        if sections:
+            refresh_project_sections(project_id, sections)
+        else:
+            load_project(project_id)
         print(f"✅ Worker: done project {project_id}")
     except Exception as e:
         print(f"❌ Worker: error on project {project_id}: {e}")